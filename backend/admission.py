@@ -0,0 +1,199 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from array import array
+
+from flask import g, jsonify, request
+
+# Routes that are never limited (health, readiness, monitoring)
+EXEMPT_PATHS = ('/api/', '/api/ready', '/api/metrics', '/api/db/pool')
+
+# Paths on the chat budget; every other /api/ route is on the read budget
+CHAT_PATHS = ('/api/chat', '/api/chat/stream')
+
+
+class TokenBuckets:
+    """Token buckets in fixed-size arrays, one slot per hashed client key
+
+    Clients hash into `slots` buckets (a collision only makes two clients
+    share a budget). With shared=True the arrays and locks live in shared
+    memory, so when created before fork every worker draws on the same
+    buckets.
+    """
+
+    def __init__(self, rate, burst, slots=65536, shared=False, stripes=16):
+        self.rate = rate  # tokens per second; 0 disables the limit
+        self.burst = burst
+        self.slots = slots
+        if shared:
+            self._tokens = multiprocessing.RawArray('d', slots)
+            self._stamps = multiprocessing.RawArray('d', slots)
+            self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+        else:
+            self._tokens = array('d', bytes(8 * slots))
+            self._stamps = array('d', bytes(8 * slots))
+            self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def take(self, key, cost=1.0):
+        """Spend cost tokens for key; 0.0 if admitted, else seconds until it would be"""
+        if not self.rate:
+            return 0.0
+        slot = zlib.crc32(key.encode('utf-8')) % self.slots
+        now = time.monotonic()
+        with self._locks[slot % len(self._locks)]:
+            stamp = self._stamps[slot]
+            tokens = self.burst if not stamp else min(self.burst, self._tokens[slot] + (now - stamp) * self.rate)
+            self._stamps[slot] = now
+            if tokens >= cost:
+                self._tokens[slot] = tokens - cost
+                return 0.0
+            self._tokens[slot] = tokens
+            return (cost - tokens) / self.rate
+
+
+class InFlight:
+    """Count of requests being served, per process or shared across workers
+
+    Shared, each worker counts in its own slot (see claim()) and the cap
+    applies to the sum, so when a worker dies mid-request the master can
+    clear() its share instead of it leaking.
+    """
+
+    def __init__(self, limit, shared=False, slots=256):
+        self.limit = limit  # 0 disables the cap
+        if shared:
+            self._counts = multiprocessing.RawArray('i', slots)
+            self._lock = multiprocessing.Lock()
+        else:
+            self._counts = array('i', [0])
+            self._lock = threading.Lock()
+        self._slot = 0
+
+    @property
+    def slots(self):
+        return len(self._counts)
+
+    def claim(self, slot):
+        """Count this process's requests in slot (called in a worker after fork)"""
+        self._slot = slot
+
+    def clear(self, slot):
+        """Drop the count left in slot by a worker that exited"""
+        with self._lock:
+            self._counts[slot] = 0
+
+    def enter(self):
+        """Count a request in; False (and not counted) when at the cap"""
+        with self._lock:
+            if self.limit and sum(self._counts) >= self.limit:
+                return False
+            self._counts[self._slot] += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._counts[self._slot] -= 1
+
+    @property
+    def current(self):
+        return sum(self._counts)
+
+
+class AdmissionControl:
+    """Per-client rate limits and a global in-flight cap, checked before each request
+
+    Every request is charged to its client IP address. A user id in the
+    request body can't be trusted, so requests are also charged to a
+    per-user bucket only when authenticated_user() returns one. Behind
+    proxy_hops reverse proxies, the address the outermost one saw is taken
+    from X-Forwarded-For; with proxy_hops=0 every client behind a proxy
+    shares the proxy's bucket. Over-budget requests get 429 and a full
+    server gets 503, both with Retry-After, instead of queuing for a DB
+    connection or an LLM slot.
+    """
+
+    def __init__(self, chat, read, in_flight, proxy_hops=0, authenticated_user=None):
+        self.budgets = {"chat": chat, "read": read}
+        self.in_flight = in_flight
+        self.proxy_hops = proxy_hops
+        self.authenticated_user = authenticated_user  # () -> user id of an authenticated request, or None
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._warned_proxy = False
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def client_address(self):
+        """The client's IP address, past proxy_hops trusted proxies"""
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if not self.proxy_hops:
+            if forwarded and not self._warned_proxy:
+                self._warned_proxy = True
+                print("❌ Requests carry X-Forwarded-For but ADMISSION_PROXY_HOPS=0: every client behind the proxy shares one rate limit")
+            return request.remote_addr
+        # Entries left of the ones our own proxies appended are client-supplied
+        if len(forwarded) >= self.proxy_hops:
+            return forwarded[-self.proxy_hops]
+        return forwarded[0] if forwarded else request.remote_addr
+
+    def client_keys(self):
+        """Bucket keys to charge: always the IP address, plus the user once authenticated"""
+        keys = [f"ip:{self.client_address()}"]
+        user_id = self.authenticated_user() if self.authenticated_user else None
+        if user_id is not None:
+            keys.append(f"user:{user_id}")
+        return keys
+
+    def _reject(self, status, message, retry_after):
+        response = jsonify({"error": message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def init_app(self, app):
+        @app.before_request
+        def _admit():
+            path = request.path
+            if not path.startswith('/api/') or path in EXEMPT_PATHS or request.method == 'OPTIONS':
+                return None
+            budget = "chat" if path in CHAT_PATHS else "read"
+            wait = max(self.budgets[budget].take(f"{budget}:{key}") for key in self.client_keys())
+            if wait:
+                self._count(f"{budget}_rate_limited")
+                return self._reject(429, "Too many requests, slow down", wait)
+            if not self.in_flight.enter():
+                self._count(f"{budget}_over_capacity")
+                return self._reject(503, "Server is busy, try again shortly", 1)
+            g._admitted = True
+            self._count(f"{budget}_admitted")
+            return None
+
+        @app.teardown_request
+        def _release(exc):
+            if g.pop('_admitted', False):
+                self.in_flight.leave()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["in_flight"] = self.in_flight.current
+        stats["max_in_flight"] = self.in_flight.limit
+        return stats
+
+
+def admission_from_env(prefix='ADMISSION', authenticated_user=None):
+    """Build AdmissionControl from ADMISSION_* settings (ADMISSION_SHARED=1 shares state across forked workers)"""
+    shared = os.getenv(f'{prefix}_SHARED', '0') == '1'
+    slots = int(os.getenv(f'{prefix}_SLOTS', '65536'))
+    return AdmissionControl(
+        chat=TokenBuckets(float(os.getenv(f'{prefix}_CHAT_RATE', '0.5')), float(os.getenv(f'{prefix}_CHAT_BURST', '10')), slots, shared),
+        read=TokenBuckets(float(os.getenv(f'{prefix}_READ_RATE', '20')), float(os.getenv(f'{prefix}_READ_BURST', '60')), slots, shared),
+        in_flight=InFlight(int(os.getenv(f'{prefix}_MAX_IN_FLIGHT', '256')), shared, int(os.getenv(f'{prefix}_WORKER_SLOTS', '256'))),
+        proxy_hops=int(os.getenv(f'{prefix}_PROXY_HOPS', '0')),
+        authenticated_user=authenticated_user,
+    )
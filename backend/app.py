@@ -1,16 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import hmac
 import os
+import signal
+import sys
+import threading
 import mysql.connector
 from mysql.connector import Error
 import json
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from db_pool import pool_from_env
+from db_replicas import replicas_from_env
+from catalog_index import CatalogIndex, on_catalog_change, notify_catalog_change, packer_from_env
+from response_cache import cache_from_env
+from chat_context import context_store_from_env
+from session_cache import session_cache_from_env
+from llm_client import provider_from_env
+from llm_scheduler import LLMShedError, scheduler_from_env
+from llm_cache import llm_cache_from_env
+from message_journal import journal_from_env
+from metrics import metrics_from_env
+from admission import admission_from_env
+from catalog_loader import create_natural_keys
+from chat_archive import archiver_from_env, archived_messages, create_chat_storage
+from intent_matcher import IntentMatcher
+from package_cards import PackageCards, chat_card, encode, json_object, render_array
+from package_search import parse_search_request, row_matches, build_search_query, encode_cursor, create_search_indexes, departure_window
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+# CORS_ORIGINS: comma-separated allowed origins, '*' by default
+CORS(app, origins=[origin.strip() for origin in os.getenv('CORS_ORIGINS', '*').split(',')])
+
+# Per-route and per-phase latency histograms, exported at /api/metrics
+metrics = metrics_from_env()
+metrics.init_app(app)
+
+# Per-client token buckets (chat and read budgets) and a global in-flight cap;
+# over-budget requests get 429/503 with Retry-After instead of queuing.
+# Clients are keyed by IP until the API authenticates users (pass authenticated_user then)
+admission = admission_from_env()
+admission.init_app(app)
 
 # Database configuration
 db_config = {
@@ -21,32 +56,193 @@ db_config = {
     'autocommit': True
 }
 
-# Initialize Emergent LLM client
-llm_client = None
-try:
-    import litellm
-    # Set up the Emergent LLM key
-    emergent_key = os.getenv('EMERGENT_LLM_KEY')
-    if emergent_key:
-        # Use LiteLLM with Emergent key for Gemini
-        litellm.api_key = emergent_key
-        litellm.api_base = "https://api.emergentagent.com/v1"
-        llm_client = litellm
-        print("✅ Emergent LLM client initialized successfully")
-    else:
-        print("❌ EMERGENT_LLM_KEY not found in environment")
-except Exception as e:
-    print(f"❌ Failed to initialize Emergent LLM client: {e}")
-    print("Using fallback responses for chat functionality")
+# Shared connection pool, sized via MYSQL_POOL_* environment variables
+db_pool = pool_from_env(db_config)
+
+# Optional read replicas (MYSQL_REPLICA_*) for search, deal rails and catalog loads;
+# chat reads and writes stay on the primary so a session sees its own writes
+db_replicas = replicas_from_env(db_config)
+
+# In-memory package/hotel search index, built on startup or first search
+catalog = CatalogIndex()
+
+# Optional columnar snapshot of the index (CATALOG_SNAPSHOT_PATH), so processes start
+# from the memory-mapped file instead of querying MySQL; older than CATALOG_SNAPSHOT_MAX_AGE is ignored
+catalog_snapshot_path = os.getenv('CATALOG_SNAPSHOT_PATH', '')
+catalog_snapshot_max_age = float(os.getenv('CATALOG_SNAPSHOT_MAX_AGE', '3600'))
+catalog_snapshot_writer = True  # serve.py workers leave writing it to the master
+
+# Packs refreshed rows back into columns and writes the snapshot, after CATALOG_PACK_DELAY seconds, off the request thread
+catalog_packer = packer_from_env(catalog)
+
+# Result card JSON for catalog index rows, rendered on first use, for the PACKAGE_CARDS_CACHE_SIZE most recent packages
+package_cards = PackageCards(int(os.getenv('PACKAGE_CARDS_CACHE_SIZE', '50000')))
+
+# Whole-word intent/destination matching for replies when Gemini is unavailable
+intent_matcher = IntentMatcher()
+
+# Fan-out for /api/search/batch specs that have to query MySQL, sized via BATCH_SEARCH_WORKERS
+MAX_BATCH_SEARCHES = int(os.getenv('BATCH_SEARCH_MAX', '20'))
+search_executor = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_SEARCH_WORKERS', '4')), thread_name_prefix='batch-search')
+
+# Serialized responses for the read-mostly deal rails, TTL via RESPONSE_CACHE_TTL
+rail_cache = cache_from_env()
+
+# Write-behind buffer for chat messages and session params, flushed in batches
+message_journal = journal_from_env(db_pool.connection)
+# Longer user messages are refused rather than cut short in chat_messages
+MAX_CHAT_MESSAGE_CHARS = int(os.getenv('CHAT_MESSAGE_MAX_CHARS', '4000'))
+
+# Session params and each user's latest session, written through via the journal
+session_cache = session_cache_from_env(journal=message_journal)
+# Under serve.py, flushed writes mark the sessions stale in the other workers' caches
+message_journal.on_flush = session_cache.written
+
+# Per-session conversation windows, so a chat turn doesn't re-read the whole history
+chat_contexts = context_store_from_env(session_cache, journal=message_journal)
+
+# Moves cold sessions' messages to chat_archive, via CHAT_ARCHIVE_* (started by app.py/serve.py main)
+chat_archiver = archiver_from_env(db_pool.connection)
+# Cached sessions remember whether they have an archive; archiving one resets that
+chat_archiver.on_archive = session_cache.archived
+
+# Concurrency limit, fair queue, latency budget and per-call timeout for LLM calls, via LLM_MAX_CONCURRENCY etc.
+llm_scheduler = scheduler_from_env()
+
+# Replies to near-identical turns (e.g. opening messages), configured via LLM_CACHE_*
+llm_cache = llm_cache_from_env()
+
+metrics.add_collector('admission', admission.stats)
+metrics.add_collector('db_pool', db_pool.stats)
+metrics.add_collector('db_replicas', db_replicas.stats)
+metrics.add_collector('rail_cache', rail_cache.stats)
+metrics.add_collector('llm_cache', llm_cache.stats)
+metrics.add_collector('chat_journal', message_journal.stats)
+metrics.add_collector('chat_sessions', session_cache.stats)
+metrics.add_collector('chat_archive', chat_archiver.stats)
+metrics.add_collector('catalog', catalog.stats)
+metrics.add_collector('catalog_packer', catalog_packer.stats)
+metrics.add_collector('package_cards', package_cards.stats)
+metrics.add_collector('llm_scheduler', llm_scheduler.stats)
+
+# Set by serve.py while a worker drains before exiting, so /api/ready turns away new traffic
+draining = threading.Event()
+
+# Emergent LLM (litellm) client, imported on first chat or by a startup warm-up (LLM_WARMUP)
+llm_provider = provider_from_env()
+metrics.add_collector('llm_client', llm_provider.stats)
 
+@contextmanager
 def get_db_connection():
-    """Get database connection"""
+    """Check out a pooled database connection for the duration of a with-block"""
     try:
-        connection = mysql.connector.connect(**db_config)
-        return connection
+        with metrics.phase('db.acquire'):
+            connection = db_pool.acquire()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
-        return None
+        yield None
+        return
+
+    discard = False
+    try:
+        yield connection
+    except Error:
+        discard = True
+        raise
+    finally:
+        db_pool.release(connection, discard=discard)
+
+@contextmanager
+def get_read_connection(max_lag=None, fresh=False):
+    """Check out a replica connection for read-only work, or a primary one when no replica is within max_lag"""
+    picked = None
+    if db_replicas:
+        with metrics.phase('db.acquire'):
+            picked = db_replicas.acquire(max_lag, fresh)
+    if picked is None:
+        with get_db_connection() as connection:
+            yield connection
+        return
+
+    replica, connection = picked
+    discard = False
+    try:
+        yield connection
+    except Error:
+        discard = True
+        raise
+    finally:
+        db_replicas.release(replica, connection, discard=discard)
+
+def get_catalog_index():
+    """Return the catalog index, loading it on first use (None if the DB is unreachable)"""
+    if not catalog.loaded and not load_catalog_snapshot():
+        with get_read_connection(max_lag=0, fresh=True) as connection:
+            if connection and not catalog.loaded:
+                count = catalog.load(connection)
+                sync_catalog_views()
+                print(f"✅ Catalog index built with {count} packages")
+                catalog_packer.mark()
+    return catalog if catalog.loaded else None
+
+def load_catalog_snapshot():
+    """Load the catalog index from CATALOG_SNAPSHOT_PATH if it exists and is fresh enough"""
+    if not catalog_snapshot_path or not os.path.exists(catalog_snapshot_path):
+        return False
+    try:
+        count = catalog.load_snapshot(catalog_snapshot_path, catalog_snapshot_max_age)
+    except (OSError, ValueError) as e:
+        print(f"❌ Catalog snapshot unusable: {e}")
+        return False
+    if count is None:
+        return False
+    sync_catalog_views()
+    print(f"✅ Catalog index loaded from snapshot with {count} packages")
+    return True
+
+def save_catalog_snapshot():
+    """Write the catalog index to CATALOG_SNAPSHOT_PATH, if configured"""
+    if not catalog_snapshot_path or not catalog_snapshot_writer or not catalog.loaded:
+        return
+    try:
+        catalog.save_snapshot(catalog_snapshot_path)
+    except OSError as e:
+        print(f"❌ Could not write catalog snapshot: {e}")
+
+def catalog_packed(replaced):
+    """After the packer swaps refreshed rows for column views: keep their cards and write the snapshot"""
+    package_cards.rebind(replaced)
+    save_catalog_snapshot()
+
+catalog_packer.on_pack = catalog_packed
+
+def sync_catalog_views(package_ids=None, full=True):
+    """Bring what is derived from the catalog index (result cards, intent destinations) up to date
+
+    A full sync checks every row; otherwise only the cards of package_ids
+    are dropped (cards of rows changed through their hotel are re-rendered
+    on next use anyway). The intent table is rebuilt only when the set of
+    destinations and cities has changed.
+    """
+    if full:
+        package_cards.sync(catalog.rows())
+    elif package_ids:
+        package_cards.discard(package_ids)
+    intent_matcher.load_destinations(catalog.destinations())
+
+@on_catalog_change
+def refresh_catalog_index(package_ids=None, hotel_ids=None):
+    """Bring the catalog index up to date after packages/hotels change"""
+    with get_read_connection(max_lag=0, fresh=True) as connection:
+        if connection:
+            catalog.refresh(connection, package_ids=package_ids, hotel_ids=hotel_ids)
+            sync_catalog_views(package_ids, full=package_ids is None and hotel_ids is None)
+            catalog_packer.mark()
+
+@on_catalog_change
+def invalidate_rail_cache(package_ids=None, hotel_ids=None):
+    """Drop cached deal rails so the next request re-reads them"""
+    rail_cache.invalidate()
 
 def init_database():
     """Initialize database and create tables"""
@@ -129,6 +325,17 @@ def init_database():
         for table_sql in create_tables:
             cursor.execute(table_sql)
         
+        # Composite indexes for filtered, keyset-paginated searches
+        create_search_indexes(cursor)
+        # Natural keys that catalog_loader.py upserts merge on
+        create_natural_keys(cursor)
+        # Chat history indexes, archive table and (opt-in) monthly partitions
+        create_chat_storage(
+            cursor,
+            partitioned=os.getenv('CHAT_MESSAGES_PARTITIONED', '0') == '1',
+            months_ahead=int(os.getenv('CHAT_PARTITION_MONTHS_AHEAD', '3')),
+        )
+        
         connection.commit()
         cursor.close()
         connection.close()
@@ -142,264 +349,332 @@ def health_check():
     """Health check endpoint"""
     return jsonify({"message": "Costco Travel API is running", "status": "healthy"})
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness for load balancers: catalog warmed, database reachable, not draining"""
+    checks = {"catalog": catalog.loaded, "database": False, "draining": draining.is_set()}
+    try:
+        with get_db_connection() as connection:
+            checks["database"] = connection is not None
+    except Error:
+        pass
+    ready = checks["catalog"] and checks["database"] and not checks["draining"]
+    return jsonify({"status": "ready" if ready else "not ready", "checks": checks, "pid": os.getpid()}), 200 if ready else 503
+
+@app.route('/api/db/pool', methods=['GET'])
+def get_pool_stats():
+    """Connection pool usage stats (in-use, idle, wait time)"""
+    return jsonify(db_pool.stats())
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency histograms, error counts and pool/cache gauges in Prometheus text format"""
+    return metrics.response()
+
+def run_search(data):
+    """One /api/search request as (status, JSON body bytes)"""
+    search_type = data.get('type', 'packages')
+    destination = data.get('destination', '')
+    
+    try:
+        page = parse_search_request(data)
+    except ValueError as e:
+        return 400, encode({"error": str(e)})
+    filters = page["filters"]
+    # For now, other types list every package
+    query_destination = destination if search_type == 'packages' else ''
+    
+    index = get_catalog_index()
+    if index is not None:
+        # Served from the in-memory index
+        with metrics.phase('index.search'):
+            results, has_more = index.page(
+                query_destination,
+                limit=page["limit"],
+                predicate=(lambda row: row_matches(row, filters)) if filters else None,
+                after=page["after"],
+                descending=page["sort"] == 'price_desc',
+                departing=page["departing"],
+            )
+    else:
+        with get_read_connection() as connection:
+            if not connection:
+                return 500, encode({"error": "Database connection failed"})
+        
+            cursor = connection.cursor(dictionary=True)
+        
+            # One extra row tells us whether there is a next page
+            query, params = build_search_query(query_destination, filters, page["sort"], page["after"], page["limit"] + 1, page["departing"])
+            with metrics.phase('db.query'):
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+            cursor.close()
+        has_more = len(results) > page["limit"]
+        results = results[:page["limit"]]
+    
+    # Cards are pre-rendered per package; only index rows have them cached
+    with metrics.phase('format'):
+        cards = package_cards.json_array(results, 'search') if index is not None else render_array(results, 'search')
+    
+    with metrics.phase('serialize'):
+        body = json_object({
+            "total": len(results),
+            "destination": destination,
+            "filters": dict(
+                {name: float(value) if isinstance(value, Decimal) else value for name, value in filters.items()},
+                **({"departing": list(page["departing"])} if page["departing"] else {})
+            ),
+            "sort": page["sort"],
+            "next_cursor": encode_cursor(results[-1], page["sort"]) if has_more else None
+        }, results=cards)
+    return 200, body
+
 @app.route('/api/search', methods=['POST'])
 def search_packages():
     """Search for travel packages"""
     try:
-        data = request.get_json()
+        status, body = run_search(request.get_json())
+        return Response(body, status=status, mimetype='application/json')
+        
+    except Exception as e:
+        print(f"❌ Search error: {e}")
+        return jsonify({"error": "Search failed"}), 500
+
+@app.route('/api/search/facets', methods=['POST'])
+def search_facets():
+    """Filter counts (duration, price histogram, rating, country, inclusions) for a destination query"""
+    try:
+        data = request.get_json(silent=True) or {}
         search_type = data.get('type', 'packages')
         destination = data.get('destination', '')
         
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Build search query based on type
-        if search_type == 'packages':
-            query = """
-            SELECT p.*, h.name as hotel_name, h.rating as hotel_rating, h.city, h.country
-            FROM packages p
-            LEFT JOIN hotels h ON p.hotel_id = h.id
-            WHERE (p.destination LIKE %s OR h.city LIKE %s)
-            ORDER BY p.price_per_person ASC
-            LIMIT 20
-            """
-            cursor.execute(query, (f'%{destination}%', f'%{destination}%'))
-        else:
-            # For now, return packages for other types as well
-            query = """
-            SELECT p.*, h.name as hotel_name, h.rating as hotel_rating, h.city, h.country
-            FROM packages p
-            LEFT JOIN hotels h ON p.hotel_id = h.id
-            ORDER BY p.price_per_person ASC
-            LIMIT 20
-            """
-            cursor.execute(query)
-        
-        results = cursor.fetchall()
-        
-        # Format results for frontend
-        formatted_results = []
-        for result in results:
-            formatted_result = {
-                "id": result['id'],
-                "title": result['title'],
-                "image": result['image_url'],
-                "city": result['destination'],
-                "hotel": result['hotel_name'],
-                "includes": ["Package Includes", "Flights" if result['includes_flight'] else "", "Rental Car" if result['includes_car'] else ""],
-                "memberReviews": "Costco Member Reviews",
-                "rating": float(result['hotel_rating']) if result['hotel_rating'] else None,
-                "reviewCount": "Sample Reviews",
-                "features": [
-                    "Complimentary Room Upgrade",
-                    "Daily Buffet Breakfast",
-                    "Reduced Mandatory Daily Resort Fee"
-                ],
-                "priceStatus": f"From ${result['price_per_person']}" if result['price_per_person'] else "Not Available",
-                "adjustText": "Adjust Your Search"
-            }
-            formatted_results.append(formatted_result)
+        index = get_catalog_index()
+        if index is None:
+            # Counts come only from the index's precomputed summaries, never from ad hoc GROUP BYs
+            return jsonify({"error": "Facets are unavailable until the catalog index is loaded"}), 503
         
-        cursor.close()
-        connection.close()
-        
-        return jsonify({
-            "results": formatted_results,
-            "total": len(formatted_results),
-            "destination": destination
-        })
+        with metrics.phase('index.facets'):
+            facets = index.facets(destination if search_type == 'packages' else '')
+        with metrics.phase('serialize'):
+            body = json_object({"destination": destination, "facets": facets})
+        return Response(body, mimetype='application/json')
         
+    except Exception as e:
+        print(f"❌ Facets error: {e}")
+        return jsonify({"error": "Facets failed"}), 500
+
+def run_search_safely(data):
+    """run_search for one spec of a batch; failures become that spec's error"""
+    try:
+        return run_search(data)
     except Exception as e:
         print(f"❌ Search error: {e}")
-        return jsonify({"error": "Search failed"}), 500
+        return 500, encode({"error": "Search failed"})
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_packages_batch():
+    """Run several /api/search specs in one request, keyed per spec
+
+    Identical specs run once. Index-backed searches are in-memory and run
+    inline; SQL fallback searches fan out over search_executor, each on its
+    own pooled connection.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        specs = data.get('searches')
+        if not isinstance(specs, list) or not specs or len(specs) > MAX_BATCH_SEARCHES:
+            return jsonify({"error": f"searches must be a list of 1-{MAX_BATCH_SEARCHES} search objects"}), 400
+        
+        keys = []  # (key, canonical spec) in request order
+        seen_keys = set()
+        unique = {}  # canonical spec -> spec
+        for position, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                return jsonify({"error": f"searches[{position}] must be an object"}), 400
+            key = str(spec.get('key', position))
+            if key in seen_keys:
+                return jsonify({"error": f"duplicate search key {key!r}"}), 400
+            seen_keys.add(key)
+            spec = {name: value for name, value in spec.items() if name != 'key'}
+            canonical = json.dumps(spec, sort_keys=True, default=str)
+            unique.setdefault(canonical, spec)
+            keys.append((key, canonical))
+        
+        if get_catalog_index() is not None:
+            outcomes = {canonical: run_search_safely(spec) for canonical, spec in unique.items()}
+        else:
+            futures = {canonical: search_executor.submit(run_search_safely, spec) for canonical, spec in unique.items()}
+            outcomes = {canonical: future.result() for canonical, future in futures.items()}
+        
+        # Each spec's entry is its /api/search body (or error) plus the status it would have had
+        results = {}
+        for key, canonical in keys:
+            status, body = outcomes[canonical]
+            results[key] = b'{"status":' + str(status).encode() + b',"body":' + body + b'}'
+        body = json_object({"total": len(keys), "unique": len(unique)}, results=json_object({}, **results))
+        return Response(body, mimetype='application/json')
+        
+    except Exception as e:
+        print(f"❌ Batch search error: {e}")
+        return jsonify({"error": "Batch search failed"}), 500
 
 @app.route('/api/treasure-hunt', methods=['GET'])
+@rail_cache.cached('treasure-hunt')
 def get_treasure_hunt():
     """Get treasure hunt deals"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        query = """
-        SELECT * FROM packages 
-        WHERE is_treasure_hunt = TRUE 
-        ORDER BY id 
-        LIMIT 6
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        formatted_results = []
-        for result in results:
-            formatted_result = {
-                "id": result['id'],
-                "title": result['title'],
-                "image": result['image_url'],
-                "benefits": result['description'].split('.') if result['description'] else [],
-                "extrasValue": result['extras_value']
-            }
-            formatted_results.append(formatted_result)
-        
-        cursor.close()
-        connection.close()
-        
-        return jsonify(formatted_results)
+        index = get_catalog_index()
+        if index is not None:
+            # Joined from the cards pre-rendered for the catalog index rows
+            with metrics.phase('format'):
+                body = package_cards.json_array(index.flagged('is_treasure_hunt', 6), 'treasure_hunt')
+        else:
+            with get_read_connection() as connection:
+                if not connection:
+                    return jsonify({"error": "Database connection failed"}), 500
+            
+                cursor = connection.cursor(dictionary=True)
+                query = """
+                SELECT * FROM packages 
+                WHERE is_treasure_hunt = TRUE 
+                ORDER BY id 
+                LIMIT 6
+                """
+                with metrics.phase('db.query'):
+                    cursor.execute(query)
+                    results = cursor.fetchall()
+                cursor.close()
+            
+            with metrics.phase('format'):
+                body = render_array(results, 'treasure_hunt')
+        
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         print(f"❌ Treasure hunt error: {e}")
         return jsonify({"error": "Failed to load treasure hunt deals"}), 500
 
 @app.route('/api/whats-hot', methods=['GET'])
+@rail_cache.cached('whats-hot')
 def get_whats_hot():
     """Get what's hot deals"""
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        query = """
-        SELECT * FROM packages 
-        WHERE is_whats_hot = TRUE 
-        ORDER BY id 
-        LIMIT 6
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        formatted_results = []
-        for result in results:
-            formatted_result = {
-                "id": result['id'],
-                "title": result['title'],
-                "image": result['image_url'],
-                "price": f"From ${result['price_per_person']}" if result['price_per_person'] else None,
-                "duration": f"{result['duration_days']} nights" if result['duration_days'] else None,
-                "inclusions": result['description'].split(',') if result['description'] else []
-            }
-            formatted_results.append(formatted_result)
-        
-        cursor.close()
-        connection.close()
-        
-        return jsonify(formatted_results)
+        index = get_catalog_index()
+        if index is not None:
+            # Joined from the cards pre-rendered for the catalog index rows
+            with metrics.phase('format'):
+                body = package_cards.json_array(index.flagged('is_whats_hot', 6), 'whats_hot')
+        else:
+            with get_read_connection() as connection:
+                if not connection:
+                    return jsonify({"error": "Database connection failed"}), 500
+            
+                cursor = connection.cursor(dictionary=True)
+                query = """
+                SELECT * FROM packages 
+                WHERE is_whats_hot = TRUE 
+                ORDER BY id 
+                LIMIT 6
+                """
+                with metrics.phase('db.query'):
+                    cursor.execute(query)
+                    results = cursor.fetchall()
+                cursor.close()
+            
+            with metrics.phase('format'):
+                body = render_array(results, 'whats_hot')
+        
+        return Response(body, mimetype='application/json')
         
     except Exception as e:
         print(f"❌ What's hot error: {e}")
         return jsonify({"error": "Failed to load what's hot deals"}), 500
 
+HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
 @app.route('/api/chat/history/<int:user_id>', methods=['GET'])
 def get_chat_history(user_id):
-    """Get chat history for a user"""
+    """Get chat history for a user, newest page first
+
+    ?limit= caps the page size and ?before_id= continues from an earlier
+    page's next_before_id. Messages within a page are oldest first.
+    """
     try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get or create active session
-        cursor.execute("""
-            SELECT * FROM chat_sessions 
-            WHERE user_id = %s 
-            ORDER BY updated_at DESC 
-            LIMIT 1
-        """, (user_id,))
-        
-        session = cursor.fetchone()
-        if not session:
-            # Create new session
-            cursor.execute("""
-                INSERT INTO chat_sessions (user_id, active_search_params)
-                VALUES (%s, %s)
-            """, (user_id, '{}'))
-            session_id = cursor.lastrowid
-        else:
-            session_id = session['id']
-        
-        # Get messages for this session
-        cursor.execute("""
-            SELECT * FROM chat_messages 
-            WHERE session_id = %s 
-            ORDER BY timestamp ASC
-        """, (session_id,))
-        
-        messages = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-        
+        limit = int(request.args.get('limit', HISTORY_LIMIT))
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id else None
+        if not 1 <= limit <= MAX_HISTORY_LIMIT:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"limit must be 1-{MAX_HISTORY_LIMIT} and before_id an integer"}), 400
+    
+    try:
+        with get_db_connection() as connection:
+            if not connection:
+                return jsonify({"error": "Database connection failed"}), 500
+        
+            cursor = connection.cursor(dictionary=True)
+        
+            # Get or create active session (cached per user after the first lookup)
+            session = session_cache.latest_for_user(user_id, cursor)
+            if not session:
+                # Create new session
+                cursor.execute("""
+                    INSERT INTO chat_sessions (user_id, active_search_params)
+                    VALUES (%s, %s)
+                """, (user_id, '{}'))
+                session = session_cache.create(cursor.lastrowid, user_id)
+            session_id = session.session_id
+        
+            # One page of messages (newest first), plus any still waiting in the journal on the first page
+            def read_page():
+                if before_id is None:
+                    cursor.execute("""
+                        SELECT * FROM chat_messages 
+                        WHERE session_id = %s 
+                        ORDER BY id DESC 
+                        LIMIT %s
+                    """, (session_id, limit + 1))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM chat_messages 
+                        WHERE session_id = %s AND id < %s 
+                        ORDER BY id DESC 
+                        LIMIT %s
+                    """, (session_id, before_id, limit + 1))
+                return cursor.fetchall()
+            
+            if before_id is None:
+                messages, pending = message_journal.consistent_read(read_page, lambda rows: (rows, message_journal.pending(session_id)))
+            else:
+                messages, pending = read_page(), []
+            
+            # Past the oldest live message, continue into the archive, unless the session is known to have none
+            if len(messages) <= limit and session.archived is not False:
+                oldest = messages[-1]['id'] if messages else before_id
+                archived = archived_messages(cursor, session_id, oldest, limit + 1 - len(messages))
+                session.archived = archived is not None
+                messages += archived or []
+        
+            cursor.close()
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
         return jsonify({
             "session_id": session_id,
-            "messages": messages
+            "messages": messages[::-1] + pending,
+            "has_more": has_more,
+            "next_before_id": messages[-1]['id'] if has_more else None
         })
         
     except Exception as e:
         print(f"❌ Chat history error: {e}")
         return jsonify({"error": "Failed to load chat history"}), 500
 
-@app.route('/api/chat', methods=['POST'])
-def chat_with_ai():
-    """Main chat endpoint with AI processing"""
-    try:
-        data = request.get_json()
-        user_id = data.get('user_id')
-        session_id = data.get('session_id')
-        new_message = data.get('message')
-        
-        if not new_message:
-            return jsonify({"error": "Message is required"}), 400
-        
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Database connection failed"}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get or create session
-        if not session_id:
-            cursor.execute("""
-                INSERT INTO chat_sessions (user_id, active_search_params)
-                VALUES (%s, %s)
-            """, (user_id, '{}'))
-            session_id = cursor.lastrowid
-        
-        # Save user message
-        cursor.execute("""
-            INSERT INTO chat_messages (session_id, sender, message_text)
-            VALUES (%s, 'user', %s)
-        """, (session_id, new_message))
-        
-        # Get conversation history
-        cursor.execute("""
-            SELECT * FROM chat_messages 
-            WHERE session_id = %s 
-            ORDER BY timestamp ASC
-        """, (session_id,))
-        
-        messages = cursor.fetchall()
-        
-        # Get current search params
-        cursor.execute("""
-            SELECT active_search_params FROM chat_sessions 
-            WHERE id = %s
-        """, (session_id,))
-        
-        session_data = cursor.fetchone()
-        current_search_params = json.loads(session_data['active_search_params'] or '{}')
-        
-        # Build conversation history for Gemini
-        conversation_history = ""
-        for msg in messages[:-1]:  # Exclude the current message
-            conversation_history += f"{msg['sender'].capitalize()}: {msg['message_text']}\n"
-        
-        # Prepare Gemini prompt
-        gemini_prompt = f"""You are a helpful and concise Costco Travel assistant. Your goal is to gather all necessary parameters to perform a travel search. The required parameters are: 'destination', 'origin', 'departure_month', 'departure_year', 'duration_days', 'travelers', 'budget', and 'preferences'.
+def build_chat_prompt(conversation_history, current_search_params, new_message):
+    """Prompt asking Gemini to either gather more parameters or return them as JSON"""
+    return f"""You are a helpful and concise Costco Travel assistant. Your goal is to gather all necessary parameters to perform a travel search. The required parameters are: 'destination', 'origin', 'departure_month', 'departure_year', 'duration_days', 'travelers', 'budget', and 'preferences'.
 
 Below is the current conversation history:
 ---
@@ -414,95 +689,243 @@ Based on the latest message, you must perform one of three actions:
 Current known parameters are: {json.dumps(current_search_params)}
 Latest user message is: "{new_message}"
 """
+
+def prepare_chat_turn(data):
+    """Save the user message and build the prompt; returns (turn, error_response)
+
+    The database connection is released before returning, so it is not
+    held for the duration of the LLM call.
+    """
+    # The LLM latency budget covers the whole turn, including the database work below
+    deadline = llm_scheduler.deadline()
+    user_id = data.get('user_id')
+    session_id = data.get('session_id')
+    new_message = data.get('message')
+    
+    if not new_message:
+        return None, (jsonify({"error": "Message is required"}), 400)
+    if len(new_message) > MAX_CHAT_MESSAGE_CHARS:
+        return None, (jsonify({"error": f"Message must be at most {MAX_CHAT_MESSAGE_CHARS} characters"}), 400)
+    
+    # A cached context means no database work is needed before the LLM call
+    context = chat_contexts.cached(session_id) if session_id else None
+    if context is None:
+        with get_db_connection() as connection:
+            if not connection:
+                return None, (jsonify({"error": "Database connection failed"}), 500)
+            
+            cursor = connection.cursor(dictionary=True)
+            
+            # Get or create session (the new id is needed right away, so this isn't deferred)
+            if not session_id:
+                cursor.execute("""
+                    INSERT INTO chat_sessions (user_id, active_search_params)
+                    VALUES (%s, %s)
+                """, (user_id, '{}'))
+                session_id = cursor.lastrowid
+                context = chat_contexts.create(session_cache.create(session_id, user_id))
+            else:
+                # Bounded recent window + summary, merged with unflushed journal writes
+                context = chat_contexts.get(session_id, cursor)
+            
+            cursor.close()
+            if context is None:
+                return None, (jsonify({"error": "Chat session not found"}), 404)
+    
+    # Save user message (written behind in a batch); refused while MySQL is down long enough to fill the journal
+    if not message_journal.append(session_id, 'user', new_message):
+        return None, (jsonify({"error": "Chat is temporarily unavailable, please try again shortly"}), 503)
+    
+    current_search_params = context.params
+    
+    # Build conversation history for Gemini (excludes the current message)
+    conversation_history = context.history_text()
+    context.append('user', new_message)
+    
+    turn = {
+        "session_id": session_id,
+        "message": new_message,
+        "context": context,
+        "search_params": current_search_params,
+        "prompt": build_chat_prompt(conversation_history, current_search_params, new_message),
+        # Clients can opt out with "no_cache"; turns with personal details always bypass
+        "cache_key": None if data.get('no_cache') else llm_cache.key_for(conversation_history, current_search_params, new_message),
+        # LLM calls queue fairly per user (or per session for anonymous chats)
+        "fair_key": f"user:{user_id}" if user_id else f"session:{session_id}",
+        "deadline": deadline,
+    }
+    return turn, None
+
+def finish_chat_turn(turn, ai_response):
+    """Run the JSON-params hand-off, save the AI message and build the chat payload"""
+    session_id = turn["session_id"]
+    context = turn["context"]
+    search_results = None
+    
+    if ai_response is None:
+        # Fallback response when Gemini is not available, failed or was shed
+        analysis = intent_matcher.analyze(turn["message"])
+        ai_response = analysis["reply"]
+        search_params = None
+        if analysis["params"]:
+            # Keep what the user told us, and show packages as soon as we know where they want to go
+            fallback_params = dict(turn["search_params"], **analysis["params"])
+            session_cache.set_params(context.session, fallback_params)
+            if fallback_params.get('destination'):
+                search_results = execute_travel_search(fallback_params)
+    else:
+        # Check if response is JSON (complete search params)
+        try:
+            search_params = json.loads(ai_response)
+        except json.JSONDecodeError:
+            # Not JSON, it's a conversational response
+            search_params = None
+    
+    if isinstance(search_params, dict) and 'destination' in search_params:
+        # Update session with search params
+        session_cache.set_params(context.session, search_params)
         
-        # Call Gemini API
-        ai_response = ""
-        search_results = None
+        # Execute search
+        search_results = execute_travel_search(search_params)
+        ai_response = "Great! I found some travel packages for you based on your preferences. Here are the results:"
+    
+    # Save AI response
+    message_journal.append(session_id, 'ai', ai_response)
+    context.append('ai', ai_response)
+    if message_journal.sync:
+        # The next turn may land on another worker, which only sees what is in MySQL
+        message_journal.wait_flushed()
+    
+    return {
+        "response": ai_response,
+        "search_results": search_results,
+        "session_id": session_id
+    }
+
+def chat_llm_kwargs(prompt):
+    """Completion arguments for a chat turn"""
+    return {
+        "model": "gemini/gemini-1.5-pro",
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 500
+    }
+
+@app.route('/api/chat', methods=['POST'])
+def chat_with_ai():
+    """Main chat endpoint with AI processing"""
+    try:
+        turn, error = prepare_chat_turn(request.get_json())
+        if error:
+            return error
         
+        # Call Gemini API through the scheduler; no DB connection is held meanwhile
+        ai_response = None
+        llm_client = llm_provider.get()
         if llm_client:
-            try:
-                response = llm_client.completion(
-                    model="gemini/gemini-1.5-pro",
-                    messages=[{"role": "user", "content": gemini_prompt}],
-                    max_tokens=500
-                )
-                ai_response = response.choices[0].message.content.strip()
-                
-                # Check if response is JSON (complete search params)
+            ai_response = llm_cache.get(turn["cache_key"])
+            if ai_response is None:
                 try:
-                    search_params = json.loads(ai_response)
-                    if isinstance(search_params, dict) and 'destination' in search_params:
-                        # Update session with search params
-                        cursor.execute("""
-                            UPDATE chat_sessions 
-                            SET active_search_params = %s 
-                            WHERE id = %s
-                        """, (json.dumps(search_params), session_id))
-                        
-                        # Execute search
-                        search_results = execute_travel_search(search_params, cursor)
-                        ai_response = "Great! I found some travel packages for you based on your preferences. Here are the results:"
-                        
-                except json.JSONDecodeError:
-                    # Not JSON, it's a conversational response
+                    with metrics.phase('llm'):
+                        ai_response = llm_scheduler.complete(llm_client, turn["fair_key"], turn["deadline"], **chat_llm_kwargs(turn["prompt"])).strip()
+                    llm_cache.put(turn["cache_key"], ai_response)
+                except LLMShedError:
+                    # Overloaded: answer with the fallback reply rather than queue past the budget
                     pass
-                    
-            except Exception as e:
-                print(f"❌ Gemini API error: {e}")
-                ai_response = generate_fallback_response(new_message, current_search_params)
-        else:
-            # Fallback response when Gemini is not available
-            ai_response = generate_fallback_response(new_message, current_search_params)
-        
-        # Save AI response
-        cursor.execute("""
-            INSERT INTO chat_messages (session_id, sender, message_text)
-            VALUES (%s, 'ai', %s)
-        """, (session_id, ai_response))
+                except Exception as e:
+                    print(f"❌ Gemini API error: {e}")
         
-        cursor.close()
-        connection.close()
-        
-        return jsonify({
-            "response": ai_response,
-            "search_results": search_results,
-            "session_id": session_id
-        })
+        return jsonify(finish_chat_turn(turn, ai_response))
         
     except Exception as e:
         print(f"❌ Chat error: {e}")
         return jsonify({"error": "Chat processing failed"}), 500
 
-def execute_travel_search(search_params, cursor):
-    """Execute travel search based on AI-gathered parameters"""
+def sse_event(event, payload):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_with_ai_stream():
+    """Chat endpoint streaming Gemini tokens as Server-Sent Events
+
+    Emits 'token' events while the model generates and a final 'done' event
+    carrying the same payload as POST /api/chat.
+    """
+    try:
+        turn, error = prepare_chat_turn(request.get_json())
+        if error:
+            return error
+    except Exception as e:
+        print(f"❌ Chat error: {e}")
+        return jsonify({"error": "Chat processing failed"}), 500
+    
+    def generate():
+        ai_response = None
+        llm_client = llm_provider.get()
+        if llm_client:
+            cached = llm_cache.get(turn["cache_key"])
+            chunks = []
+            held = False
+            try:
+                stream = [cached] if cached is not None else llm_scheduler.stream(llm_client, turn["fair_key"], turn["deadline"], **chat_llm_kwargs(turn["prompt"]))
+                with metrics.phase('llm'):
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        # A reply starting with '{' is probably the params JSON, which is not shown to users
+                        held = held or ''.join(chunks).lstrip().startswith('{')
+                        if not held:
+                            yield sse_event("token", {"text": chunk})
+                ai_response = ''.join(chunks).strip()
+                if cached is None:
+                    llm_cache.put(turn["cache_key"], ai_response)
+            except LLMShedError:
+                pass
+            except Exception as e:
+                print(f"❌ Gemini API error: {e}")
+        
+        try:
+            yield sse_event("done", finish_chat_turn(turn, ai_response))
+        except Exception as e:
+            print(f"❌ Chat error: {e}")
+            yield sse_event("error", {"error": "Chat processing failed"})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def execute_travel_search(search_params):
+    """Execute travel search based on AI-gathered parameters
+
+    Served from the catalog index; without one, runs the query on a pooled
+    read connection.
+    """
     try:
         destination = search_params.get('destination', '')
         travelers = search_params.get('travelers', 2)
         budget = search_params.get('budget', 'any')
         
-        query = """
-        SELECT p.*, h.name as hotel_name, h.rating as hotel_rating
-        FROM packages p
-        LEFT JOIN hotels h ON p.hotel_id = h.id
-        WHERE p.destination LIKE %s
-        ORDER BY p.price_per_person ASC
-        LIMIT 5
-        """
-        
-        cursor.execute(query, (f'%{destination}%',))
-        results = cursor.fetchall()
-        
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                "id": result['id'],
-                "title": result['title'],
-                "destination": result['destination'],
-                "price": f"${result['price_per_person']}" if result['price_per_person'] else "Contact for pricing",
-                "duration": f"{result['duration_days']} days" if result['duration_days'] else "",
-                "hotel": result['hotel_name'],
-                "rating": float(result['hotel_rating']) if result['hotel_rating'] else None
-            })
+        # Only narrow by date once the assistant has both month and year
+        departing = departure_window(search_params.get('departure_month'), search_params.get('departure_year'))
+        
+        index = get_catalog_index()
+        if index is not None:
+            results = index.search(destination, limit=5, departing=departing)
+        else:
+            query, params = build_search_query(destination, {}, 'price_asc', None, 5, departing)
+            
+            with get_read_connection() as connection:
+                if not connection:
+                    return None
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+                cursor.close()
+        
+        if index is not None:
+            formatted_results = [package_cards.card(result, 'chat') for result in results]
+        else:
+            formatted_results = [chat_card(result) for result in results]
         
         return formatted_results
         
@@ -510,21 +933,38 @@ def execute_travel_search(search_params, cursor):
         print(f"❌ Search execution error: {e}")
         return None
 
-def generate_fallback_response(message, current_params):
-    """Generate fallback response when Gemini is not available"""
-    message_lower = message.lower()
-    
-    if any(word in message_lower for word in ['hawaii', 'maui', 'oahu', 'honolulu']):
-        return "Hawaii sounds amazing! What time of year are you thinking of traveling, and how many people will be going?"
-    elif any(word in message_lower for word in ['europe', 'paris', 'london', 'italy']):
-        return "Europe has so many wonderful destinations! Are you interested in a specific country, and what's your preferred travel timeframe?"
-    elif any(word in message_lower for word in ['cruise', 'ship', 'sailing']):
-        return "Cruises are fantastic! We have exclusive deals with Norwegian Cruise Line. What regions interest you - Caribbean, Mediterranean, Alaska?"
-    elif any(word in message_lower for word in ['budget', 'cost', 'price']):
-        return "I'd be happy to help you find options within your budget. What's your approximate budget range per person for the trip?"
-    else:
-        return "I'm here to help you plan your perfect trip! Where would you like to go, and when are you thinking of traveling?"
+# Bearer token for admin endpoints; unset, they only answer requests made on this machine
+CATALOG_ADMIN_TOKEN = os.getenv('CATALOG_ADMIN_TOKEN', '')
+
+def is_admin_request():
+    """True for requests carrying CATALOG_ADMIN_TOKEN, or, without one configured, coming straight from localhost"""
+    if CATALOG_ADMIN_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode('utf-8'), CATALOG_ADMIN_TOKEN.encode('utf-8'))
+    # A request relayed by a proxy on this machine is not local
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+@app.route('/api/catalog/refresh', methods=['POST'])
+def refresh_catalog():
+    """Refresh in-process catalog caches after out-of-process catalog writes"""
+    if not is_admin_request():
+        return jsonify({"error": "Not allowed"}), 403
+    try:
+        data = request.get_json(silent=True) or {}
+        notify_catalog_change(package_ids=data.get('package_ids'), hotel_ids=data.get('hotel_ids'))
+        return jsonify({"status": "refreshed", "packages": len(catalog), "rail_cache": rail_cache.stats()})
+        
+    except Exception as e:
+        print(f"❌ Catalog refresh error: {e}")
+        return jsonify({"error": "Catalog refresh failed"}), 500
 
 if __name__ == '__main__':
+    # Turn SIGTERM into a normal exit so the message journal is flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if llm_provider.warmup != 'lazy':
+        llm_provider.warm_up()
     init_database()
+    # After init_database(): the archiver relies on chat_archive and the timestamp index
+    chat_archiver.start()
+    get_catalog_index()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
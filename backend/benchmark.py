@@ -0,0 +1,624 @@
+"""Load/benchmark harness for the Flask API
+
+Starts app.py in process against a throwaway MySQL database filled with a
+synthetic catalog scaled from seed_data.py, swaps the LLM for a fake
+backend with configurable latency, then drives every endpoint at a fixed
+concurrency and prints throughput and latency percentiles as JSON.
+
+Full runs need a MySQL server on this machine (MYSQL_HOST must be
+localhost or 127.0.0.1; other hosts are refused). They DROP and recreate
+the --database given (costco_travel_bench by default).
+
+    python benchmark.py --packages 100000 --concurrency 32 --output bench.json
+    python benchmark.py --compare bench.json    # run again and diff against a saved report
+    python benchmark.py --startup-only           # import-time profile only, no MySQL needed
+    python benchmark.py --catalog-only --packages 100000   # catalog memory/load profile, no MySQL needed
+"""
+import argparse
+import gc
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ['search', 'treasure-hunt', 'whats-hot', 'chat-history', 'chat']
+DESTINATIONS = ['Hawaii', 'Maui', 'San Francisco', 'Japan', 'Caribbean', 'Mexico', 'Costa Rica', 'Turks']
+
+
+class FakeLLMBackend:
+    """Stand-in for litellm: sleeps for a configurable latency and returns canned replies
+
+    Every params_every-th call returns a complete search-params JSON object so
+    the execute_travel_search hand-off is exercised too.
+    """
+
+    def __init__(self, latency_ms=800, params_every=4, seed=7):
+        self.latency = latency_ms / 1000.0
+        self.params_every = params_every
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _reply(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+            destination = self._random.choice(DESTINATIONS)
+        if self.params_every and calls % self.params_every == 0:
+            return json.dumps({
+                "destination": destination, "origin": "Seattle", "departure_month": "March",
+                "departure_year": 2025, "duration_days": 7, "travelers": 2, "budget": "3000",
+                "preferences": "beach",
+            })
+        return f"{destination} is a great choice! When would you like to travel, and how many people are going?"
+
+    @staticmethod
+    def _message(text):
+        choice = types.SimpleNamespace(
+            message=types.SimpleNamespace(content=text),
+            delta=types.SimpleNamespace(content=text),
+        )
+        return types.SimpleNamespace(choices=[choice])
+
+    def completion(self, stream=False, **kwargs):
+        time.sleep(self.latency)
+        text = self._reply()
+        if not stream:
+            return self._message(text)
+        return (self._message(word + ' ') for word in text.split(' '))
+
+
+# -- database fixture ---------------------------------------------------------
+
+def synthetic_catalog(package_count, seed=42):
+    """Yield (hotels, packages) row chunks scaled from the seed_data samples"""
+    from seed_data import SAMPLE_HOTELS, SAMPLE_PACKAGES
+
+    rng = random.Random(seed)
+    hotel_count = len(SAMPLE_HOTELS)
+    blocks = -(-package_count // len(SAMPLE_PACKAGES))
+    for block in range(blocks):
+        hotels = []
+        for hotel in SAMPLE_HOTELS:
+            hotel_id = block * hotel_count + hotel[0]
+            name = hotel[1] if block == 0 else f"{hotel[1]} #{block}"
+            hotels.append((hotel_id, name) + hotel[2:8] + (round(hotel[8] * rng.uniform(0.8, 1.2), 2),))
+        packages = []
+        for package in SAMPLE_PACKAGES:
+            package_id = block * len(SAMPLE_PACKAGES) + package[0]
+            if package_id > package_count:
+                break
+            title = package[1] if block == 0 else f"{package[1]} #{block}"
+            price = round(package[4] * rng.uniform(0.8, 1.2), 2)
+            hotel_id = package[10] + block * hotel_count if package[10] else None
+            packages.append((package_id, title) + package[2:4] + (price,) + package[5:10] + (hotel_id,) + package[11:])
+        yield hotels, packages
+
+
+def prepare_database(app_module, package_count, user_count, chunk_size=5000):
+    """Recreate the benchmark database and load the synthetic catalog"""
+    import mysql.connector
+
+    config = dict(app_module.db_config)
+    database = config.pop('database')
+    connection = mysql.connector.connect(**config)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.close()
+    connection.close()
+    app_module.init_database()
+
+    connection = mysql.connector.connect(**app_module.db_config)
+    cursor = connection.cursor()
+    started = time.perf_counter()
+    hotel_buffer, package_buffer = [], []
+
+    def flush():
+        if hotel_buffer:
+            cursor.executemany("""
+                INSERT INTO hotels (id, name, city, country, rating, image_url, description, amenities, price_per_night)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, hotel_buffer)
+            hotel_buffer.clear()
+        if package_buffer:
+            cursor.executemany("""
+                INSERT INTO packages (id, title, destination, duration_days, price_per_person, includes_flight, includes_hotel, includes_car, image_url, description, hotel_id, available_dates, is_treasure_hunt, is_whats_hot, extras_value)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, package_buffer)
+            package_buffer.clear()
+
+    for hotels, packages in synthetic_catalog(package_count):
+        hotel_buffer.extend(hotels)
+        package_buffer.extend(packages)
+        if len(package_buffer) >= chunk_size:
+            flush()
+    flush()
+
+    cursor.executemany(
+        "INSERT INTO users (id, email, password_hash) VALUES (%s, %s, %s)",
+        [(user_id, f"bench{user_id}@example.com", '') for user_id in range(1, user_count + 1)],
+    )
+    cursor.close()
+    connection.close()
+    return time.perf_counter() - started
+
+
+# -- startup profile ----------------------------------------------------------
+
+def import_profile(statement, top=15):
+    """Import timings for statement in a fresh interpreter, from python -X importtime
+
+    Returns the total import time plus the slowest top-level packages by the
+    summed self time of their modules, or None if the statement fails.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        return None
+
+    total_us = 0
+    packages = {}
+    modules = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules += 1
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name[1:] == name[1:].lstrip():
+            # Imported directly by the statement, not nested under another module
+            total_us += int(cumulative_us)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "process_ms": round(wall * 1000, 1),
+        "modules": modules,
+        "slowest_packages_ms": {package: round(us / 1000, 1) for package, us in slowest},
+    }
+
+
+def startup_profile():
+    """How long the API takes to import, and what the LLM client adds when it is first used"""
+    return {
+        "app": import_profile('import app'),
+        "litellm": import_profile('import litellm'),
+    }
+
+
+# -- catalog profile ----------------------------------------------------------
+
+def catalog_rows(package_count):
+    """The synthetic catalog as CATALOG_QUERY rows, typed as the MySQL cursor returns them"""
+    from decimal import Decimal
+
+    rows = []
+    for hotels, packages in synthetic_catalog(package_count):
+        by_id = {hotel[0]: hotel for hotel in hotels}
+        for package in packages:
+            hotel = by_id.get(package[10])
+            row = {
+                "id": package[0], "title": package[1], "destination": package[2], "duration_days": package[3],
+                "price_per_person": Decimal(f"{package[4]:.2f}"),
+                "includes_flight": int(package[5]), "includes_hotel": int(package[6]), "includes_car": int(package[7]),
+                "image_url": package[8], "description": package[9], "hotel_id": package[10], "available_dates": package[11],
+                "is_treasure_hunt": int(package[12]), "is_whats_hot": int(package[13]), "extras_value": package[14],
+                "hotel_name": hotel[1] if hotel else None,
+                "hotel_rating": Decimal(str(hotel[4])) if hotel else None,
+                "city": hotel[2] if hotel else None,
+                "country": hotel[3] if hotel else None,
+            }
+            rows.append(row)
+    return rows
+
+
+def allocated(build):
+    """(result, bytes build() left allocated), measured with tracemalloc"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def timed(build):
+    """(result, seconds build() took)"""
+    started = time.perf_counter()
+    result = build()
+    return result, time.perf_counter() - started
+
+
+def resident_bytes():
+    """(anonymous, file-backed) resident bytes of this process, from /proc (Linux only)"""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                name, amount, _ = line.split()
+                values[name[:-1]] = int(amount) * 1024
+    return values.get('RssAnon', 0), values.get('RssFile', 0)
+
+
+def resident_growth(build):
+    """(anonymous, file-backed) resident bytes a process grows by while build() runs and its result is kept
+
+    Measured in a forked child, so each build starts from the same process
+    and nothing it frees can be reused by the next one. (None, None) where
+    /proc isn't available.
+    """
+    if not os.path.exists('/proc/self/status'):
+        return None, None
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read)
+            gc.collect()
+            anonymous, mapped = resident_bytes()
+            result = build()
+            gc.collect()
+            after_anonymous, after_mapped = resident_bytes()
+            os.write(write, json.dumps([after_anonymous - anonymous, after_mapped - mapped]).encode('utf-8'))
+            del result
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read, 'rb') as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    return tuple(json.loads(data)) if data else (None, None)
+
+
+def fetched_copy(row):
+    """A row holding its own str and Decimal objects, as every row a cursor fetches does"""
+    from decimal import Decimal
+
+    return {
+        name: (value + ' ')[:-1] if isinstance(value, str) else Decimal(str(value)) if isinstance(value, Decimal) else value
+        for name, value in row.items()
+    }
+
+
+def catalog_profile(package_count):
+    """Memory per package and load times for fetched dict rows vs. the columnar snapshot
+
+    The *_bytes_per_package figures are what the row storage alone keeps
+    allocated (tracemalloc); the mapped one excludes the snapshot's page
+    cache, which every process mapping the file shares. The index_rss_*
+    figures are what a whole process grows by to hold the loaded search
+    index (rows plus postings, price order, dates and facet summaries),
+    with the snapshot's resident file pages reported separately; the
+    process_rss_* ones add every package's result cards in every view.
+    Index times cover building the search index only; the dict figure
+    excludes fetching the rows from MySQL.
+    """
+    from catalog_index import CatalogIndex
+    from catalog_snapshot import CatalogColumns
+    from package_cards import VIEWS, PackageCards
+
+    source = catalog_rows(package_count)
+    count = len(source)
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, 'catalog.snapshot')
+
+    def index_fetched_dicts():
+        # Rows the process fetched itself, kept as dicts
+        index = CatalogIndex()
+        for row in [fetched_copy(row) for row in source]:
+            index._add(row, ordered=False)
+        index._order.sort()
+        index._departures.sort()
+        return index
+
+    def index_fetched_columns():
+        # What a MySQL load does: the fetched rows are packed into columns and dropped
+        index = CatalogIndex()
+        index.load_columns(CatalogColumns.from_rows([fetched_copy(row) for row in source]))
+        return index
+
+    def index_snapshot():
+        index = CatalogIndex()
+        index.load_snapshot(path)
+        return index
+
+    def with_cards(build):
+        # Worst case: every package has been shown in every view
+        def build_all():
+            index = build()
+            cards = PackageCards(max_packages=len(index))
+            for view in VIEWS:
+                cards.json_array(index.rows(), view)
+            return index, cards
+        return build_all
+
+    # Before anything else is allocated and freed here, so the forked
+    # children can't grow into memory this process has already paged in
+    dict_rss, _ = resident_growth(index_fetched_dicts)
+    columns_rss, _ = resident_growth(index_fetched_columns)
+    resident_growth(lambda: CatalogColumns.from_rows(source).save(path))
+    snapshot_rss, snapshot_file_rss = resident_growth(index_snapshot)
+    dict_cards_rss, _ = resident_growth(with_cards(index_fetched_dicts))
+    columns_cards_rss, _ = resident_growth(with_cards(index_fetched_columns))
+    snapshot_cards_rss, _ = resident_growth(with_cards(index_snapshot))
+
+    dict_rows, dict_bytes = allocated(lambda: [fetched_copy(row) for row in source])
+    columns, column_bytes = allocated(lambda: CatalogColumns.from_rows(dict_rows))
+    _, view_bytes = allocated(columns.rows)
+    _, build_seconds = timed(lambda: CatalogColumns.from_rows(dict_rows))
+
+    with directory:
+        file_bytes, save_seconds = timed(lambda: columns.save(path))
+        _, open_seconds = timed(lambda: CatalogColumns.open(path))
+        mapped, mapped_bytes = allocated(lambda: CatalogColumns.open(path))
+        _, mapped_view_bytes = allocated(mapped.rows)
+
+        def index_dict_rows():
+            index = CatalogIndex()
+            for row in dict_rows:
+                index._add(row, ordered=False)
+            index._order.sort()
+            index._departures.sort()
+
+        _, dict_index_seconds = timed(index_dict_rows)
+        _, snapshot_index_seconds = timed(index_snapshot)
+
+    def per_package(value):
+        return round(value / count, 1) if count and value is not None else None
+
+    def ms(seconds):
+        return round(seconds * 1000, 2)
+
+    return {
+        "packages": count,
+        "dict_rows_bytes_per_package": per_package(dict_bytes),
+        "columns_bytes_per_package": per_package(column_bytes + view_bytes),
+        "mapped_bytes_per_package": per_package(mapped_bytes + mapped_view_bytes),
+        "snapshot_file_bytes_per_package": per_package(file_bytes),
+        "columns_build_ms": ms(build_seconds),
+        "snapshot_save_ms": ms(save_seconds),
+        "snapshot_open_ms": ms(open_seconds),
+        "index_from_dict_rows_ms": ms(dict_index_seconds),
+        "index_from_snapshot_ms": ms(snapshot_index_seconds),
+        "index_rss_dict_rows_bytes_per_package": per_package(dict_rss),
+        "index_rss_columns_bytes_per_package": per_package(columns_rss),
+        "index_rss_snapshot_bytes_per_package": per_package(snapshot_rss),
+        "index_rss_snapshot_file_bytes_per_package": per_package(snapshot_file_rss),
+        "process_rss_dict_rows_bytes_per_package": per_package(dict_cards_rss),
+        "process_rss_columns_bytes_per_package": per_package(columns_cards_rss),
+        "process_rss_snapshot_bytes_per_package": per_package(snapshot_cards_rss),
+    }
+
+
+# -- load generation ----------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def request_for(endpoint, worker, sequence, state):
+    """(method, path, body) for one request of the given endpoint"""
+    if endpoint == 'search':
+        destination = DESTINATIONS[(worker + sequence) % len(DESTINATIONS)]
+        return 'POST', '/api/search', {"type": "packages", "destination": destination}
+    if endpoint == 'treasure-hunt':
+        return 'GET', '/api/treasure-hunt', None
+    if endpoint == 'whats-hot':
+        return 'GET', '/api/whats-hot', None
+    if endpoint == 'chat-history':
+        return 'GET', f"/api/chat/history/{state['user_id']}", None
+    if endpoint == 'chat':
+        body = {"user_id": state['user_id'], "session_id": state.get('session_id'),
+                "message": f"I want to go to {DESTINATIONS[sequence % len(DESTINATIONS)]}"}
+        return 'POST', '/api/chat', body
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def drive(port, endpoint, concurrency, total_requests, user_count):
+    """Issue total_requests against one endpoint from concurrency workers"""
+    per_worker = [total_requests // concurrency + (1 if i < total_requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(index):
+        latencies, errors = [], 0
+        state = {"user_id": index % user_count + 1}
+        client = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        for sequence in range(per_worker[index]):
+            method, path, body = request_for(endpoint, index, sequence, state)
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            started = time.perf_counter()
+            try:
+                client.request(method, path, body=payload, headers=headers)
+                response = client.getresponse()
+                data = response.read()
+                latencies.append(time.perf_counter() - started)
+                if response.status >= 400:
+                    errors += 1
+                elif endpoint == 'chat':
+                    state['session_id'] = json.loads(data).get('session_id')
+            except Exception:
+                errors += 1
+                client.close()
+                client = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        client.close()
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(value for worker_latencies, _ in results for value in worker_latencies)
+    errors = sum(worker_errors for _, worker_errors in results)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(previous, current):
+    """Percentage change of throughput and latency percentiles per endpoint, and of import and catalog numbers"""
+    deltas = {}
+    for metric, value in (current.get("catalog") or {}).items():
+        before = (previous.get("catalog") or {}).get(metric)
+        if metric != "packages" and before and value is not None:
+            deltas.setdefault("catalog", {})[metric + "_change_pct"] = round((value - before) * 100.0 / before, 2)
+    for name, profile in current.get("startup", {}).items():
+        before = (previous.get("startup") or {}).get(name)
+        if before and profile and before.get("import_ms"):
+            deltas.setdefault("startup", {})[name + "_import_ms_change_pct"] = round((profile["import_ms"] - before["import_ms"]) * 100.0 / before["import_ms"], 2)
+    for endpoint, stats in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        deltas[endpoint] = {}
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(metric) and stats.get(metric) is not None:
+                deltas[endpoint][metric + "_change_pct"] = round((stats[metric] - before[metric]) * 100.0 / before[metric], 2)
+    return deltas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packages', type=int, default=9, help='synthetic catalog size (9 = seed_data as-is)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--llm-latency-ms', type=float, default=800)
+    parser.add_argument('--llm-cache', action='store_true', help='leave the LLM response cache on')
+    parser.add_argument('--database', default=os.getenv('MYSQL_BENCH_DATABASE', 'costco_travel_bench'))
+    parser.add_argument('--skip-load', action='store_true', help='reuse the existing benchmark database')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='previous JSON report to diff against')
+    parser.add_argument('--startup-only', action='store_true', help='only profile import times')
+    parser.add_argument('--catalog-only', action='store_true', help='only profile catalog memory and load times')
+    args = parser.parse_args(argv)
+
+    if args.catalog_only:
+        catalog = catalog_profile(args.packages)
+        print(f"✅ catalog: {catalog['process_rss_dict_rows_bytes_per_package']} -> {catalog['process_rss_snapshot_bytes_per_package']} resident bytes/package with cards", file=sys.stderr)
+        report = {"meta": {"commit": git_commit(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'), "python": platform.python_version(), "packages": args.packages}, "catalog": catalog, "endpoints": {}}
+        return write_report(report, args)
+
+    if not args.startup_only:
+        # Never drop and reload a database on a shared server (.env is read the way app.py will read it)
+        from dotenv import load_dotenv
+        load_dotenv()
+        host = os.getenv('MYSQL_HOST', 'localhost')
+        if host not in ('localhost', '127.0.0.1', '::1'):
+            parser.error(f"refusing to run against MYSQL_HOST={host}: the benchmark drops and recreates {args.database}")
+
+    # Profiled in fresh interpreters before anything is imported here
+    startup = startup_profile()
+    if startup["app"]:
+        print(f"✅ import app: {startup['app']['import_ms']} ms", file=sys.stderr)
+    if args.startup_only:
+        report = {"meta": {"commit": git_commit(), "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'), "python": platform.python_version()}, "startup": startup, "endpoints": {}}
+        return write_report(report, args)
+
+    # app.py reads its configuration at import time
+    os.environ['MYSQL_DATABASE'] = args.database
+    if not args.llm_cache:
+        os.environ['LLM_CACHE_ENABLED'] = '0'
+    os.environ.setdefault('MYSQL_POOL_SIZE', str(max(10, args.concurrency * 2)))
+    # All benchmark traffic comes from 127.0.0.1; rate limits and the in-flight cap would turn it into 429/503s
+    for name in ('ADMISSION_CHAT_RATE', 'ADMISSION_READ_RATE', 'ADMISSION_MAX_IN_FLIGHT'):
+        os.environ[name] = '0'
+
+    import app as app_module
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    user_count = max(1, args.concurrency)
+    load_seconds = None
+    if not args.skip_load:
+        load_seconds = prepare_database(app_module, args.packages, user_count)
+    llm = FakeLLMBackend(latency_ms=args.llm_latency_ms)
+    app_module.llm_provider.override(llm)
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "packages": args.packages,
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "llm_latency_ms": args.llm_latency_ms,
+            "catalog_load_s": round(load_seconds, 3) if load_seconds is not None else None,
+        },
+        "startup": startup,
+        "endpoints": {},
+    }
+    try:
+        for endpoint in [name.strip() for name in args.endpoints.split(',') if name.strip()]:
+            # Warm up caches and the catalog index outside the measured window
+            drive(port, endpoint, 1, min(5, args.requests), user_count)
+            report["endpoints"][endpoint] = drive(port, endpoint, args.concurrency, args.requests, user_count)
+            print(f"✅ {endpoint}: {report['endpoints'][endpoint]['throughput_rps']} req/s", file=sys.stderr)
+    finally:
+        server.shutdown()
+
+    return write_report(report, args)
+
+
+def write_report(report, args):
+    if args.compare:
+        with open(args.compare) as previous:
+            report["comparison"] = compare(json.load(previous), report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
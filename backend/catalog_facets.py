@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+# (label, min_duration, max_duration) over packages.duration_days
+DURATION_BUCKETS = (
+    ("1-3", 1, 3),
+    ("4-6", 4, 6),
+    ("7-9", 7, 9),
+    ("10-13", 10, 13),
+    ("14+", 14, None),
+)
+
+# (label, min_rating) over the hotel rating, highest band first
+RATING_BANDS = (
+    ("4.5+", Decimal('4.5')),
+    ("4.0+", Decimal('4.0')),
+    ("3.5+", Decimal('3.5')),
+    ("below 3.5", None),
+)
+
+PRICE_BUCKET_WIDTH = 500
+
+INCLUDES = ('flight', 'hotel', 'car')
+
+# Row fields facet_keys() reads
+FACET_COLUMNS = ('duration_days', 'price_per_person', 'hotel_rating', 'country') + tuple(f'includes_{name}' for name in INCLUDES)
+
+
+def _duration_bucket(days):
+    if days is None:
+        return None
+    for label, low, high in DURATION_BUCKETS:
+        if days >= low and (high is None or days <= high):
+            return label
+    return None
+
+
+def _rating_band(rating):
+    if rating is None:
+        return "unrated"
+    rating = Decimal(str(rating))
+    for label, low in RATING_BANDS:
+        if low is None or rating >= low:
+            return label
+
+
+def price_bucket(price):
+    """Lower bound of the price bucket holding price (a bucket's own bound maps to itself)"""
+    return int(price // PRICE_BUCKET_WIDTH) * PRICE_BUCKET_WIDTH if price is not None else None
+
+
+def facet_keys(row):
+    """(facet, bucket) pairs one catalog row counts towards"""
+    keys = [('total', None)]
+    duration = _duration_bucket(row.get('duration_days'))
+    if duration:
+        keys.append(('duration', duration))
+    keys.append(('price', price_bucket(row.get('price_per_person'))))
+    keys.append(('rating', _rating_band(row.get('hotel_rating'))))
+    if row.get('country'):
+        keys.append(('country', row['country']))
+    for name in INCLUDES:
+        if row.get(f'includes_{name}'):
+            keys.append(('includes', name))
+    return keys
+
+
+def add_counts(summary, keys, delta):
+    """Apply +1/-1 for keys to a {facet key: count} summary, dropping zero counts"""
+    for key in keys:
+        count = summary.get(key, 0) + delta
+        if count:
+            summary[key] = count
+        else:
+            summary.pop(key, None)
+
+
+def render_facets(summary):
+    """JSON-ready facets from a {facet key: count} summary
+
+    Buckets carry the /api/search filters that select them, so the UI can
+    send a clicked bucket straight back as a search.
+    """
+    durations = []
+    for label, low, high in DURATION_BUCKETS:
+        count = summary.get(('duration', label))
+        if count:
+            filters = {"min_duration": low}
+            if high is not None:
+                filters["max_duration"] = high
+            durations.append({"label": label, "count": count, "filters": filters})
+
+    prices = []
+    for (facet, low), count in summary.items():
+        if facet == 'price' and low is not None:
+            prices.append({"min": low, "max": low + PRICE_BUCKET_WIDTH, "count": count,
+                           "filters": {"min_price": low, "max_price": low + PRICE_BUCKET_WIDTH - 0.01}})
+    prices.sort(key=lambda bucket: bucket["min"])
+
+    # "4.0+" includes the 4.5+ hotels, as min_rating=4.0 would
+    ratings = []
+    at_least = 0
+    for label, low in RATING_BANDS + (("unrated", None),):
+        count = summary.get(('rating', label), 0)
+        if low is not None:
+            at_least += count
+            count = at_least
+        if count:
+            band = {"label": label, "count": count}
+            if low is not None:
+                band["filters"] = {"min_rating": float(low)}
+            ratings.append(band)
+
+    countries = sorted(
+        ({"country": country, "count": count} for (facet, country), count in summary.items() if facet == 'country'),
+        key=lambda bucket: (-bucket["count"], bucket["country"]),
+    )
+
+    return {
+        "total": summary.get(('total', None), 0),
+        "duration": durations,
+        "price": {"bucket_width": PRICE_BUCKET_WIDTH, "buckets": prices, "unpriced": summary.get(('price', None), 0)},
+        "rating": ratings,
+        "country": countries,
+        "includes": {name: summary.get(('includes', name), 0) for name in INCLUDES},
+    }
@@ -0,0 +1,611 @@
+import atexit
+import bisect
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from catalog_facets import FACET_COLUMNS, add_counts, facet_keys, price_bucket, render_facets
+from catalog_snapshot import CatalogColumns
+
+# Query aliases that should also match a broader destination
+SYNONYMS = {
+    'maui': ['hawaii'],
+    'oahu': ['hawaii'],
+    'honolulu': ['hawaii'],
+    'waikiki': ['hawaii'],
+    'kona': ['hawaii'],
+    'big island': ['hawaii'],
+    'kauai': ['hawaii'],
+    'tokyo': ['japan'],
+    'kyoto': ['japan'],
+    'osaka': ['japan'],
+    'cancun': ['mexico'],
+    'cabo': ['mexico'],
+    'puerto vallarta': ['mexico'],
+    'riviera nayarit': ['mexico'],
+    'bahamas': ['caribbean'],
+    'jamaica': ['caribbean'],
+    'aruba': ['caribbean'],
+    'turks and caicos': ['caribbean'],
+    'sf': ['san francisco'],
+    'san fran': ['san francisco'],
+    'bay area': ['san francisco'],
+}
+
+CATALOG_QUERY = """
+SELECT p.*, h.name as hotel_name, h.rating as hotel_rating, h.city, h.country
+FROM packages p
+LEFT JOIN hotels h ON p.hotel_id = h.id
+"""
+
+# Row fields the index and its facet summaries read
+INDEXED_COLUMNS = (
+    'id', 'destination', 'city', 'price_per_person', 'available_dates', 'duration_days',
+    'hotel_rating', 'country', 'includes_flight', 'includes_hotel', 'includes_car',
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def normalize(text):
+    """Lowercase text and reduce it to space-separated alphanumeric tokens"""
+    return ' '.join(_TOKEN_RE.findall((text or '').lower()))
+
+
+def available_dates(row):
+    """Sorted, de-duplicated YYYY-MM-DD strings from a row's available_dates JSON"""
+    value = row.get('available_dates')
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if not isinstance(value, list):
+        return []
+    return sorted({str(day)[:10] for day in value if _DATE_RE.match(str(day))})
+
+
+def price_key(row):
+    """Sort key matching MySQL's ORDER BY price_per_person ASC (NULLs first)"""
+    price = row.get('price_per_person')
+    return (price is not None, price if price is not None else 0, row['id'])
+
+
+class CatalogIndex:
+    """In-memory search index over packages joined with their hotels"""
+
+    def __init__(self, synonyms=None):
+        self.synonyms = SYNONYMS if synonyms is None else synonyms
+        self._lock = threading.RLock()
+        self._rows = {}  # package id -> joined row
+        self._keys = {}  # package id -> index keys the row is posted under
+        self._price_keys = {}  # package id -> its entry in _order
+        self._postings = {}  # token prefix -> set of package ids
+        self._order = []  # price_key tuples, cheapest first
+        self._dates = {}  # package id -> its available dates
+        self._departures = []  # (date, package id), sorted, for date-range lookups
+        self._groups = {}  # (destination, city) -> {facet key: count} over its packages
+        self._group_postings = {}  # token prefix -> set of (destination, city) groups
+        self._facet_cache = {}  # normalized query -> rendered facets, cleared on any change
+        self._key_sets = {}  # (destination, city) -> its shared frozenset of index keys
+        self._date_lists = {}  # available_dates JSON -> its parsed dates, shared by identical rows
+        self.columns = None  # CatalogColumns the rows were last loaded or packed into
+        self.packed = False  # every row is a view of self.columns (no refreshed dicts)
+        self._generation = 0  # bumped on every load and refresh
+        self.loaded_at = None  # when the indexed rows were read from MySQL
+        self.loaded = False
+
+    # -- building ---------------------------------------------------------
+
+    def _index_keys(self, row):
+        group = (row.get('destination'), row.get('city'))
+        keys = self._key_sets.get(group)
+        if keys is None:
+            prefixes = set()
+            for field in group:
+                for token in normalize(field).split():
+                    for end in range(1, len(token) + 1):
+                        prefixes.add(token[:end])
+            # Every package of a group has the same keys; keep one copy
+            keys = self._key_sets[group] = frozenset(prefixes)
+        return keys
+
+    def _add(self, row, ordered=True):
+        package_id = row['id']
+        keys = self._index_keys(row)
+        entry = price_key(row)
+        self._rows[package_id] = row
+        self._keys[package_id] = keys
+        self._price_keys[package_id] = entry
+        for key in keys:
+            self._postings.setdefault(key, set()).add(package_id)
+        raw = row.get('available_dates')
+        dates = self._date_lists.get(raw) if isinstance(raw, (str, bytes)) else None
+        if dates is None:
+            dates = tuple(sys.intern(day) for day in available_dates(row))
+            if isinstance(raw, (str, bytes)):
+                self._date_lists[raw] = dates
+        self._dates[package_id] = dates
+        self._count_facets(row, keys, 1)
+        if ordered:
+            bisect.insort(self._order, entry)
+            for day in dates:
+                bisect.insort(self._departures, (day, package_id))
+        else:
+            self._order.append(entry)
+            self._departures.extend((day, package_id) for day in dates)
+
+    def _add_columns(self, columns):
+        """_add(row, ordered=False) for every row of a CatalogColumns, in bulk
+
+        Fields are decoded a column at a time, and postings and facet
+        counts are applied once per (destination, city) group and distinct
+        facet values rather than once per row.
+        """
+        rows = columns.rows()
+        fields = ('id', 'destination', 'city', 'available_dates') + FACET_COLUMNS
+        members = {}  # (destination, city) -> package ids
+        facet_counts = {}  # ((destination, city), facet field values) -> packages
+        price_field = FACET_COLUMNS.index('price_per_person')
+        for row, (package_id, destination, city, raw, *facet) in zip(rows, zip(*(columns.values(name) for name in fields))):
+            self._rows[package_id] = row
+            group = (destination, city)
+            group_ids = members.get(group)
+            if group_ids is None:
+                group_ids = members[group] = []
+            group_ids.append(package_id)
+            price = facet[price_field]
+            entry = (price is not None, price if price is not None else 0, package_id)
+            self._price_keys[package_id] = entry
+            self._order.append(entry)
+            dates = self._date_lists.get(raw) if raw is not None else None
+            if dates is None:
+                dates = tuple(sys.intern(day) for day in available_dates({'available_dates': raw}))
+                if raw is not None:
+                    self._date_lists[raw] = dates
+            self._dates[package_id] = dates
+            self._departures.extend((day, package_id) for day in dates)
+            # Packages in the same price bucket count the same
+            facet[price_field] = price_bucket(price)
+            key = (group, tuple(facet))
+            facet_counts[key] = facet_counts.get(key, 0) + 1
+
+        for group, group_ids in members.items():
+            keys = self._index_keys(dict(zip(('destination', 'city'), group)))
+            self._groups[group] = {}
+            for key in keys:
+                self._postings.setdefault(key, set()).update(group_ids)
+                self._group_postings.setdefault(key, set()).add(group)
+            for package_id in group_ids:
+                self._keys[package_id] = keys
+        for (group, facet), count in facet_counts.items():
+            add_counts(self._groups[group], facet_keys(dict(zip(FACET_COLUMNS, facet))), count)
+
+    def _count_facets(self, row, keys, delta):
+        """Keep the row's (destination, city) facet summary current"""
+        group = (row.get('destination'), row.get('city'))
+        summary = self._groups.get(group)
+        if summary is None:
+            summary = self._groups[group] = {}
+            for key in keys:
+                self._group_postings.setdefault(key, set()).add(group)
+        add_counts(summary, facet_keys(row), delta)
+        if not summary:
+            del self._groups[group]
+            for key in keys:
+                groups = self._group_postings.get(key)
+                if groups is not None:
+                    groups.discard(group)
+                    if not groups:
+                        del self._group_postings[key]
+        self._facet_cache = {}
+
+    def _remove(self, package_id):
+        row = self._rows.pop(package_id, None)
+        if row is None:
+            return
+        self._count_facets(row, self._keys[package_id], -1)
+        for key in self._keys.pop(package_id, ()):
+            ids = self._postings.get(key)
+            if ids is not None:
+                ids.discard(package_id)
+                if not ids:
+                    del self._postings[key]
+        entry = self._price_keys.pop(package_id)
+        position = bisect.bisect_left(self._order, entry)
+        if position < len(self._order) and self._order[position] == entry:
+            del self._order[position]
+        for day in self._dates.pop(package_id, ()):
+            position = bisect.bisect_left(self._departures, (day, package_id))
+            if position < len(self._departures) and self._departures[position] == (day, package_id):
+                del self._departures[position]
+
+    def load(self, connection):
+        """Rebuild the whole index from the database"""
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(CATALOG_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+        # Keep the rows as columns; the fetched dicts are dropped here
+        return self.load_columns(CatalogColumns.from_rows(rows))
+
+    def load_snapshot(self, path, max_age=None):
+        """Rebuild the index from a snapshot file; None if it is older than max_age seconds"""
+        columns = CatalogColumns.open(path)
+        if max_age and time.time() - columns.created_at > max_age:
+            return None
+        return self.load_columns(columns)
+
+    def save_snapshot(self, path):
+        """Write the columns to a snapshot file for other processes to start from
+
+        Returns None (and writes nothing) while refreshed rows are waiting
+        for compact().
+        """
+        with self._lock:
+            columns = self.columns if self.packed else None
+        return columns.save(path) if columns is not None else None
+
+    def compact(self):
+        """Pack rows that refreshes left as dicts into new columns, swapping in views of them
+
+        The columns are built without holding the lock. Returns the (old
+        row, new view) pairs swapped, so caches keyed on row objects can
+        keep their entries, or None if a refresh came in meanwhile.
+        """
+        with self._lock:
+            if self.packed:
+                return []
+            generation = self._generation
+            rows = sorted(self._rows.values(), key=lambda row: row['id'])
+            loaded_at = self.loaded_at
+        columns = CatalogColumns.from_rows(rows, created_at=loaded_at)
+        with self._lock:
+            if self._generation != generation:
+                return None
+            replaced = list(zip(rows, columns.rows()))
+            read_id = columns.readers['id']
+            for position, (_, view) in enumerate(replaced):
+                self._rows[read_id(position)] = view
+            self.columns = columns
+            self.packed = True
+        return replaced
+
+    def load_columns(self, columns):
+        """Rebuild the whole index over the rows of a CatalogColumns"""
+        rows = columns.rows()
+        fresh = CatalogIndex(self.synonyms)
+        fresh._add_columns(columns)
+        fresh._order.sort()
+        fresh._departures.sort()
+
+        with self._lock:
+            self._rows = fresh._rows
+            self._keys = fresh._keys
+            self._price_keys = fresh._price_keys
+            self._postings = fresh._postings
+            self._order = fresh._order
+            self._dates = fresh._dates
+            self._departures = fresh._departures
+            self._groups = fresh._groups
+            self._group_postings = fresh._group_postings
+            self._facet_cache = {}
+            self._key_sets = fresh._key_sets
+            self._date_lists = fresh._date_lists
+            self.columns = columns
+            self.packed = True
+            self._generation += 1
+            self.loaded_at = columns.created_at
+            self.loaded = True
+        return len(rows)
+
+    def refresh(self, connection, package_ids=None, hotel_ids=None):
+        """Re-read changed packages/hotels, or everything when no ids are given"""
+        if not self.loaded or (package_ids is None and hotel_ids is None):
+            return self.load(connection)
+
+        package_ids = list(package_ids or [])
+        hotel_ids = list(hotel_ids or [])
+        conditions = []
+        params = []
+        if package_ids:
+            conditions.append(f"p.id IN ({', '.join(['%s'] * len(package_ids))})")
+            params.extend(package_ids)
+        if hotel_ids:
+            conditions.append(f"p.hotel_id IN ({', '.join(['%s'] * len(hotel_ids))})")
+            params.extend(hotel_ids)
+        if not conditions:
+            return 0
+
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(CATALOG_QUERY + " WHERE " + " OR ".join(conditions), params)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        with self._lock:
+            # Packages asked for but no longer present were deleted
+            for package_id in set(package_ids) - {row['id'] for row in rows}:
+                self._remove(package_id)
+            for row in rows:
+                self._remove(row['id'])
+                self._add(row)
+            # Refreshed rows are dicts now; compact() packs them back into columns
+            self.packed = False
+            self._generation += 1
+            self.loaded_at = time.time()
+        return len(rows)
+
+    # -- querying ---------------------------------------------------------
+
+    def _match_phrase(self, phrase):
+        matched = None
+        for token in phrase.split():
+            ids = self._postings.get(token, set())
+            matched = set(ids) if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched or set()
+
+    def _expansions(self, query):
+        phrases = {query}
+        tokens = query.split()
+        grams = set(tokens)
+        grams.update(' '.join(pair) for pair in zip(tokens, tokens[1:]))
+        grams.update(' '.join(triple) for triple in zip(tokens, tokens[1:], tokens[2:]))
+        for gram in grams:
+            phrases.update(self.synonyms.get(gram, ()))
+        return phrases
+
+    def match(self, destination):
+        """Ids of packages whose destination or hotel city matches the query, or None for all"""
+        query = normalize(destination)
+        if not query:
+            return None
+        with self._lock:
+            matched = set()
+            for phrase in self._expansions(query):
+                matched |= self._match_phrase(phrase)
+            return matched
+
+    def facets(self, destination=''):
+        """Facet counts for a destination query, summed from per-(destination, city) summaries
+
+        Every package of a (destination, city) group is posted under the same
+        keys, so a query matches whole groups; results are cached until the
+        catalog changes.
+        """
+        query = normalize(destination)
+        with self._lock:
+            cached = self._facet_cache.get(query)
+            if cached is not None:
+                return cached
+            if query:
+                groups = set()
+                for phrase in self._expansions(query):
+                    matched = None
+                    for token in phrase.split():
+                        found = self._group_postings.get(token, set())
+                        matched = set(found) if matched is None else matched & found
+                        if not matched:
+                            break
+                    groups |= matched or set()
+            else:
+                groups = self._groups
+            summary = {}
+            for group in groups:
+                for key, count in self._groups[group].items():
+                    summary[key] = summary.get(key, 0) + count
+            facets = render_facets(summary)
+            if len(self._facet_cache) >= 1024:
+                self._facet_cache.clear()
+            self._facet_cache[query] = facets
+            return facets
+
+    def departing(self, start, end):
+        """Ids of packages with an available date between start and end (YYYY-MM-DD, inclusive)"""
+        with self._lock:
+            low = bisect.bisect_left(self._departures, (start,))
+            high = bisect.bisect_left(self._departures, (end + '\x7f',))
+            return {package_id for _, package_id in self._departures[low:high]}
+
+    def _walk(self, after, descending):
+        """Price-ordered entries strictly past the keyset position after"""
+        if descending:
+            end = len(self._order) if after is None else bisect.bisect_left(self._order, after)
+            for position in range(end - 1, -1, -1):
+                yield self._order[position]
+        else:
+            start = 0 if after is None else bisect.bisect_right(self._order, after)
+            for position in range(start, len(self._order)):
+                yield self._order[position]
+
+    def page(self, destination='', limit=20, predicate=None, after=None, descending=False, departing=None):
+        """One page of price-ordered rows plus whether more follow
+
+        after is the price_key of the last row already returned, so a deep
+        page starts with a bisect instead of skipping earlier rows.
+        departing is an optional (start, end) window of available dates.
+        """
+        with self._lock:
+            candidates = self.match(destination)
+            if departing is not None:
+                in_window = self.departing(*departing)
+                candidates = in_window if candidates is None else candidates & in_window
+            wanted = limit + 1
+            if candidates is not None and len(candidates) * 8 < len(self._order):
+                # Narrow match: sorting the candidates beats walking the price order
+                keys = (self._price_keys[i] for i in candidates)
+                if after is not None:
+                    keys = (key for key in keys if (key < after if descending else key > after))
+                if predicate is not None:
+                    keys = (key for key in keys if predicate(self._rows[key[2]]))
+                entries = (heapq.nlargest if descending else heapq.nsmallest)(wanted, keys)
+            else:
+                entries = []
+                for entry in self._walk(after, descending):
+                    if candidates is not None and entry[2] not in candidates:
+                        continue
+                    if predicate is not None and not predicate(self._rows[entry[2]]):
+                        continue
+                    entries.append(entry)
+                    if len(entries) >= wanted:
+                        break
+            rows = [self._rows[entry[2]] for entry in entries[:limit]]
+            return rows, len(entries) > limit
+
+    def search(self, destination='', limit=20, departing=None):
+        """Cheapest-first rows for a destination query"""
+        return self.page(destination, limit, departing=departing)[0]
+
+    def flagged(self, column, limit):
+        """Rows with a truthy flag column (e.g. is_treasure_hunt), lowest id first"""
+        with self._lock:
+            return heapq.nsmallest(limit, (row for row in self._rows.values() if row.get(column)), key=lambda row: row['id'])
+
+    def destinations(self):
+        """Every distinct destination and city with at least one package"""
+        with self._lock:
+            return {name for group in self._groups for name in group if name}
+
+    def rows(self):
+        """Snapshot of every indexed row"""
+        with self._lock:
+            return list(self._rows.values())
+
+    def __len__(self):
+        return len(self._rows)
+
+    def stats(self):
+        stats = {"packages": len(self._rows)}
+        if self.columns is not None:
+            stats["columnar_bytes"] = self.columns.nbytes()
+            stats["packed"] = self.packed
+        if self.loaded_at is not None:
+            stats["data_age_seconds"] = round(time.time() - self.loaded_at, 1)
+        return stats
+
+
+class CatalogPacker:
+    """Background thread packing a CatalogIndex back into columns after refreshes
+
+    Refreshes only call mark(). Changes arriving within `delay` seconds of
+    each other are packed once, off the request thread, and on_pack(replaced)
+    runs there too (e.g. to write the snapshot). With background=False,
+    mark() packs inline instead, for a process that must not leave a thread
+    mid-work when it forks.
+    """
+
+    def __init__(self, index, delay=5.0, on_pack=None, background=True):
+        self.index = index
+        self.delay = delay
+        self.on_pack = on_pack  # on_pack(replaced) after each compaction, with CatalogIndex.compact()'s pairs
+        self.background = background
+
+        self._lock = threading.Condition()
+        self._dirty = False
+        self._thread = None
+        self._closed = False
+        self._counters = {"packs": 0, "raced": 0, "errors": 0, "last_pack_ms": None}
+
+    def mark(self):
+        """Note that the index was refreshed"""
+        if not self.background:
+            self.pack()
+            return
+        with self._lock:
+            self._dirty = True
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name='catalog-packer', daemon=True)
+                self._thread.start()
+            self._lock.notify_all()
+
+    def pack(self):
+        """Compact the index now and run on_pack; False if a refresh raced it (and marked it again)"""
+        started = time.perf_counter()
+        replaced = self.index.compact()
+        if replaced is None:
+            with self._lock:
+                self._counters["raced"] += 1
+            return False
+        if self.on_pack:
+            self.on_pack(replaced)
+        with self._lock:
+            self._counters["packs"] += 1
+            self._counters["last_pack_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._lock.wait()
+                # Let a burst of refreshes settle into one pack
+                deadline = time.monotonic() + self.delay
+                while not self._closed and deadline > time.monotonic():
+                    self._lock.wait(deadline - time.monotonic())
+                if self._closed:
+                    return
+                self._dirty = False
+            try:
+                self.pack()
+            except Exception as e:
+                print(f"❌ Catalog packer error: {e}")
+                with self._lock:
+                    self._counters["errors"] += 1
+
+    def close(self):
+        """Stop the packer and pack whatever is still waiting"""
+        with self._lock:
+            self._closed = True
+            dirty, self._dirty = self._dirty, False
+            self._lock.notify_all()
+        if dirty:
+            try:
+                self.pack()
+            except Exception as e:
+                print(f"❌ Catalog packer final pack failed: {e}")
+
+    def reset(self):
+        """Forget the packer thread (e.g. in a forked child)"""
+        with self._lock:
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending"] = self._dirty
+            return stats
+
+
+def packer_from_env(index, on_pack=None, prefix='CATALOG'):
+    """Build a CatalogPacker using CATALOG_PACK_DELAY; it packs what is pending on exit"""
+    packer = CatalogPacker(index, delay=float(os.getenv(f'{prefix}_PACK_DELAY', '5')), on_pack=on_pack)
+    atexit.register(packer.close)
+    return packer
+
+
+# Catalog change notifications, so writers don't need to know who caches what
+_change_listeners = []
+
+
+def on_catalog_change(callback):
+    """Register callback(package_ids=None, hotel_ids=None) for catalog writes"""
+    _change_listeners.append(callback)
+    return callback
+
+
+def notify_catalog_change(package_ids=None, hotel_ids=None):
+    """Tell in-process caches that packages/hotels changed (None means everything)"""
+    for callback in list(_change_listeners):
+        try:
+            callback(package_ids=package_ids, hotel_ids=hotel_ids)
+        except Exception as e:
+            print(f"❌ Catalog change listener error: {e}")
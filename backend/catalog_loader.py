@@ -0,0 +1,381 @@
+"""Stream a hotel/package inventory feed (CSV or JSONL) into MySQL
+
+A full reload writes into shadow tables in fixed-size multi-row batches and
+swaps them in with a single RENAME TABLE, so readers see either the old or
+the new catalog, never a half-loaded one. --upsert instead merges rows into
+the live tables by natural key (hotel name + city, package title +
+destination). Rows are validated as they stream past; memory use depends on
+the chunk size, not on the size of the feed.
+
+Packages reference hotels either by hotel_id or by hotel_name + hotel_city.
+
+    python catalog_loader.py --hotels hotels.csv --packages packages.jsonl
+    python catalog_loader.py --packages changed_packages.jsonl --upsert
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+from mysql.connector import Error, IntegrityError
+
+from catalog_index import notify_catalog_change
+from package_search import create_missing_indexes
+
+HOTEL_COLUMNS = ('id', 'name', 'city', 'country', 'rating', 'image_url', 'description', 'amenities', 'price_per_night')
+PACKAGE_COLUMNS = ('id', 'title', 'destination', 'duration_days', 'price_per_person', 'includes_flight', 'includes_hotel', 'includes_car', 'image_url', 'description', 'hotel_id', 'available_dates', 'is_treasure_hunt', 'is_whats_hot', 'extras_value')
+
+# Unique natural keys that upserts merge on
+NATURAL_KEYS = (
+    ("hotels", "uk_hotels_name_city", "name, city"),
+    ("packages", "uk_packages_title_destination", "title, destination"),
+)
+KEY_COLUMNS = {"hotels": ('name', 'city'), "packages": ('title', 'destination')}
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TRUE = ('1', 'true', 'yes', 'y', 't')
+_FALSE = ('0', 'false', 'no', 'n', 'f')
+
+
+# -- reading ------------------------------------------------------------------
+
+def read_records(path):
+    """Yield one dict per CSV row / JSONL line (None for a line that isn't valid JSON)"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield record if isinstance(record, dict) else None
+
+
+# -- validation ---------------------------------------------------------------
+
+def _value(record, name):
+    value = record.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    return value
+
+
+def _text(record, name, max_length, required=False):
+    value = _value(record, name)
+    if value is None:
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    value = str(value)
+    if len(value) > max_length:
+        raise ValueError(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def _decimal(record, name, low, high):
+    value = _value(record, name)
+    if value is None:
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if not number.is_finite() or not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return number
+
+
+def _int(record, name, low, high):
+    value = _value(record, name)
+    if value is None:
+        return None
+    try:
+        number = int(str(value))
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return number
+
+
+def _bool(record, name, default):
+    value = _value(record, name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in _TRUE:
+        return True
+    if str(value).lower() in _FALSE:
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def _json_list(record, name, dates=False):
+    value = _value(record, name)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a JSON array")
+    if not isinstance(value, list):
+        raise ValueError(f"{name} must be a JSON array")
+    if dates and not all(isinstance(day, str) and _DATE_RE.match(day) for day in value):
+        raise ValueError(f"{name} must only contain YYYY-MM-DD dates")
+    return json.dumps(value)
+
+
+def validate_hotel(record):
+    """Column values for a hotel feed record, in HOTEL_COLUMNS order"""
+    return (
+        _int(record, 'id', 1, 2 ** 31 - 1),
+        _text(record, 'name', 255, required=True),
+        _text(record, 'city', 100, required=True),
+        _text(record, 'country', 100),
+        _decimal(record, 'rating', 0, 5),
+        _text(record, 'image_url', 65535),
+        _text(record, 'description', 65535),
+        _json_list(record, 'amenities'),
+        _decimal(record, 'price_per_night', 0, Decimal('99999999.99')),
+    )
+
+
+def validate_package(record):
+    """Column values for a package feed record, in PACKAGE_COLUMNS order
+
+    hotel_id is either an int, a (name, city) natural key or None.
+    """
+    hotel_id = _int(record, 'hotel_id', 1, 2 ** 31 - 1)
+    if hotel_id is None and _value(record, 'hotel_name') is not None:
+        hotel_id = (_text(record, 'hotel_name', 255), _text(record, 'hotel_city', 100, required=True))
+    return (
+        _int(record, 'id', 1, 2 ** 31 - 1),
+        _text(record, 'title', 255, required=True),
+        _text(record, 'destination', 100, required=True),
+        _int(record, 'duration_days', 1, 365),
+        _decimal(record, 'price_per_person', 0, Decimal('99999999.99')),
+        _bool(record, 'includes_flight', True),
+        _bool(record, 'includes_hotel', True),
+        _bool(record, 'includes_car', False),
+        _text(record, 'image_url', 65535),
+        _text(record, 'description', 65535),
+        hotel_id,
+        _json_list(record, 'available_dates', dates=True),
+        _bool(record, 'is_treasure_hunt', False),
+        _bool(record, 'is_whats_hot', False),
+        _text(record, 'extras_value', 50),
+    )
+
+
+# -- writing ------------------------------------------------------------------
+
+class TableLoad:
+    """Streams validated rows for one table into MySQL in multi-row batches"""
+
+    def __init__(self, cursor, table, target, columns, upsert, hotels_table='hotels'):
+        self.cursor = cursor
+        self.table = table
+        self.target = target  # live table for upserts, <table>_shadow for full reloads
+        # Upserts match on the natural key, so feed ids are ignored
+        self.columns = columns[1:] if upsert else columns
+        self.upsert = upsert
+        self.hotels_table = hotels_table
+        self.read = 0
+        self.written = 0
+        self.rejected = 0
+
+    def _reject(self, position, reason):
+        self.rejected += 1
+        if self.rejected <= 10:
+            print(f"❌ Skipping {self.table} row {position}: {reason}")
+        elif self.rejected == 11:
+            print(f"❌ Further rejected {self.table} rows are not logged")
+
+    def _placeholders(self, values):
+        parts = []
+        for column, value in zip(self.columns, values):
+            if column == 'hotel_id' and isinstance(value, tuple):
+                parts.append(f"(SELECT id FROM {self.hotels_table} WHERE name = %s AND city = %s)")
+            else:
+                parts.append("%s")
+        return '(' + ', '.join(parts) + ')'
+
+    def _statement(self, rows):
+        statement = f"INSERT INTO {self.target} ({', '.join(self.columns)}) VALUES " + ', '.join(self._placeholders(row) for row in rows)
+        if self.upsert:
+            updates = [column for column in self.columns if column not in KEY_COLUMNS[self.table]]
+            statement += " ON DUPLICATE KEY UPDATE " + ', '.join(f"{column} = VALUES({column})" for column in updates)
+        params = []
+        for row in rows:
+            for value in row:
+                params.extend(value if isinstance(value, tuple) else (value,))
+        return statement, params
+
+    def _write(self, rows):
+        try:
+            self.cursor.execute(*self._statement([row for _, row in rows]))
+            self.written += len(rows)
+        except IntegrityError:
+            # One bad row (duplicate key, unknown hotel) must not sink the whole batch
+            for position, row in rows:
+                try:
+                    self.cursor.execute(*self._statement([row]))
+                    self.written += 1
+                except IntegrityError as e:
+                    self._reject(position, e.msg)
+
+    def run(self, records, validate, chunk_size):
+        chunk = []
+        for position, record in enumerate(records, start=1):
+            self.read += 1
+            if record is None:
+                self._reject(position, "not a JSON object")
+                continue
+            try:
+                row = validate(record)
+            except ValueError as e:
+                self._reject(position, e)
+                continue
+            chunk.append((position, row[1:] if self.upsert else row))
+            if len(chunk) >= chunk_size:
+                self._write(chunk)
+                chunk = []
+        if chunk:
+            self._write(chunk)
+
+    def stats(self):
+        return {"read": self.read, "written": self.written, "rejected": self.rejected}
+
+
+def create_natural_keys(cursor):
+    """Create the unique natural-key indexes upserts rely on"""
+    try:
+        create_missing_indexes(cursor, NATURAL_KEYS, unique=True)
+    except Error as e:
+        print(f"❌ Could not create catalog natural keys (duplicate rows?): {e}")
+
+
+def _prepare_shadow(cursor, table, hotels_table=None):
+    cursor.execute(f"DROP TABLE IF EXISTS {table}_shadow")
+    cursor.execute(f"CREATE TABLE {table}_shadow LIKE {table}")
+    if hotels_table:
+        # CREATE TABLE ... LIKE doesn't copy foreign keys; a fresh name per load avoids clashing with the live table's
+        cursor.execute(
+            f"ALTER TABLE {table}_shadow ADD CONSTRAINT fk_{table}_hotel_{int(time.time() * 1000)} "
+            f"FOREIGN KEY (hotel_id) REFERENCES {hotels_table}(id)"
+        )
+
+
+def load_catalog(connection, hotels=None, packages=None, upsert=False, chunk_size=1000):
+    """Load hotel and/or package records (iterables of dicts); returns load stats
+
+    Full reloads replace the given tables atomically. Replacing hotels also
+    needs the package feed, because packages reference hotel ids.
+    """
+    if hotels is None and packages is None:
+        raise ValueError("nothing to load")
+    if hotels is not None and packages is None and not upsert:
+        raise ValueError("a full hotel reload also needs the package feed")
+
+    cursor = connection.cursor()
+    create_natural_keys(cursor)
+    started = time.perf_counter()
+    loads = {}
+    replaced = []
+    try:
+        if hotels is not None:
+            if not upsert:
+                _prepare_shadow(cursor, 'hotels')
+                replaced.append('hotels')
+            loads['hotels'] = TableLoad(cursor, 'hotels', 'hotels' if upsert else 'hotels_shadow', HOTEL_COLUMNS, upsert)
+            loads['hotels'].run(hotels, validate_hotel, chunk_size)
+        if packages is not None:
+            hotels_table = 'hotels_shadow' if 'hotels' in replaced else 'hotels'
+            if not upsert:
+                _prepare_shadow(cursor, 'packages', hotels_table)
+                replaced.append('packages')
+            loads['packages'] = TableLoad(cursor, 'packages', 'packages' if upsert else 'packages_shadow', PACKAGE_COLUMNS, upsert, hotels_table)
+            loads['packages'].run(packages, validate_package, chunk_size)
+
+        if replaced:
+            empty = [table for table in replaced if loads[table].written == 0]
+            if empty:
+                raise ValueError(f"refusing to swap in an empty {', '.join(empty)} table")
+            cursor.execute("DROP TABLE IF EXISTS packages_old, hotels_old")
+            cursor.execute("RENAME TABLE " + ', '.join(f"{table} TO {table}_old, {table}_shadow TO {table}" for table in replaced))
+            # packages_old references hotels_old, so it goes first
+            for table in reversed(replaced):
+                cursor.execute(f"DROP TABLE {table}_old")
+    except Exception:
+        for table in reversed(replaced):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_shadow")
+        raise
+    finally:
+        connection.commit()
+
+    seconds = time.perf_counter() - started
+    cursor.close()
+    stats = {table: load.stats() for table, load in loads.items()}
+    rows = sum(load.read for load in loads.values())
+    stats.update({"mode": "upsert" if upsert else "replace", "seconds": round(seconds, 3), "rows_per_second": round(rows / seconds, 1) if seconds else None})
+
+    notify_catalog_change()
+    return stats
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hotels', help='hotel feed (.csv or .jsonl)')
+    parser.add_argument('--packages', help='package feed (.csv or .jsonl)')
+    parser.add_argument('--upsert', action='store_true', help='merge by natural key instead of replacing the catalog')
+    parser.add_argument('--chunk-size', type=int, default=int(os.getenv('CATALOG_LOAD_CHUNK_SIZE', '1000')))
+    args = parser.parse_args(argv)
+    if not args.hotels and not args.packages:
+        parser.error("give --hotels and/or --packages")
+
+    db_config = {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', ''),
+        'database': os.getenv('MYSQL_DATABASE', 'costco_travel'),
+        'autocommit': True
+    }
+    try:
+        connection = mysql.connector.connect(**db_config)
+        stats = load_catalog(
+            connection,
+            hotels=read_records(args.hotels) if args.hotels else None,
+            packages=read_records(args.packages) if args.packages else None,
+            upsert=args.upsert,
+            chunk_size=args.chunk_size,
+        )
+        connection.close()
+    except (Error, ValueError, OSError) as e:
+        print(f"❌ Catalog load failed: {e}")
+        return 1
+
+    print(f"✅ Catalog {stats['mode']} finished in {stats['seconds']}s ({stats['rows_per_second']} rows/sec)")
+    print(json.dumps(stats, indent=2))
+    print("Running API servers need POST /api/catalog/refresh to pick up the new catalog")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
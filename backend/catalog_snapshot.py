@@ -0,0 +1,288 @@
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+from decimal import Decimal
+
+MAGIC = b'CATCOLS1'
+
+# Every column CATALOG_QUERY returns, with how it is stored:
+#   int    - array('i'), e.g. ids and durations
+#   cents  - DECIMAL(10,2) as an array('q') of hundredths
+#   tenths - DECIMAL(2,1) as an array('h') of tenths
+#   flag   - BOOLEAN as an array('b')
+#   symbol - array('i') into a table of distinct, interned strings
+#   text   - (start, length) into one UTF-8 heap, for long or unique text
+COLUMNS = (
+    ('id', 'int'),
+    ('title', 'text'),
+    ('destination', 'symbol'),
+    ('duration_days', 'int'),
+    ('price_per_person', 'cents'),
+    ('includes_flight', 'flag'),
+    ('includes_hotel', 'flag'),
+    ('includes_car', 'flag'),
+    ('image_url', 'text'),
+    ('description', 'text'),
+    ('hotel_id', 'int'),
+    ('available_dates', 'text'),
+    ('is_treasure_hunt', 'flag'),
+    ('is_whats_hot', 'flag'),
+    ('extras_value', 'symbol'),
+    ('hotel_name', 'symbol'),
+    ('hotel_rating', 'tenths'),
+    ('city', 'symbol'),
+    ('country', 'symbol'),
+)
+
+NAMES = tuple(name for name, _ in COLUMNS)
+KINDS = dict(COLUMNS)
+
+# (typecode, value stored for NULL)
+STORAGE = {
+    'int': ('i', -2 ** 31),
+    'cents': ('q', -2 ** 63),
+    'tenths': ('h', -2 ** 15),
+    'flag': ('b', -1),
+    'symbol': ('i', -1),
+}
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _encode(kind, value):
+    """Stored integer for one non-NULL value"""
+    if kind == 'cents':
+        return int((Decimal(str(value)) * 100).to_integral_value())
+    if kind == 'tenths':
+        return int((Decimal(str(value)) * 10).to_integral_value())
+    return int(value)
+
+
+class PackageRow(Mapping):
+    """Read-only dict-like view of one catalog row, decoded from the columns on access
+
+    Values come back as the MySQL cursor returns them (Decimal prices and
+    ratings, 0/1 flags, str text), so index code and cards can't tell a
+    view from a fetched row.
+    """
+
+    __slots__ = ('_columns', '_position')
+
+    def __init__(self, columns, position):
+        self._columns = columns
+        self._position = position
+
+    def __getitem__(self, name):
+        read = self._columns.readers.get(name)
+        if read is None:
+            raise KeyError(name)
+        return read(self._position)
+
+    def get(self, name, default=None):
+        read = self._columns.readers.get(name)
+        return default if read is None else read(self._position)
+
+    def __iter__(self):
+        return iter(NAMES)
+
+    def __len__(self):
+        return len(NAMES)
+
+    def __repr__(self):
+        return f"PackageRow({dict(self)!r})"
+
+
+class CatalogColumns:
+    """Column-per-field catalog: flat arrays, interned strings and one text heap
+
+    A package costs a few dozen bytes of arrays plus its text, instead of a
+    dict with a Decimal and a str per field. save() writes the columns to a
+    file that open() memory-maps, so processes opening (or forking after
+    opening) the same snapshot share its pages instead of each holding a
+    copy.
+    """
+
+    def __init__(self, count, columns, symbols, text, created_at, mapped=None):
+        self.count = count
+        self.symbols = symbols
+        self.created_at = created_at  # when the rows were read from MySQL
+        self._columns = columns  # name -> array or memoryview (text: (starts, lengths))
+        self._text = text
+        self._mapped = mapped
+        self.readers = {name: self._reader(kind, columns[name]) for name, kind in COLUMNS}
+        self._rows = None
+
+    def _reader(self, kind, column):
+        if kind == 'text':
+            starts, lengths = column
+            text = self._text
+
+            def read(position):
+                length = lengths[position]
+                if length < 0:
+                    return None
+                start = starts[position]
+                return str(text[start:start + length], 'utf-8')
+            return read
+
+        null = STORAGE[kind][1]
+        if kind == 'symbol':
+            symbols = self.symbols
+
+            def read(position):
+                value = column[position]
+                return None if value == null else symbols[value]
+        elif kind in ('cents', 'tenths'):
+            exponent = -2 if kind == 'cents' else -1
+
+            def read(position):
+                value = column[position]
+                return None if value == null else Decimal(value).scaleb(exponent)
+        else:
+            def read(position):
+                value = column[position]
+                return None if value == null else value
+        return read
+
+    @classmethod
+    def from_rows(cls, rows, created_at=None):
+        """Columns for catalog rows (cursor dicts or PackageRow views)"""
+        columns = {}
+        for name, kind in COLUMNS:
+            columns[name] = (array('q'), array('i')) if kind == 'text' else array(STORAGE[kind][0])
+        symbols, symbol_ids = [], {}
+        text = bytearray()
+        count = 0
+        for row in rows:
+            count += 1
+            for name, kind in COLUMNS:
+                value = row.get(name)
+                column = columns[name]
+                if kind == 'text':
+                    if value is None:
+                        column[0].append(0)
+                        column[1].append(-1)
+                        continue
+                    if isinstance(value, str):
+                        value = value.encode('utf-8')
+                    column[0].append(len(text))
+                    column[1].append(len(value))
+                    text += value
+                elif value is None:
+                    column.append(STORAGE[kind][1])
+                elif kind == 'symbol':
+                    symbol = symbol_ids.get(value)
+                    if symbol is None:
+                        symbol = symbol_ids[value] = len(symbols)
+                        symbols.append(sys.intern(value))
+                    column.append(symbol)
+                else:
+                    column.append(_encode(kind, value))
+        return cls(count, columns, symbols, bytes(text), created_at if created_at is not None else time.time())
+
+    def values(self, name):
+        """Iterator over every package's value of one column, in column order
+
+        Yields what readers[name] returns one position at a time, without
+        the per-call overhead.
+        """
+        kind = KINDS[name]
+        column = self._columns[name]
+        if kind == 'text':
+            starts, lengths = column
+            text = self._text
+            return (None if length < 0 else str(text[start:start + length], 'utf-8') for start, length in zip(starts, lengths))
+        null = STORAGE[kind][1]
+        if kind == 'symbol':
+            symbols = self.symbols
+            return (None if value == null else symbols[value] for value in column)
+        if kind in ('cents', 'tenths'):
+            exponent = -2 if kind == 'cents' else -1
+            return (None if value == null else Decimal(value).scaleb(exponent) for value in column)
+        return (None if value == null else value for value in column)
+
+    def rows(self):
+        """One PackageRow per package, in column order (the same objects on every call)"""
+        if self._rows is None:
+            self._rows = [PackageRow(self, position) for position in range(self.count)]
+        return self._rows
+
+    def nbytes(self):
+        """Bytes held by the arrays and the text heap (not the symbol table)"""
+        total = len(self._text)
+        for name, kind in COLUMNS:
+            parts = self._columns[name] if kind == 'text' else (self._columns[name],)
+            total += sum(memoryview(part).nbytes for part in parts)
+        return total
+
+    def save(self, path):
+        """Write the columns to path atomically (via a temp file and rename)"""
+        sections = []
+        for name, kind in COLUMNS:
+            parts = self._columns[name] if kind == 'text' else (self._columns[name],)
+            for index, part in enumerate(parts):
+                sections.append((f"{name}.{index}", memoryview(part).format, memoryview(part).tobytes()))
+        sections.append(("text", "B", bytes(self._text)))
+
+        layout = {}
+        offset = 0
+        for key, typecode, data in sections:
+            layout[key] = [typecode, offset, len(data)]
+            offset = _align(offset + len(data))
+        header = json.dumps({
+            "count": self.count,
+            "created_at": self.created_at,
+            "byteorder": sys.byteorder,
+            "symbols": self.symbols,
+            "sections": layout,
+        }).encode('utf-8')
+        start = _align(16 + len(header))
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as out:
+            out.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+            out.write(b'\0' * (start - 16 - len(header)))
+            for key, _, data in sections:
+                out.write(data)
+                out.write(b'\0' * (_align(len(data)) - len(data)))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary, path)
+        return start + offset
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a snapshot written by save(); ValueError if it isn't one"""
+        with open(path, 'rb') as source:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:8] != MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a catalog snapshot")
+        length = int.from_bytes(mapped[8:16], 'little')
+        header = json.loads(mapped[16:16 + length])
+        if header["byteorder"] != sys.byteorder:
+            mapped.close()
+            raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+        start = _align(16 + length)
+        view = memoryview(mapped)
+
+        def section(key):
+            typecode, offset, size = header["sections"][key]
+            data = view[start + offset:start + offset + size]
+            return data if typecode == 'B' else data.cast(typecode)
+
+        try:
+            columns = {}
+            for name, kind in COLUMNS:
+                columns[name] = (section(f"{name}.0"), section(f"{name}.1")) if kind == 'text' else section(f"{name}.0")
+            text = section("text")
+        except KeyError as e:
+            raise ValueError(f"{path} has no {e} section") from None
+        symbols = [sys.intern(symbol) for symbol in header["symbols"]]
+        return cls(header["count"], columns, symbols, text, header["created_at"], mapped)
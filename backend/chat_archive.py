@@ -0,0 +1,408 @@
+"""Chat history storage lifecycle: indexes, monthly partitions and a cold-session archiver
+
+Messages of sessions with no new message for CHAT_ARCHIVE_AFTER_DAYS are
+moved out of chat_messages into chat_archive, one zlib-compressed JSON blob
+per session, so chat_messages only holds recent conversations. History
+reads fall through to the archive once a session's live messages run out.
+
+    python chat_archive.py --once      # archive one round of cold sessions and exit
+    python chat_archive.py             # keep archiving every CHAT_ARCHIVE_INTERVAL seconds
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+from package_search import create_missing_indexes
+
+CHAT_INDEXES = (
+    # History pages and context windows (session_id = ? [AND id < ?] ORDER BY id DESC),
+    # archiving a session (ORDER BY id), and covering for the archiver's MAX(timestamp) check
+    ("chat_messages", "idx_chat_messages_session_id", "session_id, id, timestamp"),
+    # The archiver's boundary: newest message older than the cutoff (InnoDB appends id to the key)
+    ("chat_messages", "idx_chat_messages_timestamp", "timestamp"),
+    # Latest session per user
+    ("chat_sessions", "idx_chat_sessions_user_updated", "user_id, updated_at"),
+)
+
+ARCHIVE_TABLE = """
+CREATE TABLE IF NOT EXISTS chat_archive (
+    session_id INT PRIMARY KEY,
+    message_count INT NOT NULL,
+    first_message_id INT NOT NULL,
+    last_message_id INT NOT NULL,
+    last_message_at DATETIME NULL,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    messages LONGBLOB NOT NULL
+)
+"""
+
+
+# -- schema -------------------------------------------------------------------
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_clause(month):
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{_month_start(month, 1).isoformat()}'))"
+
+
+def partition_names(cursor):
+    """Names of chat_messages partitions, oldest first (empty when not partitioned)"""
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'chat_messages' AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def partition_chat_messages(cursor, months_ahead=3, today=None):
+    """Convert chat_messages to monthly RANGE partitions on timestamp, once
+
+    MySQL can't partition a table that has foreign keys, and the primary key
+    must include the partitioning column, so this drops chat_messages'
+    foreign key to chat_sessions and makes the primary key (id, timestamp).
+    """
+    if partition_names(cursor):
+        return ensure_partitions(cursor, months_ahead, today)
+    today = today or date.today()
+    cursor.execute("""
+        SELECT constraint_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND table_name = 'chat_messages'
+    """)
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE chat_messages DROP FOREIGN KEY {name}")
+    cursor.execute("""
+        ALTER TABLE chat_messages
+            MODIFY timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, timestamp)
+    """)
+    cursor.execute("SELECT MIN(timestamp) FROM chat_messages")
+    oldest = cursor.fetchone()[0]
+    month = _month_start(oldest.date() if oldest else today)
+    last = _month_start(today, months_ahead)
+    clauses = []
+    while month <= last:
+        clauses.append(_partition_clause(month))
+        month = _month_start(month, 1)
+    clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"ALTER TABLE chat_messages PARTITION BY RANGE (TO_DAYS(timestamp)) ({', '.join(clauses)})")
+    return len(clauses) - 1
+
+
+def ensure_partitions(cursor, months_ahead=3, today=None):
+    """Split pmax so there is a partition for each of the next months_ahead months"""
+    names = [name for name in partition_names(cursor) if name != 'pmax']
+    if not names:
+        return 0
+    month = _month_start(datetime.strptime(names[-1], 'p%Y%m').date(), 1)
+    last = _month_start(today or date.today(), months_ahead)
+    clauses = []
+    while month <= last:
+        clauses.append(_partition_clause(month))
+        month = _month_start(month, 1)
+    if clauses:
+        clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        cursor.execute(f"ALTER TABLE chat_messages REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})")
+    return len(clauses) - 1 if clauses else 0
+
+
+def drop_empty_partitions(cursor, before):
+    """Drop monthly partitions that end before the given date and hold no rows"""
+    dropped = []
+    names = [name for name in partition_names(cursor) if name != 'pmax']
+    # Keep at least one partition below pmax
+    for name in names[:-1]:
+        if _month_start(datetime.strptime(name, 'p%Y%m').date(), 1) > before:
+            break
+        cursor.execute(f"SELECT 1 FROM chat_messages PARTITION ({name}) LIMIT 1")
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE chat_messages DROP PARTITION {name}")
+            dropped.append(name)
+    return dropped
+
+
+def create_chat_storage(cursor, partitioned=False, months_ahead=3):
+    """Create the chat history indexes and archive table, and optionally partition chat_messages"""
+    create_missing_indexes(cursor, CHAT_INDEXES)
+    cursor.execute(ARCHIVE_TABLE)
+    if partitioned:
+        partition_chat_messages(cursor, months_ahead)
+
+
+# -- archive reads ------------------------------------------------------------
+
+def _encode(messages):
+    rows = [{
+        "id": row['id'],
+        "sender": row['sender'],
+        "message_text": row['message_text'],
+        "timestamp": row['timestamp'].isoformat() if row['timestamp'] else None,
+    } for row in messages]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(blob):
+    rows = json.loads(zlib.decompress(blob).decode('utf-8'))
+    for row in rows:
+        row['timestamp'] = datetime.fromisoformat(row['timestamp']) if row['timestamp'] else None
+    return rows
+
+
+def archived_messages(cursor, session_id, before_id=None, limit=50):
+    """Newest archived messages of a session with id < before_id, newest first (None if it has no archive)"""
+    cursor.execute("SELECT messages FROM chat_archive WHERE session_id = %s", (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    blob = row['messages'] if isinstance(row, dict) else row[0]
+    messages = [dict(message, session_id=session_id) for message in _decode(blob)
+                if before_id is None or message['id'] < before_id]
+    return messages[::-1][:limit]
+
+
+# -- archiving ----------------------------------------------------------------
+
+def archive_session(connection, session_id):
+    """Move one session's messages into its archive blob; returns the number moved"""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        connection.start_transaction()
+        cursor.execute("""
+            SELECT id, sender, message_text, timestamp FROM chat_messages
+            WHERE session_id = %s ORDER BY id
+        """, (session_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            connection.rollback()
+            return 0
+        cursor.execute("SELECT messages FROM chat_archive WHERE session_id = %s FOR UPDATE", (session_id,))
+        existing = cursor.fetchone()
+        archived = _decode(existing['messages']) if existing else []
+        archived_ids = {message['id'] for message in archived}
+        messages = archived + [row for row in rows if row['id'] not in archived_ids]
+        cursor.execute("""
+            INSERT INTO chat_archive (session_id, message_count, first_message_id, last_message_id, last_message_at, messages)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE message_count = VALUES(message_count), first_message_id = VALUES(first_message_id),
+                last_message_id = VALUES(last_message_id), last_message_at = VALUES(last_message_at),
+                archived_at = CURRENT_TIMESTAMP, messages = VALUES(messages)
+        """, (session_id, len(messages), messages[0]['id'], messages[-1]['id'], rows[-1]['timestamp'], _encode(messages)))
+        # Only what was copied; a message that arrived meanwhile stays live
+        cursor.execute("DELETE FROM chat_messages WHERE session_id = %s AND id <= %s", (session_id, rows[-1]['id']))
+        connection.commit()
+        return len(rows)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class ChatArchiver:
+    """Background job moving cold sessions' messages into chat_archive and keeping partitions current"""
+
+    def __init__(self, connection_factory, after_days=30, interval=3600.0, batch_sessions=100, scan_rows=10000, months_ahead=3, on_archive=None):
+        self.connection_factory = connection_factory
+        self.on_archive = on_archive  # on_archive(session_id) after a session's messages are moved
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_sessions = batch_sessions
+        self.scan_rows = scan_rows  # chat_messages rows looked at per run for candidate sessions
+        self.months_ahead = months_ahead
+
+        self._lock = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # Every session with a live message at or below this id has been checked;
+        # one that is still live has newer messages above it
+        self._cursor = 0
+        self._counters = {"runs": 0, "sessions": 0, "messages": 0, "scanned": 0, "errors": 0, "partitions_added": 0, "partitions_dropped": 0, "last_run_ms": None}
+
+    @property
+    def enabled(self):
+        return self.after_days > 0
+
+    def cold_sessions(self, cursor, cutoff):
+        """(sessions whose newest live message is older than cutoff, id the next scan starts after, more to scan)
+
+        Walks chat_messages by primary key from the last run's cursor up to the
+        newest message older than cutoff, so a run reads at most scan_rows
+        rows plus an index lookup per candidate session instead of grouping
+        the whole table.
+        """
+        with self._lock:
+            start = self._cursor
+        cursor.execute("""
+            SELECT id FROM chat_messages
+            WHERE timestamp < %s
+            ORDER BY timestamp DESC, id DESC
+            LIMIT 1
+        """, (cutoff,))
+        row = cursor.fetchone()
+        if row is None or row[0] <= start:
+            return [], start, False
+        boundary = row[0]
+        cursor.execute("""
+            SELECT id, session_id FROM chat_messages
+            WHERE id > %s AND id <= %s
+            ORDER BY id
+            LIMIT %s
+        """, (start, boundary, self.scan_rows))
+        rows = cursor.fetchall()
+        with self._lock:
+            self._counters["scanned"] += len(rows)
+        if not rows:
+            return [], boundary, False
+        first_ids = {}  # session id -> its first row in the scan, in scan order
+        for message_id, session_id in rows:
+            first_ids.setdefault(session_id, message_id)
+        # Reached the boundary, or only went scan_rows rows
+        end = boundary if len(rows) < self.scan_rows else rows[-1][0]
+
+        candidates = list(first_ids)
+        placeholders = ', '.join(['%s'] * len(candidates))
+        cursor.execute(f"""
+            SELECT session_id FROM chat_messages
+            WHERE session_id IN ({placeholders})
+            GROUP BY session_id
+            HAVING MAX(timestamp) < %s
+        """, (*candidates, cutoff))
+        cold = {row[0] for row in cursor.fetchall()}
+        cold = [session_id for session_id in candidates if session_id in cold]
+        if len(cold) > self.batch_sessions:
+            # Stop just before the first cold session that didn't fit, so the next run starts there
+            end = first_ids[cold[self.batch_sessions]] - 1
+            cold = cold[:self.batch_sessions]
+        return cold, end, end < boundary
+
+    def run_once(self, now=None):
+        """Archive up to batch_sessions cold sessions and maintain partitions"""
+        started = time.perf_counter()
+        cutoff = (now or datetime.now()) - timedelta(days=self.after_days)
+        sessions = messages = 0
+        with self.connection_factory() as connection:
+            cursor = connection.cursor()
+            session_ids, end, more = self.cold_sessions(cursor, cutoff)
+            cursor.close()
+            for session_id in session_ids:
+                moved = archive_session(connection, session_id)
+                sessions += 1 if moved else 0
+                messages += moved
+                if moved and self.on_archive:
+                    self.on_archive(session_id)
+            # Only once the batch is archived; after an error the next run rescans it
+            with self._lock:
+                self._cursor = max(self._cursor, end)
+
+            cursor = connection.cursor()
+            added = ensure_partitions(cursor, self.months_ahead)
+            dropped = drop_empty_partitions(cursor, cutoff.date())
+            cursor.close()
+
+        with self._lock:
+            self._counters["runs"] += 1
+            self._counters["sessions"] += sessions
+            self._counters["messages"] += messages
+            self._counters["partitions_added"] += added
+            self._counters["partitions_dropped"] += len(dropped)
+            self._counters["last_run_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return {"sessions": sessions, "messages": messages, "partitions_added": added, "partitions_dropped": dropped, "more": more}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+            try:
+                result = self.run_once()
+                if result["sessions"]:
+                    print(f"✅ Archived {result['messages']} chat messages from {result['sessions']} sessions")
+                # The scan stopped short of the cutoff (a full batch or scan_rows); don't sleep the whole interval
+                delay = 1.0 if result["more"] else self.interval
+            except Exception as e:
+                print(f"❌ Chat archiver error: {e}")
+                with self._lock:
+                    self._counters["errors"] += 1
+                delay = self.interval
+            with self._lock:
+                if not self._closed:
+                    self._lock.wait(delay)
+
+    def start(self):
+        """Run the archiver in a daemon thread (no-op when disabled or already running)"""
+        with self._lock:
+            if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='chat-archiver', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+
+    def reset(self):
+        """Forget the archiver thread and scan cursor (e.g. in a forked child)"""
+        with self._lock:
+            self._thread = None
+            self._cursor = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["enabled"] = self.enabled
+            stats["after_days"] = self.after_days
+            stats["cursor"] = self._cursor
+            return stats
+
+
+def archiver_from_env(connection_factory, prefix='CHAT_ARCHIVE'):
+    """Build a ChatArchiver using CHAT_ARCHIVE_* environment settings (AFTER_DAYS=0 disables it)"""
+    return ChatArchiver(
+        connection_factory,
+        after_days=int(os.getenv(f'{prefix}_AFTER_DAYS', '30')),
+        interval=float(os.getenv(f'{prefix}_INTERVAL', '3600')),
+        batch_sessions=int(os.getenv(f'{prefix}_BATCH_SESSIONS', '100')),
+        scan_rows=int(os.getenv(f'{prefix}_SCAN_ROWS', '10000')),
+        months_ahead=int(os.getenv('CHAT_PARTITION_MONTHS_AHEAD', '3')),
+    )
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='archive one batch and exit')
+    args = parser.parse_args(argv)
+
+    import app as api
+
+    archiver = api.chat_archiver
+    if not archiver.enabled:
+        print("❌ Chat archiving is disabled (CHAT_ARCHIVE_AFTER_DAYS=0)")
+        return 1
+    if args.once:
+        print(json.dumps(archiver.run_once()))
+        return 0
+    archiver.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        archiver.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class SessionContext:
+    """Bounded view of one chat session: recent turns, a summary of older ones, and its SessionState"""
+
+    def __init__(self, session, window, summary_chars):
+        self.session = session
+        self.session_id = session.session_id
+        self.turns = deque(maxlen=window)  # (sender, text), oldest first
+        self.summary_chars = summary_chars
+        self.summary = deque()  # short snippets of user turns that left the window
+        self.summarized = 0
+        self.touched = time.monotonic()
+
+    @property
+    def params(self):
+        return self.session.params
+
+    def _fold(self, sender, text):
+        """Fold a turn that is about to leave the window into the summary"""
+        self.summarized += 1
+        if sender != 'user':
+            return
+        snippet = ' '.join(text.split())
+        if len(snippet) > 80:
+            snippet = snippet[:77] + '...'
+        self.summary.append(snippet)
+        while len(self.summary) > 1 and sum(len(s) + 2 for s in self.summary) > self.summary_chars:
+            self.summary.popleft()
+
+    def append(self, sender, text):
+        if len(self.turns) == self.turns.maxlen:
+            self._fold(*self.turns[0])
+        self.turns.append((sender, text or ''))
+
+    def history_text(self):
+        """Conversation history in the prompt's 'Sender: text' format"""
+        lines = []
+        if self.summarized:
+            line = f"(Summary of {self.summarized} earlier messages"
+            if self.summary:
+                line += "; the user said: " + '; '.join(self.summary)
+            lines.append(line + ")")
+        for sender, text in self.turns:
+            lines.append(f"{sender.capitalize()}: {text}")
+        return ''.join(line + '\n' for line in lines)
+
+
+class ChatContextStore:
+    """LRU of SessionContext objects, loaded with bounded queries and updated per turn"""
+
+    def __init__(self, sessions, window=12, summary_turns=24, summary_chars=600, max_sessions=10000, idle_ttl=900.0, journal=None):
+        self.sessions = sessions  # SessionCache holding each session's params
+        self.journal = journal  # MessageJournal whose unflushed writes must be merged on load
+        self.window = window
+        self.summary_turns = summary_turns
+        self.summary_chars = summary_chars
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._contexts = OrderedDict()
+
+    def _put(self, context):
+        with self._lock:
+            self._contexts[context.session_id] = context
+            self._contexts.move_to_end(context.session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+        return context
+
+    def cached(self, session_id):
+        """Context for session_id if it is already in memory, else None"""
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is None:
+                return None
+            if time.monotonic() - context.touched > self.idle_ttl or not self.sessions.current(context.session):
+                del self._contexts[session_id]
+                return None
+            self._contexts.move_to_end(session_id)
+            context.touched = time.monotonic()
+            return context
+
+    def create(self, session):
+        """Start an empty context for a session that was just created"""
+        return self._put(SessionContext(session, self.window, self.summary_chars))
+
+    def get(self, session_id, cursor):
+        """Context for session_id, loading the last window + summary turns on a miss; None if there is no such session"""
+        context = self.cached(session_id)
+        if context is not None:
+            return context
+
+        session = self.sessions.get(session_id, cursor)
+        if session is None:
+            # Messages for it could never be written (chat_messages has a foreign key)
+            return None
+
+        def read():
+            cursor.execute("""
+                SELECT sender, message_text FROM chat_messages
+                WHERE session_id = %s
+                ORDER BY id DESC
+                LIMIT %s
+            """, (session_id, self.window + self.summary_turns))
+            return list(reversed(cursor.fetchall()))
+
+        if self.journal:
+            recent = self.journal.consistent_read(read, lambda rows: rows + self.journal.pending(session_id))
+        else:
+            recent = read()
+
+        context = SessionContext(session, self.window, self.summary_chars)
+        for row in recent:
+            context.append(row['sender'], row['message_text'])
+        return self._put(context)
+
+    def drop(self, session_id=None):
+        """Forget one session's context, or every cached context"""
+        with self._lock:
+            if session_id is None:
+                self._contexts.clear()
+            else:
+                self._contexts.pop(session_id, None)
+
+
+def context_store_from_env(sessions, journal=None, prefix='CHAT_CONTEXT'):
+    """Build a ChatContextStore using CHAT_CONTEXT_* environment settings"""
+    return ChatContextStore(
+        sessions,
+        journal=journal,
+        window=int(os.getenv(f'{prefix}_WINDOW', '12')),
+        summary_turns=int(os.getenv(f'{prefix}_SUMMARY_TURNS', '24')),
+        summary_chars=int(os.getenv(f'{prefix}_SUMMARY_CHARS', '600')),
+        max_sessions=int(os.getenv(f'{prefix}_MAX_SESSIONS', '10000')),
+        idle_ttl=float(os.getenv(f'{prefix}_IDLE_TTL', '900')),
+    )
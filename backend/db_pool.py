@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeoutError(Error):
+    """Raised when no pooled connection becomes free within the wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with health checks and recycling"""
+
+    def __init__(self, config, size=10, wait_timeout=5.0, max_lifetime=1800.0, ping_interval=30.0):
+        self.config = dict(config)
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, created_at, last_used_at)
+        self._created_at = {}  # id(connection) -> created_at
+        self._in_use = 0
+
+        # Counters for sizing the pool against real traffic
+        self._acquired = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_checks = 0
+        self._timeouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _open(self):
+        connection = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._created += 1
+        return connection
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, connection, created_at, last_used_at):
+        """Check a connection before handing it out"""
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            with self._lock:
+                self._recycled += 1
+            return False
+        if now - last_used_at < self.ping_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._failed_checks += 1
+            return False
+
+    def acquire(self):
+        """Borrow a connection, waiting up to wait_timeout for a free slot"""
+        started = time.monotonic()
+        waited = False
+        with self._lock:
+            while not self._idle and self._in_use >= self.size:
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(msg=f"No database connection available after {self.wait_timeout}s")
+                waited = True
+                self._lock.wait(remaining)
+            if waited:
+                wait_time = time.monotonic() - started
+                self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+            candidate = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._acquired += 1
+
+        try:
+            # Reuse the most recently returned connection if it is still good
+            while candidate:
+                connection, created_at, last_used_at = candidate
+                if self._is_healthy(connection, created_at, last_used_at):
+                    return connection
+                self._forget(connection)
+                self._close(connection)
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+
+            connection = self._open()
+            with self._lock:
+                self._created_at[id(connection)] = time.monotonic()
+            return connection
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        """Return a borrowed connection to the pool"""
+        with self._lock:
+            self._in_use -= 1
+            created_at = self._created_at.get(id(connection))
+            # A connection left with unread results would fail its next query
+            if discard or created_at is None or getattr(connection, 'unread_result', False):
+                self._created_at.pop(id(connection), None)
+                keep = False
+            else:
+                self._idle.append((connection, created_at, time.monotonic()))
+                keep = True
+            self._lock.notify()
+        if not keep:
+            self._close(connection)
+
+    def _forget(self, connection):
+        with self._lock:
+            self._created_at.pop(id(connection), None)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with-block"""
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except Error:
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones close on release)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            for connection, _, _ in idle:
+                self._created_at.pop(id(connection), None)
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def divide(self, processes):
+        """Split the pool size across processes that each run a pool (at least 1 each)"""
+        with self._lock:
+            self.size = max(1, self.size // processes)
+
+    def reset(self):
+        """Forget every connection without closing it (e.g. in a forked child, where they belong to the parent)"""
+        with self._lock:
+            self._idle.clear()
+            self._created_at.clear()
+            self._in_use = 0
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "acquired": self._acquired,
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_checks,
+                "timeouts": self._timeouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+            }
+
+
+def pool_from_env(config, prefix='MYSQL_POOL'):
+    """Build a ConnectionPool using MYSQL_POOL_* environment settings"""
+    return ConnectionPool(
+        config,
+        size=int(os.getenv(f'{prefix}_SIZE', '10')),
+        wait_timeout=float(os.getenv(f'{prefix}_WAIT_TIMEOUT', '5')),
+        max_lifetime=float(os.getenv(f'{prefix}_MAX_LIFETIME', '1800')),
+        ping_interval=float(os.getenv(f'{prefix}_PING_INTERVAL', '30')),
+    )
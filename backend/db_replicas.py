@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+from mysql.connector import Error
+
+from db_pool import ConnectionPool
+
+
+class Replica:
+    """One read replica: its pool and the result of its last lag check"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = False
+        self.lag = None  # seconds behind the primary, None if unknown
+        self.checked_at = None
+        self.reads = 0
+        self.failed_checks = 0
+
+
+class ReplicaSet:
+    """Read replicas for read-only handlers, skipping any that lag or fail
+
+    Each replica's lag (Seconds_Behind_Source from SHOW REPLICA STATUS) is
+    re-checked at most every check_interval seconds, on the request that
+    finds the last check stale. acquire() returns None when no replica is
+    within the allowed lag, and the caller reads from the primary instead.
+    With require_replication off, a server that isn't replicating counts as
+    lag 0, so a second plain MySQL instance (or the primary itself) can
+    stand in for a replica in tests.
+    """
+
+    def __init__(self, replicas=(), max_lag=5.0, check_interval=5.0, require_replication=True):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.require_replication = require_replication
+        self._lock = threading.Lock()
+        self._next = 0
+        self._fallbacks = 0
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _replication_status(self, connection):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                # MySQL before 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def check(self, replica):
+        """Refresh one replica's lag and health"""
+        try:
+            with replica.pool.connection() as connection:
+                status = self._replication_status(connection)
+        except Error as e:
+            if replica.healthy or replica.checked_at is None:
+                print(f"❌ Replica {replica.name} unavailable: {e}")
+            replica.healthy, replica.lag = False, None
+            replica.failed_checks += 1
+            replica.checked_at = time.monotonic()
+            return replica
+
+        if status is None:
+            lag = None if self.require_replication else 0
+        elif status.get('Replica_SQL_Running', status.get('Slave_SQL_Running')) != 'Yes':
+            lag = None
+        else:
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        replica.lag = lag
+        replica.healthy = lag is not None and lag <= self.max_lag
+        replica.checked_at = time.monotonic()
+        return replica
+
+    def acquire(self, max_lag=None, fresh=False):
+        """(replica, connection) from the next replica within max_lag seconds, or None
+
+        fresh re-checks lag before using a replica, for reads that must see
+        recent writes (e.g. a catalog refresh right after a load).
+        """
+        max_lag = self.max_lag if max_lag is None else max_lag
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if fresh or replica.checked_at is None or time.monotonic() - replica.checked_at > self.check_interval:
+                self.check(replica)
+            lag = replica.lag  # read once; another request may be re-checking it
+            if not replica.healthy or lag is None or lag > max_lag:
+                continue
+            try:
+                connection = replica.pool.acquire()
+            except Error:
+                replica.healthy = False
+                continue
+            with self._lock:
+                replica.reads += 1
+            return replica, connection
+        with self._lock:
+            self._fallbacks += 1
+        return None
+
+    def release(self, replica, connection, discard=False):
+        replica.pool.release(connection, discard=discard)
+
+    def close_all(self):
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+    def divide(self, processes):
+        """Split each replica's pool size across processes"""
+        for replica in self.replicas:
+            replica.pool.divide(processes)
+
+    def reset(self):
+        """Forget inherited connections (e.g. in a forked child)"""
+        for replica in self.replicas:
+            replica.pool.reset()
+
+    def stats(self):
+        stats = {"replicas": len(self.replicas), "healthy": sum(1 for r in self.replicas if r.healthy), "primary_fallbacks": self._fallbacks}
+        for index, replica in enumerate(self.replicas):
+            stats[f"replica{index}_healthy"] = int(replica.healthy)
+            stats[f"replica{index}_lag_seconds"] = replica.lag if replica.lag is not None else -1
+            stats[f"replica{index}_reads"] = replica.reads
+            stats[f"replica{index}_failed_checks"] = replica.failed_checks
+        return stats
+
+
+def replicas_from_env(primary_config, prefix='MYSQL_REPLICA'):
+    """Build a ReplicaSet from MYSQL_REPLICA_HOSTS (comma-separated host[:port]); empty when unset"""
+    hosts = [host.strip() for host in os.getenv(f'{prefix}_HOSTS', '').split(',') if host.strip()]
+    replicas = []
+    for host in hosts:
+        config = dict(primary_config)
+        name, _, port = host.partition(':')
+        config['host'] = name
+        if port:
+            config['port'] = int(port)
+        config['user'] = os.getenv(f'{prefix}_USER', config.get('user'))
+        config['password'] = os.getenv(f'{prefix}_PASSWORD', config.get('password'))
+        # A dead replica should cost a lag check seconds, not the default connect timeout
+        config['connection_timeout'] = int(os.getenv(f'{prefix}_CONNECT_TIMEOUT', '2'))
+        pool = ConnectionPool(
+            config,
+            size=int(os.getenv(f'{prefix}_POOL_SIZE', os.getenv('MYSQL_POOL_SIZE', '10'))),
+            wait_timeout=float(os.getenv(f'{prefix}_POOL_WAIT_TIMEOUT', '1')),
+            max_lifetime=float(os.getenv('MYSQL_POOL_MAX_LIFETIME', '1800')),
+            ping_interval=float(os.getenv('MYSQL_POOL_PING_INTERVAL', '30')),
+        )
+        replicas.append(Replica(host, pool))
+    return ReplicaSet(
+        replicas,
+        max_lag=float(os.getenv(f'{prefix}_MAX_LAG', '5')),
+        check_interval=float(os.getenv(f'{prefix}_CHECK_INTERVAL', '5')),
+        require_replication=os.getenv(f'{prefix}_REQUIRE_REPLICATION', '1') != '0',
+    )
@@ -0,0 +1,175 @@
+import calendar
+import re
+import threading
+
+from catalog_index import SYNONYMS, normalize
+
+# (intent, keywords, reply), highest priority first
+INTENTS = [
+    ('hawaii', ['hawaii', 'maui', 'oahu', 'honolulu'],
+     "Hawaii sounds amazing! What time of year are you thinking of traveling, and how many people will be going?"),
+    ('europe', ['europe', 'paris', 'london', 'italy'],
+     "Europe has so many wonderful destinations! Are you interested in a specific country, and what's your preferred travel timeframe?"),
+    ('cruise', ['cruise', 'cruises', 'ship', 'ships', 'sailing'],
+     "Cruises are fantastic! We have exclusive deals with Norwegian Cruise Line. What regions interest you - Caribbean, Mediterranean, Alaska?"),
+    ('budget', ['budget', 'cost', 'costs', 'price', 'prices'],
+     "I'd be happy to help you find options within your budget. What's your approximate budget range per person for the trip?"),
+]
+
+DESTINATION_REPLY = "{destination} is a great choice! What time of year are you thinking of traveling, and how many people will be going?"
+DEFAULT_REPLY = "I'm here to help you plan your perfect trip! Where would you like to go, and when are you thinking of traveling?"
+
+_NUMBER_WORDS = {word: number for number, word in enumerate(
+    ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten', 'eleven', 'twelve'])}
+_NUMBER = r"(\d+|" + '|'.join(_NUMBER_WORDS) + r")"
+_TRAVELERS_RE = re.compile(
+    rf"\b{_NUMBER} (?:people|persons|travelers|travellers|adults|guests|passengers|of us)\b"
+    rf"|\b(?:family|party|group) of {_NUMBER}\b"
+)
+_COUPLE_RE = re.compile(r"\b(?:couple|honeymoon|my (?:wife|husband|partner|girlfriend|boyfriend))\b")
+_SOLO_RE = re.compile(r"\b(?:solo|just me|by myself|on my own)\b")
+_DURATION_RE = re.compile(rf"\b{_NUMBER} (day|days|night|nights|week|weeks)\b")
+_BUDGET_RE = re.compile(r"\$\s?(\d[\d,]*(?:\.\d+)?)\s*(k\b)?|\b(\d[\d,]*(?:\.\d+)?)\s*(k|dollars|usd)\b")
+_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+_MONTHS = {name.lower(): name for name in calendar.month_name if name}
+# A year only counts next to a month ("june 2026", "june 5th, 2026") or a date phrase ("in 2026", "summer of 2026")
+_DATED_YEAR_RE = re.compile(
+    rf"\b(?:{'|'.join(_MONTHS)})(?:\s+\d{{1,2}}(?:st|nd|rd|th)?)?,?\s+(?:of\s+)?(20\d{{2}})\b"
+    r"|\b(?:in|during|for|of|by|early|mid|late|spring|summer|fall|autumn|winter|year)\s+(?:of\s+)?(20\d{2})\b"
+)
+_BUDGET_WORD_RE = re.compile(r"\b(?:budget|spend|spending|price|cost)\b\W+(?:\w+\W+){0,2}$")
+
+
+def _count(text):
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text]
+
+
+class IntentMatcher:
+    """Whole-word intent and destination matching over one precompiled phrase table
+
+    Every keyword, catalog destination/city and synonym is a key in a single
+    dict of normalized phrases, so a message is matched in one pass over its
+    tokens (one lookup per token and phrase length) instead of a substring
+    scan per keyword.
+    """
+
+    def __init__(self, intents=INTENTS, synonyms=SYNONYMS):
+        self.intents = intents
+        self.synonyms = synonyms
+        self._lock = threading.Lock()
+        self._table = {}
+        self._longest = 1
+        self._names = None
+        self.load_destinations(())
+
+    def load_destinations(self, names):
+        """Recompile the phrase table with the catalog's destinations and cities; a no-op if they haven't changed"""
+        names = frozenset(names)
+        if names == self._names:
+            return
+        table = {}
+        for priority, (intent, keywords, _) in enumerate(self.intents):
+            for keyword in keywords:
+                table.setdefault(normalize(keyword), {})['intent'] = priority
+        displays = {}
+        for name in sorted(names):
+            phrase = normalize(name)
+            if phrase:
+                displays.setdefault(phrase, name.strip())
+        for phrase, display in displays.items():
+            table.setdefault(phrase, {})['destination'] = display
+        for alias, targets in self.synonyms.items():
+            entry = table.setdefault(normalize(alias), {})
+            if 'destination' not in entry:
+                # Prefer the catalog's spelling of what the alias stands for
+                entry['destination'] = displays.get(targets[0], targets[0].title())
+        longest = max(len(phrase.split()) for phrase in table)
+        with self._lock:
+            self._table, self._longest, self._names = table, longest, names
+
+    def _scan(self, tokens):
+        table, longest = self._table, self._longest
+        intent = None
+        destination = None
+        destination_length = 0
+        position = 0
+        while position < len(tokens):
+            step = 1
+            for length in range(min(longest, len(tokens) - position), 0, -1):
+                entry = table.get(' '.join(tokens[position:position + length]))
+                if entry is None:
+                    continue
+                if 'intent' in entry and (intent is None or entry['intent'] < intent):
+                    intent = entry['intent']
+                if 'destination' in entry and length > destination_length:
+                    destination, destination_length = entry['destination'], length
+                step = length
+                break
+            position += step
+        return intent, destination
+
+    def extract_params(self, message, tokens=None):
+        """Partial search params (travelers, duration, budget, month/year) mentioned in a message"""
+        lowered = (message or '').lower()
+        text = ' '.join(tokens) if tokens is not None else normalize(message)
+        params = {}
+
+        match = _TRAVELERS_RE.search(text)
+        if match:
+            params['travelers'] = _count(match.group(1) or match.group(2))
+        elif _COUPLE_RE.search(text):
+            params['travelers'] = 2
+        elif _SOLO_RE.search(text):
+            params['travelers'] = 1
+
+        match = _DURATION_RE.search(text)
+        if match:
+            days = _count(match.group(1))
+            params['duration_days'] = days * 7 if match.group(2).startswith('week') else days
+
+        budgets = [match.span() for match in _BUDGET_RE.finditer(lowered)]
+        match = _BUDGET_RE.search(lowered)
+        if match:
+            amount = float((match.group(1) or match.group(3)).replace(',', ''))
+            if match.group(2) or match.group(4) == 'k':
+                amount *= 1000
+            params['budget'] = int(amount)
+
+        words = text.split()
+        for position, token in enumerate(words):
+            if token not in _MONTHS:
+                continue
+            # "may" is usually the verb unless it reads like a date
+            if token == 'may' and not (
+                (position and words[position - 1] in ('in', 'of', 'early', 'mid', 'late', 'this', 'next'))
+                or (position + 1 < len(words) and _YEAR_RE.match(words[position + 1]))
+            ):
+                continue
+            params['departure_month'] = _MONTHS[token]
+            break
+        for match in _DATED_YEAR_RE.finditer(lowered):
+            group = 1 if match.group(1) else 2
+            start, end = match.span(group)
+            # "$2030", "2000 dollars" and "a budget of 2000" are amounts, not years
+            if any(start < budget_end and budget_start < end for budget_start, budget_end in budgets):
+                continue
+            if _BUDGET_WORD_RE.search(lowered, 0, start):
+                continue
+            params['departure_year'] = int(match.group(group))
+            break
+        return params
+
+    def analyze(self, message):
+        """{"intent", "destination", "params", "reply"} for a chat message"""
+        tokens = normalize(message).split()
+        intent, destination = self._scan(tokens)
+        params = self.extract_params(message, tokens)
+        if destination:
+            params['destination'] = destination
+        if intent is not None:
+            name, _, reply = self.intents[intent]
+        elif destination:
+            name, reply = 'destination', DESTINATION_REPLY.format(destination=destination)
+        else:
+            name, reply = None, DEFAULT_REPLY
+        return {"intent": name, "destination": destination, "params": params, "reply": reply}
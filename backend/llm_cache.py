@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from catalog_index import normalize
+
+# Details that make a reply specific to one user, so it must not be shared
+_PERSONAL_DETAILS = re.compile(
+    r"[\w.+-]+@[\w-]+\.[\w.]+"  # email address
+    r"|(?:\+\d{1,3}[\s.-]?)?(?:\(\d{3}\)\s?|\b\d{3}[\s.-])\d{3}[\s.-]?\d{4}\b"  # (555) 123-4567, 555.123.4567, +1 555 123 4567
+    r"|\+\d{1,3}(?:[\s.-]?\d{2,4}){2,5}\b"  # international, +44 20 7946 0958
+    r"|\b1?\d{10}\b"  # 5551234567
+    r"|\b\d{4}(?:[ -]?\d{4}){2,3}(?:[ -]?\d{1,3})?\b"  # card number, 4111 1111 1111 1111
+    r"|\b(?:my name is|i am called|call me|my (?:phone|email|address|member(?:ship)? number))\b",
+    re.IGNORECASE,
+)
+
+
+def has_personal_details(*texts):
+    """True if any text looks like it contains user-specific details"""
+    return any(text and _PERSONAL_DETAILS.search(text) for text in texts)
+
+
+class LLMResponseCache:
+    """LRU + TTL cache of LLM replies keyed on the normalized conversation state"""
+
+    def __init__(self, max_entries=5000, ttl=3600.0, path=None, enabled=True, prune_interval=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()  # the in-memory LRU and counters only; never held during disk I/O
+        self._entries = OrderedDict()  # key -> (response, created_at)
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "prunes": 0}
+        self.path = path  # optional on-disk backing so hits survive restarts
+        self.prune_interval = prune_interval  # seconds between deletes of expired rows on disk
+        self._disk_lock = threading.Lock()  # serializes use of the sqlite connection
+        self._db = None
+        self._db_pid = None
+        self._pruned_at = 0.0
+
+    def _disk(self):
+        """This process's sqlite connection (disk lock held); forked workers must not share one"""
+        if not self.path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            # The parent's connection is left alone; closing it here could disturb the parent
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT, created_at REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+            self._db.commit()
+            self._db_pid = os.getpid()
+            self._pruned_at = 0.0
+        return self._db
+
+    def key_for(self, history, params, message):
+        """Cache key for a turn, or None when the turn must bypass the cache"""
+        if not self.enabled or has_personal_details(history, message, json.dumps(params)):
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return None
+        material = '\x1f'.join([normalize(history), json.dumps(params or {}, sort_keys=True), normalize(message)])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+        row = None
+        if self.path:
+            with self._disk_lock:
+                row = self._disk().execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row and now - row[1] < self.ttl:
+                self._remember(key, row[0], row[1])
+                self._counters["disk_hits"] += 1
+                return row[0]
+            self._counters["misses"] += 1
+            return None
+
+    def _remember(self, key, response, created_at):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def put(self, key, response):
+        if key is None or not response:
+            return
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, response, created_at)
+            self._counters["stores"] += 1
+        if not self.path:
+            return
+        with self._disk_lock:
+            db = self._disk()
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)", (key, response, created_at))
+            pruned = created_at - self._pruned_at >= self.prune_interval
+            if pruned:
+                # Uses idx_llm_cache_created_at; expired rows in between are skipped by get()
+                db.execute("DELETE FROM llm_cache WHERE created_at < ?", (created_at - self.ttl,))
+                self._pruned_at = created_at
+            db.commit()
+        if pruned:
+            with self._lock:
+                self._counters["prunes"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._disk_lock:
+                db = self._disk()
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            return stats
+
+
+def llm_cache_from_env(prefix='LLM_CACHE'):
+    """Build an LLMResponseCache using LLM_CACHE_* environment settings"""
+    return LLMResponseCache(
+        max_entries=int(os.getenv(f'{prefix}_MAX_ENTRIES', '5000')),
+        ttl=float(os.getenv(f'{prefix}_TTL', '3600')),
+        path=os.getenv(f'{prefix}_PATH') or None,
+        enabled=os.getenv(f'{prefix}_ENABLED', '1') not in ('0', 'false', 'False'),
+        prune_interval=float(os.getenv(f'{prefix}_PRUNE_INTERVAL', '60')),
+    )
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+EMERGENT_API_BASE = "https://api.emergentagent.com/v1"
+
+
+class LLMClientProvider:
+    """Imports and configures litellm on first use instead of at app import
+
+    litellm's import dominates process start, and processes that only serve
+    searches and deal rails never need it. get() loads it once (later callers
+    wait on the same import); warm_up() does that in a background thread.
+    """
+
+    def __init__(self, api_key=None, api_base=EMERGENT_API_BASE, warmup='startup'):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.warmup = warmup  # 'startup' or 'lazy' (first chat)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._client = None
+        self.import_ms = None
+
+    def _load(self):
+        if not self.api_key:
+            print("❌ EMERGENT_LLM_KEY not found in environment")
+            return None
+        started = time.perf_counter()
+        try:
+            import litellm
+        except Exception as e:
+            print(f"❌ Failed to initialize Emergent LLM client: {e}")
+            print("Using fallback responses for chat functionality")
+            return None
+        self.import_ms = round((time.perf_counter() - started) * 1000, 1)
+        # Use LiteLLM with Emergent key for Gemini
+        litellm.api_key = self.api_key
+        litellm.api_base = self.api_base
+        print(f"✅ Emergent LLM client initialized successfully ({self.import_ms} ms)")
+        return litellm
+
+    def get(self):
+        """The configured client, importing it on first call; None when unavailable"""
+        if self._loaded:
+            return self._client
+        with self._lock:
+            if not self._loaded:
+                self._client = self._load()
+                self._loaded = True
+            return self._client
+
+    def warm_up(self):
+        """Import the client in a background thread"""
+        thread = threading.Thread(target=self.get, name='llm-client-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def override(self, client):
+        """Use client instead of litellm (e.g. a fake backend in benchmarks)"""
+        with self._lock:
+            self._client = client
+            self._loaded = True
+
+    def stats(self):
+        return {
+            "loaded": self._loaded,
+            "available": self._client is not None,
+            "import_ms": self.import_ms,
+        }
+
+
+def provider_from_env():
+    """Build an LLMClientProvider from EMERGENT_LLM_KEY and LLM_WARMUP"""
+    return LLMClientProvider(
+        api_key=os.getenv('EMERGENT_LLM_KEY'),
+        warmup=os.getenv('LLM_WARMUP', 'startup'),
+    )
@@ -0,0 +1,233 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Provider errors worth retrying: rate limits and transient server failures
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+RETRYABLE_NAMES = ('RateLimitError', 'ServiceUnavailableError', 'InternalServerError', 'APIConnectionError', 'Timeout', 'APITimeoutError')
+
+
+def _message_text(response):
+    return response.choices[0].message.content or ''
+
+
+class LLMShedError(Exception):
+    """The call was not made because it could not finish within its latency budget"""
+
+
+def is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES or isinstance(error, TimeoutError)
+
+
+class _Waiter:
+    __slots__ = ('key', 'event', 'granted')
+
+    def __init__(self, key):
+        self.key = key
+        self.event = threading.Event()
+        self.granted = False
+
+
+class LLMScheduler:
+    """Global LLM concurrency limit with per-user fair queuing, deadlines and retries
+
+    Callers past the limit wait in one FIFO per fairness key (user or
+    session), and free slots go round-robin across keys, so one busy user
+    can't starve the rest. A call whose expected queue wait would blow its
+    deadline is shed with LLMShedError instead, and the caller answers with
+    its fallback reply.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue=64, latency_budget=20.0, max_retries=2, backoff_base=0.5, backoff_max=4.0, timeout=60.0):
+        self.timeout = timeout  # per provider call, passed to the client
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.latency_budget = latency_budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queues = {}  # fairness key -> deque of waiters
+        self._turns = deque()  # keys with waiters, in round-robin order
+        self._queued = 0
+        self._service_time = None  # moving average of seconds per call, for wait estimates
+        self._counters = {
+            "calls": 0, "completed": 0, "failed": 0, "retries": 0,
+            "shed_queue_full": 0, "shed_deadline": 0,
+            "waits": 0, "wait_time_total_ms": 0.0, "wait_time_max_ms": 0.0,
+        }
+
+    def divide(self, processes):
+        """Split the concurrency and queue limits across processes that each run a scheduler (at least 1 each)"""
+        self.max_concurrency = max(1, self.max_concurrency // processes)
+        self.max_queue = max(1, self.max_queue // processes)
+
+    def deadline(self):
+        """Deadline for a call starting now"""
+        return time.monotonic() + self.latency_budget
+
+    # -- slots ------------------------------------------------------------
+
+    def _shed(self, reason, message):
+        self._counters[reason] += 1
+        raise LLMShedError(message)
+
+    def _grant(self):
+        """Hand free slots to queued callers, round-robin across keys (lock held)"""
+        while self._turns and self._in_flight < self.max_concurrency:
+            key = self._turns.popleft()
+            waiters = self._queues[key]
+            waiter = waiters.popleft()
+            if waiters:
+                self._turns.append(key)
+            else:
+                del self._queues[key]
+            self._queued -= 1
+            self._in_flight += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _acquire(self, key, deadline):
+        started = time.monotonic()
+        with self._lock:
+            self._counters["calls"] += 1
+            if self._in_flight < self.max_concurrency and not self._queued:
+                self._in_flight += 1
+                return
+            if self._queued >= self.max_queue:
+                self._shed("shed_queue_full", "LLM queue is full")
+            if self._service_time is not None:
+                expected_wait = (self._queued + 1) / self.max_concurrency * self._service_time
+                if started + expected_wait > deadline:
+                    self._shed("shed_deadline", f"LLM queue wait (~{expected_wait:.1f}s) exceeds the latency budget")
+            waiter = _Waiter(key)
+            if key not in self._queues:
+                self._queues[key] = deque()
+                self._turns.append(key)
+            self._queues[key].append(waiter)
+            self._queued += 1
+
+        waiter.event.wait(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            waited_ms = (time.monotonic() - started) * 1000
+            self._counters["waits"] += 1
+            self._counters["wait_time_total_ms"] += waited_ms
+            self._counters["wait_time_max_ms"] = max(self._counters["wait_time_max_ms"], waited_ms)
+            if waiter.granted:
+                return
+            waiters = self._queues[key]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[key]
+                self._turns.remove(key)
+            self._queued -= 1
+            self._shed("shed_deadline", "LLM queue wait exceeded the latency budget")
+
+    def _release(self, service_time=None):
+        with self._lock:
+            self._in_flight -= 1
+            if service_time is not None:
+                previous = self._service_time
+                self._service_time = service_time if previous is None else 0.8 * previous + 0.2 * service_time
+            self._grant()
+
+    def _backoff(self, attempt, deadline):
+        """Sleep a full-jitter exponential backoff; False if it would pass the deadline"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return False
+        with self._lock:
+            self._counters["retries"] += 1
+        time.sleep(delay)
+        return True
+
+    def _remaining(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM latency budget exhausted")
+        return min(remaining, self.timeout)
+
+    def _finish(self, outcome):
+        with self._lock:
+            self._counters[outcome] += 1
+
+    # -- calls ------------------------------------------------------------
+
+    def complete(self, client, key, deadline=None, **kwargs):
+        """Completion text, subject to the concurrency limit, fair queuing and deadline"""
+        deadline = deadline or self.deadline()
+        self._acquire(key, deadline)
+        started = time.monotonic()
+        service_time = None
+        try:
+            attempt = 0
+            while True:
+                try:
+                    text = _message_text(client.completion(timeout=self._remaining(deadline), **kwargs))
+                    service_time = time.monotonic() - started
+                    self._finish("completed")
+                    return text
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e) or not self._backoff(attempt, deadline):
+                        self._finish("failed")
+                        raise
+                    attempt += 1
+        finally:
+            self._release(service_time)
+
+    def stream(self, client, key, deadline=None, **kwargs):
+        """Generator of completion chunks; retried only until the first chunk arrives"""
+        deadline = deadline or self.deadline()
+        self._acquire(key, deadline)
+        started = time.monotonic()
+        service_time = None
+        try:
+            attempt = 0
+            while True:
+                streamed = False
+                try:
+                    for chunk in client.completion(stream=True, timeout=self._remaining(deadline), **kwargs):
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            streamed = True
+                            yield delta
+                    service_time = time.monotonic() - started
+                    self._finish("completed")
+                    return
+                except Exception as e:
+                    if streamed or attempt >= self.max_retries or not is_retryable(e) or not self._backoff(attempt, deadline):
+                        self._finish("failed")
+                        raise
+                    attempt += 1
+        finally:
+            self._release(service_time)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+            stats["queued"] = self._queued
+            stats["queued_keys"] = len(self._queues)
+            stats["max_concurrency"] = self.max_concurrency
+            stats["max_queue"] = self.max_queue
+            stats["service_time_avg_ms"] = round(self._service_time * 1000, 1) if self._service_time is not None else None
+            stats["wait_time_avg_ms"] = round(stats["wait_time_total_ms"] / stats["waits"], 1) if stats["waits"] else 0.0
+            return stats
+
+
+def scheduler_from_env(prefix='LLM'):
+    """Build an LLMScheduler using LLM_* environment settings"""
+    return LLMScheduler(
+        max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', '8')),
+        max_queue=int(os.getenv(f'{prefix}_MAX_QUEUE', '64')),
+        latency_budget=float(os.getenv(f'{prefix}_LATENCY_BUDGET', '20')),
+        max_retries=int(os.getenv(f'{prefix}_MAX_RETRIES', '2')),
+        timeout=float(os.getenv(f'{prefix}_TIMEOUT', '60')),
+    )
@@ -0,0 +1,316 @@
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from mysql.connector import DatabaseError, Error, InterfaceError, OperationalError
+
+# chat_messages.message_text is a TEXT column
+MAX_MESSAGE_BYTES = 65535
+
+
+def clip_message(text):
+    """text cut to what fits in message_text, on a character boundary"""
+    data = text.encode('utf-8')
+    if len(data) <= MAX_MESSAGE_BYTES:
+        return text
+    return data[:MAX_MESSAGE_BYTES].decode('utf-8', 'ignore')
+
+
+def _row_error(error):
+    """True for errors caused by one statement's data, not by the connection or server"""
+    return isinstance(error, DatabaseError) and not isinstance(error, (OperationalError, InterfaceError))
+
+
+class MessageJournal:
+    """Write-behind buffer for chat messages and session param updates
+
+    Writes are queued in process and flushed in multi-row batches when
+    flush_size records are waiting or flush_interval seconds have passed.
+    Readers merge pending() / pending_params() into what they read from
+    MySQL via consistent_read(), so a session always sees its own writes.
+    Other processes only see them once flushed: with sync on, callers use
+    wait_flushed() before answering, and concurrent callers share a batch.
+    Rows MySQL rejects are dropped on their own; past max_pending queued
+    messages (MySQL down), append() waits briefly, then sheds.
+    """
+
+    def __init__(self, connection_factory, flush_size=100, flush_interval=0.5, sync=False, on_flush=None,
+                 max_pending=10000, full_timeout=1.0):
+        self.connection_factory = connection_factory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.sync = sync
+        self.on_flush = on_flush  # on_flush(message_session_ids, param_session_ids) after each written batch
+        self.max_pending = max_pending
+        self.full_timeout = full_timeout
+
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()  # one batch written at a time
+        self._writing = False  # a batch is being written (it may be committed already)
+        self._generation = 0  # batches finished writing, committed or not
+        self._messages = []  # dicts in arrival order
+        self._params = {}  # session_id -> latest params
+        self._inflight_messages = []
+        self._inflight_params = {}
+        self._thread = None
+        self._closed = False
+        self._urgent = False  # a wait_flushed() caller wants the next batch now
+        self._seq = 0  # records queued so far
+        self._written = 0  # _seq as of the last batch written
+        self._counters = {"messages": 0, "param_updates": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0, "dropped": 0, "shed": 0,
+                          "sync_timeouts": 0, "read_retries": 0}
+
+    # -- writers ----------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='message-journal', daemon=True)
+            self._thread.start()
+
+    def append(self, session_id, sender, text):
+        """Queue a chat message for insertion; False if it was shed because the buffer stayed full"""
+        timestamp = datetime.now()
+        text = clip_message(text)
+        deadline = time.monotonic() + self.full_timeout
+        with self._lock:
+            while len(self._messages) + len(self._inflight_messages) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    self._counters["shed"] += 1
+                    print(f"❌ Chat journal full ({self.max_pending} messages); shedding a message for session {session_id}")
+                    return False
+                self._urgent = True
+                self._ensure_thread()
+                self._lock.notify_all()
+                self._lock.wait(remaining)
+            self._messages.append({
+                "session_id": session_id,
+                "sender": sender,
+                "message_text": text,
+                "timestamp": timestamp,
+            })
+            self._seq += 1
+            self._counters["messages"] += 1
+            self._ensure_thread()
+            if len(self._messages) >= self.flush_size:
+                self._lock.notify_all()
+            return True
+
+    def set_params(self, session_id, params):
+        """Queue an active_search_params update; later updates replace earlier ones"""
+        with self._lock:
+            self._params[session_id] = params
+            self._seq += 1
+            self._counters["param_updates"] += 1
+            self._ensure_thread()
+
+    # -- readers ----------------------------------------------------------
+
+    def consistent_read(self, read, merge):
+        """merge(read()) with no batch written while read() ran, without holding up flushes
+
+        read runs the MySQL query and merge combines its result with
+        pending() / pending_params(), so each unflushed record is seen once:
+        in MySQL or in the buffer. A read overlapping a batch write is
+        retried; after a few tries it holds off flushes for one read.
+        """
+        for _ in range(3):
+            with self._lock:
+                while self._writing:
+                    self._lock.wait()
+                generation = self._generation
+            result = read()
+            with self._lock:
+                if not self._writing and self._generation == generation:
+                    return merge(result)
+                self._counters["read_retries"] += 1
+        with self._flush_lock:
+            return merge(read())
+
+    def pending(self, session_id):
+        """Messages for session_id that are not in MySQL yet, oldest first"""
+        with self._lock:
+            return [dict(m, id=None) for m in self._inflight_messages + self._messages if m["session_id"] == session_id]
+
+    def pending_params(self, session_id):
+        """Unflushed active_search_params for session_id, or None"""
+        with self._lock:
+            if session_id in self._params:
+                return self._params[session_id]
+            return self._inflight_params.get(session_id)
+
+    # -- flushing ---------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._messages) < self.flush_size and not self._closed and not self._urgent:
+                    self._lock.wait(self.flush_interval)
+                if self._closed:
+                    return
+                self._urgent = False
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Message journal flush error: {e}")
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Write everything queued so far; failed batches are kept for the next attempt"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._messages and not self._params:
+                    return 0
+                seq = self._seq
+                self._inflight_messages, self._messages = self._messages, []
+                self._inflight_params, self._params = self._params, {}
+                self._writing = True
+            try:
+                written = self._write(self._inflight_messages, self._inflight_params)
+            except Exception:
+                with self._lock:
+                    self._writing = False
+                    self._generation += 1
+                    self._lock.notify_all()
+                    self._counters["flush_errors"] += 1
+                    # Put the batch back in front of anything queued meanwhile
+                    self._messages = self._inflight_messages + self._messages
+                    self._params = dict(self._inflight_params, **self._params)
+                    self._inflight_messages, self._inflight_params = [], {}
+                raise
+            if self.on_flush:
+                # After the commit, and outside the retry path: the batch must not be re-queued
+                try:
+                    self.on_flush({m["session_id"] for m in self._inflight_messages}, set(self._inflight_params))
+                except Exception as e:
+                    print(f"❌ Message journal on_flush error: {e}")
+            with self._lock:
+                self._inflight_messages, self._inflight_params = [], {}
+                self._writing = False
+                self._generation += 1
+                self._written = max(self._written, seq)
+                self._counters["flushes"] += 1
+                self._counters["rows_written"] += written
+                self._lock.notify_all()
+            return written
+
+    def wait_flushed(self, timeout=5.0):
+        """Block until everything queued so far is in MySQL; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            target = self._seq
+            while self._written < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["sync_timeouts"] += 1
+                    return False
+                self._urgent = True
+                self._ensure_thread()
+                self._lock.notify_all()
+                self._lock.wait(remaining)
+            return True
+
+    def _write(self, messages, params):
+        """Write one batch in a single transaction, so a failure leaves nothing to re-insert"""
+        with self.connection_factory() as connection:
+            cursor = connection.cursor()
+            written = 0
+            try:
+                connection.start_transaction()
+                if messages:
+                    # The time the message was sent, not the time of the flush
+                    rows = [(m["session_id"], m["sender"], m["message_text"], m["timestamp"]) for m in messages]
+                    insert = """
+                        INSERT INTO chat_messages (session_id, sender, message_text, timestamp)
+                        VALUES (%s, %s, %s, %s)
+                    """
+                    # mysql-connector rewrites executemany into a single multi-row INSERT
+                    written += self._each_row(cursor, insert, rows, lambda: cursor.executemany(insert, rows))
+                if params:
+                    session_ids = list(params)
+                    rows = [(json.dumps(params[session_id]), session_id) for session_id in session_ids]
+                    cases = ' '.join(['WHEN %s THEN %s'] * len(session_ids))
+                    values = [value for value, session_id in rows for value in (session_id, value)]
+                    written += self._each_row(
+                        cursor, "UPDATE chat_sessions SET active_search_params = %s WHERE id = %s", rows,
+                        lambda: cursor.execute(
+                            f"UPDATE chat_sessions SET active_search_params = CASE id {cases} END "
+                            f"WHERE id IN ({', '.join(['%s'] * len(session_ids))})",
+                            values + session_ids,
+                        ),
+                    )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            return written
+
+    def _each_row(self, cursor, statement, rows, batch):
+        """Run batch(), else statement once per row, dropping the rows MySQL rejects
+
+        One bad row (an unknown session_id, text over the column size in
+        strict mode) must not sink the whole batch forever; a failed
+        statement is rolled back on its own and the transaction goes on.
+        Connection errors still fail the batch so it is retried.
+        """
+        try:
+            batch()
+            return len(rows)
+        except Error as e:
+            if not _row_error(e):
+                raise
+        written = 0
+        for row in rows:
+            try:
+                cursor.execute(statement, row)
+                written += 1
+            except Error as e:
+                if not _row_error(e):
+                    raise
+                print(f"❌ Dropping chat journal write ({' '.join(statement.split()[:3])} ...): {e}")
+                with self._lock:
+                    self._counters["dropped"] += 1
+        return written
+
+    def close(self):
+        """Stop the flusher and write out everything still buffered"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        for attempt in range(3):
+            try:
+                self.flush()
+                return
+            except Error as e:
+                print(f"❌ Message journal final flush failed (attempt {attempt + 1}): {e}")
+                time.sleep(self.flush_interval)
+
+    def reset(self):
+        """Forget the flusher thread (e.g. in a forked child)"""
+        with self._lock:
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending_messages"] = len(self._messages) + len(self._inflight_messages)
+            stats["pending_param_updates"] = len(self._params) + len(self._inflight_params)
+            return stats
+
+
+def journal_from_env(connection_factory, prefix='CHAT_JOURNAL'):
+    """Build a MessageJournal using CHAT_JOURNAL_* settings and flush it at exit"""
+    journal = MessageJournal(
+        connection_factory,
+        flush_size=int(os.getenv(f'{prefix}_FLUSH_SIZE', '100')),
+        flush_interval=float(os.getenv(f'{prefix}_FLUSH_INTERVAL', '0.5')),
+        sync=os.getenv(f'{prefix}_SYNC', '0') == '1',
+        max_pending=int(os.getenv(f'{prefix}_MAX_PENDING', '10000')),
+    )
+    atexit.register(journal.close)
+    return journal
@@ -0,0 +1,201 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus style, cumulative on export)"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Metrics:
+    """In-process request/phase timings, error counts and pluggable gauges"""
+
+    def __init__(self, namespace='costco', slow_request_ms=1000.0, labels=None):
+        self.namespace = namespace
+        self.slow_request_ms = slow_request_ms
+        self.labels = dict(labels or {})  # added to every sample, e.g. {"worker": "2"} under serve.py
+        self._lock = threading.Lock()
+        self._requests = {}  # route -> Histogram
+        self._phases = {}  # (route, phase) -> Histogram
+        self._responses = {}  # (route, status) -> count
+        self._errors = {}  # route -> count
+        self._collectors = []  # (prefix, callable returning {name: number})
+
+    # -- recording --------------------------------------------------------
+
+    def _observe(self, table, key, seconds):
+        with self._lock:
+            histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block as one phase of the current request (or of background work)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if has_request_context():
+                route = _route()
+                breakdown = g.get('_metrics_phases')
+                if breakdown is not None:
+                    breakdown.append((name, elapsed))
+            else:
+                route = 'background'
+            self._observe(self._phases, (route, name), elapsed)
+
+    def count_error(self, route):
+        with self._lock:
+            self._errors[route] = self._errors.get(route, 0) + 1
+
+    def add_collector(self, prefix, collect):
+        """Export collect() -> {name: number} as gauges named <namespace>_<prefix>_<name>"""
+        self._collectors.append((prefix, collect))
+
+    # -- Flask integration ------------------------------------------------
+
+    def init_app(self, app):
+        @app.before_request
+        def _start_timer():
+            g._metrics_started = time.perf_counter()
+            g._metrics_phases = []
+
+        @app.after_request
+        def _record_request(response):
+            started = g.pop('_metrics_started', None)
+            if started is None:
+                return response
+            elapsed = time.perf_counter() - started
+            route = _route()
+            self._observe(self._requests, route, elapsed)
+            with self._lock:
+                key = (route, response.status_code)
+                self._responses[key] = self._responses.get(key, 0) + 1
+            if response.status_code >= 500:
+                self.count_error(route)
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                breakdown = ', '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in g.get('_metrics_phases', []))
+                print(f"🐢 Slow request {request.method} {route} {response.status_code} took {elapsed * 1000:.1f}ms [{breakdown}]")
+            return response
+
+        @app.teardown_request
+        def _record_exception(exc):
+            # after_request already counted the 500 if it ran
+            if exc is not None and '_metrics_started' in g:
+                self.count_error(_route())
+
+    # -- export -----------------------------------------------------------
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        ns = self.namespace
+        common = self.labels
+        lines = []
+        with self._lock:
+            requests = {key: _copy(h) for key, h in self._requests.items()}
+            phases = {key: _copy(h) for key, h in self._phases.items()}
+            responses = dict(self._responses)
+            errors = dict(self._errors)
+
+        lines.append(f"# HELP {ns}_request_duration_seconds Request latency by route")
+        lines.append(f"# TYPE {ns}_request_duration_seconds histogram")
+        for route, histogram in sorted(requests.items()):
+            lines.extend(_histogram_lines(f"{ns}_request_duration_seconds", dict(common, route=route), histogram))
+
+        lines.append(f"# HELP {ns}_phase_duration_seconds Time spent per request phase")
+        lines.append(f"# TYPE {ns}_phase_duration_seconds histogram")
+        for (route, phase), histogram in sorted(phases.items()):
+            lines.extend(_histogram_lines(f"{ns}_phase_duration_seconds", dict(common, route=route, phase=phase), histogram))
+
+        lines.append(f"# HELP {ns}_responses_total Responses by route and status")
+        lines.append(f"# TYPE {ns}_responses_total counter")
+        for (route, status), count in sorted(responses.items()):
+            lines.append(f"{ns}_responses_total{_labels(dict(common, route=route, status=status))} {count}")
+
+        lines.append(f"# HELP {ns}_errors_total Server errors by route")
+        lines.append(f"# TYPE {ns}_errors_total counter")
+        for route, count in sorted(errors.items()):
+            lines.append(f"{ns}_errors_total{_labels(dict(common, route=route))} {count}")
+
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"❌ Metrics collector {prefix} failed: {e}")
+                continue
+            for name, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{ns}_{prefix}_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric}{_labels(common) if common else ''} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def wsgi_app(self, environ, start_response):
+        """Bare WSGI app answering every request with render(), for a metrics-only port"""
+        body = self.render().encode('utf-8')
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4'), ('Content-Length', str(len(body)))])
+        return [body]
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts = list(histogram.counts)
+    copy.total = histogram.total
+    copy.count = histogram.count
+    return copy
+
+
+def _labels(labels):
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f"{name}_bucket{_labels(dict(labels, le=le))} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.total}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+
+def metrics_from_env():
+    """Build a Metrics registry using the SLOW_REQUEST_MS environment setting"""
+    return Metrics(slow_request_ms=float(os.getenv('SLOW_REQUEST_MS', '1000')))
@@ -0,0 +1,157 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+def search_card(row):
+    return {
+        "id": row['id'],
+        "title": row['title'],
+        "image": row['image_url'],
+        "city": row['destination'],
+        "hotel": row['hotel_name'],
+        "includes": ["Package Includes", "Flights" if row['includes_flight'] else "", "Rental Car" if row['includes_car'] else ""],
+        "memberReviews": "Costco Member Reviews",
+        "rating": float(row['hotel_rating']) if row['hotel_rating'] else None,
+        "reviewCount": "Sample Reviews",
+        "features": [
+            "Complimentary Room Upgrade",
+            "Daily Buffet Breakfast",
+            "Reduced Mandatory Daily Resort Fee"
+        ],
+        "priceStatus": f"From ${row['price_per_person']}" if row['price_per_person'] else "Not Available",
+        "adjustText": "Adjust Your Search"
+    }
+
+
+def treasure_hunt_card(row):
+    return {
+        "id": row['id'],
+        "title": row['title'],
+        "image": row['image_url'],
+        "benefits": row['description'].split('.') if row['description'] else [],
+        "extrasValue": row['extras_value']
+    }
+
+
+def whats_hot_card(row):
+    return {
+        "id": row['id'],
+        "title": row['title'],
+        "image": row['image_url'],
+        "price": f"From ${row['price_per_person']}" if row['price_per_person'] else None,
+        "duration": f"{row['duration_days']} nights" if row['duration_days'] else None,
+        "inclusions": row['description'].split(',') if row['description'] else []
+    }
+
+
+def chat_card(row):
+    return {
+        "id": row['id'],
+        "title": row['title'],
+        "destination": row['destination'],
+        "price": f"${row['price_per_person']}" if row['price_per_person'] else "Contact for pricing",
+        "duration": f"{row['duration_days']} days" if row['duration_days'] else "",
+        "hotel": row['hotel_name'],
+        "rating": float(row['hotel_rating']) if row['hotel_rating'] else None
+    }
+
+
+# View name -> card builder, one per place packages are shown
+VIEWS = {
+    'search': search_card,
+    'treasure_hunt': treasure_hunt_card,
+    'whats_hot': whats_hot_card,
+    'chat': chat_card,
+}
+VIEW_SLOTS = {view: slot for slot, view in enumerate(VIEWS)}
+
+
+def encode(value):
+    """Compact JSON bytes, as jsonify writes them"""
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+class PackageCards:
+    """Card JSON fragments per package and view, rendered on first use
+
+    Fragments are keyed on the catalog row object they were rendered from,
+    so a row replaced by a catalog refresh is re-rendered on next use, and
+    handlers only join prebuilt bytes. Only the encoded bytes are kept, for
+    the max_packages most recently used packages; card() decodes them.
+    """
+
+    def __init__(self, max_packages=50000):
+        self.max_packages = max_packages
+        self._lock = threading.Lock()
+        self._cards = OrderedDict()  # package id -> (row, [fragment or None per view])
+        self._counters = {"renders": 0, "hits": 0, "evictions": 0}
+
+    def fragment(self, row, view):
+        slot = VIEW_SLOTS[view]
+        with self._lock:
+            cached = self._cards.get(row['id'])
+            if cached is not None and cached[0] is row and cached[1][slot] is not None:
+                self._cards.move_to_end(row['id'])
+                self._counters["hits"] += 1
+                return cached[1][slot]
+        fragment = encode(VIEWS[view](row))
+        with self._lock:
+            cached = self._cards.get(row['id'])
+            if cached is None or cached[0] is not row:
+                cached = self._cards[row['id']] = (row, [None] * len(VIEWS))
+            self._cards.move_to_end(row['id'])
+            cached[1][slot] = fragment
+            self._counters["renders"] += 1
+            while len(self._cards) > self.max_packages:
+                self._cards.popitem(last=False)
+                self._counters["evictions"] += 1
+        return fragment
+
+    def sync(self, rows):
+        """Forget fragments of changed or removed catalog rows"""
+        current = {row['id']: row for row in rows}
+        with self._lock:
+            for package_id, (row, _) in list(self._cards.items()):
+                if current.get(package_id) is not row:
+                    del self._cards[package_id]
+
+    def discard(self, package_ids):
+        """Forget the fragments of some packages"""
+        with self._lock:
+            for package_id in package_ids:
+                self._cards.pop(package_id, None)
+
+    def rebind(self, replaced):
+        """Keep fragments across a catalog compaction, whose (old row, new row) pairs hold the same values"""
+        with self._lock:
+            for old, new in replaced:
+                cached = self._cards.get(old['id'])
+                if cached is not None and cached[0] is old:
+                    self._cards[old['id']] = (new, cached[1])
+
+    def card(self, row, view):
+        return json.loads(self.fragment(row, view))
+
+    def json_array(self, rows, view):
+        """JSON array of the rows' cards, joined from prebuilt fragments"""
+        return b'[' + b','.join(self.fragment(row, view) for row in rows) + b']'
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["packages"] = len(self._cards)
+        return stats
+
+
+def render_array(rows, view):
+    """JSON array of cards for rows that are not catalog index rows (e.g. a SQL fallback)"""
+    build = VIEWS[view]
+    return b'[' + b','.join(encode(build(row)) for row in rows) + b']'
+
+
+def json_object(fields, **fragments):
+    """JSON object of plain fields plus already-encoded fragment values"""
+    parts = [encode(name) + b':' + fragment for name, fragment in fragments.items()]
+    parts.extend(encode(name) + b':' + encode(value) for name, value in fields.items())
+    return b'{' + b','.join(parts) + b'}'
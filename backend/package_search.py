@@ -0,0 +1,232 @@
+import base64
+import binascii
+import calendar
+import json
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from catalog_index import CATALOG_QUERY, price_key
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Sort orders, all keyset-paginated on (price_per_person, id)
+SORTS = ('price_asc', 'price_desc')
+
+# Request field -> (package column, comparison) for numeric range filters
+RANGE_FILTERS = {
+    'min_price': ('price_per_person', '>='),
+    'max_price': ('price_per_person', '<='),
+    'min_duration': ('duration_days', '>='),
+    'max_duration': ('duration_days', '<='),
+    'min_rating': ('hotel_rating', '>='),
+}
+
+INCLUDE_FILTERS = ('includes_flight', 'includes_hotel', 'includes_car')
+
+# Composite indexes backing the filtered, keyset-paginated package queries
+SEARCH_INDEXES = (
+    ("packages", "idx_packages_price", "price_per_person, id"),
+    ("packages", "idx_packages_includes_price", "includes_flight, includes_hotel, includes_car, price_per_person, id"),
+    ("packages", "idx_packages_duration_price", "duration_days, price_per_person, id"),
+    ("hotels", "idx_hotels_rating", "rating, id"),
+)
+
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _date(name, value):
+    try:
+        if not _DATE_RE.match(str(value)):
+            raise ValueError
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def departure_window(month, year):
+    """(first, last) day of a departure month, or None unless both month and year are known
+
+    month may be a number, a month name or a 'YYYY-MM' string, as the chat
+    assistant fills it in.
+    """
+    text = str(month or '').strip().lower()
+    match = re.match(r"^(\d{4})-(\d{1,2})", text)
+    if match:
+        year, number = match.group(1), int(match.group(2))
+    elif text.isdigit():
+        number = int(text)
+    else:
+        number = MONTHS.get(text) or MONTHS.get(text[:3])
+    try:
+        year = int(str(year).strip())
+    except (TypeError, ValueError):
+        return None
+    if not number or not 1 <= number <= 12 or not 1 <= year <= 9999:
+        return None
+    last = calendar.monthrange(year, number)[1]
+    return (date(year, number, 1).isoformat(), date(year, number, last).isoformat())
+
+
+def _departing(data):
+    """Departure date window from departure/return dates or departure_month/year"""
+    if data.get('departure'):
+        start = _date('departure', data['departure'])
+        end = _date('return', data['return']) if data.get('return') else start
+        if end < start:
+            raise ValueError("return must not be before departure")
+        return (start, end)
+    return departure_window(data.get('departure_month'), data.get('departure_year'))
+
+
+def _number(name, value):
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if not number.is_finite():
+        raise ValueError(f"{name} must be a number")
+    return number
+
+
+def _flag(name, value):
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1, '0', '1', 'true', 'false'):
+        return value in (1, '1', 'true')
+    raise ValueError(f"{name} must be true or false")
+
+
+def parse_search_request(data):
+    """Filters, sort, page size and keyset position from a /api/search body
+
+    Raises ValueError with a client-facing message for invalid input.
+    """
+    filters = {}
+    for name in RANGE_FILTERS:
+        if data.get(name) not in (None, ''):
+            filters[name] = _number(name, data[name])
+    for name in INCLUDE_FILTERS:
+        if data.get(name) not in (None, ''):
+            filters[name] = _flag(name, data[name])
+
+    sort = data.get('sort') or 'price_asc'
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+
+    try:
+        limit = int(data.get('limit') or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    after = decode_cursor(data['cursor'], sort) if data.get('cursor') else None
+    return {"filters": filters, "sort": sort, "limit": limit, "after": after, "departing": _departing(data)}
+
+
+def encode_cursor(row, sort):
+    """Opaque next-page token for the page that ended at row"""
+    has_price, price, package_id = price_key(row)
+    payload = json.dumps([sort, has_price, str(price), package_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """The price_key tuple a cursor token points after"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort, has_price, price, package_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        key = (bool(has_price), Decimal(price), int(package_id))
+    except (AttributeError, TypeError, ValueError, UnicodeError, binascii.Error, InvalidOperation):
+        raise ValueError("cursor is invalid")
+    if cursor_sort != sort:
+        raise ValueError("cursor belongs to a different sort order")
+    return key
+
+
+def row_matches(row, filters):
+    """True if a catalog row passes every filter (NULLs never match a range, as in SQL)"""
+    for name, (column, op) in RANGE_FILTERS.items():
+        if name in filters:
+            value = row.get(column)
+            if value is None:
+                return False
+            if op == '>=' and value < filters[name]:
+                return False
+            if op == '<=' and value > filters[name]:
+                return False
+    for name in INCLUDE_FILTERS:
+        if name in filters and bool(row.get(name)) != filters[name]:
+            return False
+    return True
+
+
+def build_search_query(destination, filters, sort, after, limit, departing=None):
+    """(query, params) for one page of packages straight from MySQL"""
+    conditions = []
+    params = []
+    if destination:
+        conditions.append("(p.destination LIKE %s OR h.city LIKE %s)")
+        params.extend([f'%{destination}%', f'%{destination}%'])
+    if departing is not None:
+        # Only used when the catalog index is unavailable; the index answers this with a bisect
+        conditions.append("""EXISTS (
+            SELECT 1 FROM JSON_TABLE(p.available_dates, '$[*]' COLUMNS (day DATE PATH '$')) AS dates
+            WHERE dates.day BETWEEN %s AND %s
+        )""")
+        params.extend(departing)
+    for name, (column, op) in RANGE_FILTERS.items():
+        if name in filters:
+            qualified = "h.rating" if column == 'hotel_rating' else f"p.{column}"
+            conditions.append(f"{qualified} {op} %s")
+            params.append(filters[name])
+    for name in INCLUDE_FILTERS:
+        if name in filters:
+            conditions.append(f"p.{name} = %s")
+            params.append(filters[name])
+
+    descending = sort == 'price_desc'
+    if after is not None:
+        has_price, price, package_id = after
+        # MySQL sorts NULL prices first ascending and last descending
+        if descending and has_price:
+            conditions.append("(p.price_per_person < %s OR (p.price_per_person = %s AND p.id < %s) OR p.price_per_person IS NULL)")
+            params.extend([price, price, package_id])
+        elif descending:
+            conditions.append("(p.price_per_person IS NULL AND p.id < %s)")
+            params.append(package_id)
+        elif has_price:
+            conditions.append("(p.price_per_person > %s OR (p.price_per_person = %s AND p.id > %s))")
+            params.extend([price, price, package_id])
+        else:
+            conditions.append("((p.price_per_person IS NULL AND p.id > %s) OR p.price_per_person IS NOT NULL)")
+            params.append(package_id)
+
+    query = CATALOG_QUERY
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions) + "\n"
+    direction = "DESC" if descending else "ASC"
+    query += f"ORDER BY p.price_per_person {direction}, p.id {direction}\nLIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def create_missing_indexes(cursor, indexes, unique=False):
+    """Create (table, name, columns) indexes, skipping ones that already exist"""
+    for table, name, columns in indexes:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})")
+
+
+def create_search_indexes(cursor):
+    """Create SEARCH_INDEXES, skipping ones that already exist"""
+    create_missing_indexes(cursor, SEARCH_INDEXES)
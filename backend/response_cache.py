@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, request
+
+
+class CachedResponse:
+    """Serialized response body plus the validators served with it"""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body, mimetype, etag, last_modified, expires_at):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """TTL cache of fully serialized responses with single-flight fills"""
+
+    def __init__(self, ttl=300.0, max_age=0, flight_timeout=10.0):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.flight_timeout = flight_timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}  # key -> Event set when the in-progress fill finishes
+        self._generation = 0
+        self._counters = {"hits": 0, "misses": 0, "not_modified": 0, "fills": 0, "waits": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        """Fresh entry for key, or None"""
+        entry = self._entries.get(key)
+        if entry and entry.expires_at > time.monotonic():
+            return entry
+        return None
+
+    def get_or_fill(self, key, compute):
+        """Return (entry, response); only one caller per key runs compute() on a miss
+
+        compute() returns a Flask response. 200 responses are cached and come
+        back as an entry; anything else is passed through uncached.
+        """
+        entry = self.get(key)
+        if entry:
+            self._count("hits")
+            return entry, None
+
+        with self._lock:
+            entry = self.get(key)
+            if entry:
+                self._counters["hits"] += 1
+                return entry, None
+            self._counters["misses"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+            generation = self._generation
+
+        if not leader:
+            self._count("waits")
+            flight.wait(self.flight_timeout)
+            entry = self.get(key)
+            if entry:
+                return entry, None
+            # The fill failed or was invalidated; answer this request directly
+            return None, compute()
+
+        try:
+            response = compute()
+            if response.status_code != 200:
+                return None, response
+            entry = self._store(key, response.get_data(), response.mimetype, generation)
+            return entry, None
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def _store(self, key, body, mimetype, generation):
+        etag = hashlib.sha1(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(key)
+            # Unchanged content keeps its original Last-Modified across TTL refreshes
+            last_modified = previous.last_modified if previous and previous.etag == etag else now
+            entry = CachedResponse(body, mimetype, etag, last_modified, time.monotonic() + self.ttl)
+            # Don't resurrect data that was invalidated while we were computing it
+            if generation == self._generation:
+                self._entries[key] = entry
+                self._counters["fills"] += 1
+        return entry
+
+    def invalidate(self, key=None):
+        """Drop one cached response, or all of them"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._generation += 1
+            self._counters["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            return stats
+
+    def _not_modified(self, entry):
+        if request.if_none_match:
+            return request.if_none_match.contains(entry.etag)
+        if request.if_modified_since:
+            return request.if_modified_since.timestamp() >= int(entry.last_modified)
+        return False
+
+    def _respond(self, entry):
+        if self._not_modified(entry):
+            self._count("not_modified")
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
+
+    def cached(self, key):
+        """Decorator serving a view from the cache, answering 304 without running it"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                entry, response = self.get_or_fill(key, lambda: _as_response(view(*args, **kwargs)))
+                if entry is None:
+                    return response
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+
+def _as_response(result):
+    return current_app.make_response(result)
+
+
+def cache_from_env(prefix='RESPONSE_CACHE'):
+    """Build a ResponseCache using RESPONSE_CACHE_* environment settings"""
+    return ResponseCache(
+        ttl=float(os.getenv(f'{prefix}_TTL', '300')),
+        max_age=int(os.getenv(f'{prefix}_MAX_AGE', '0')),
+    )
@@ -0,0 +1,346 @@
+"""Production entry point: prefork workers sharing one listening socket
+
+The master initializes the schema, builds the catalog index (plus cards and
+intent tables) and imports the LLM client once, then forks SERVE_WORKERS
+workers that inherit all of it copy-on-write. Each worker runs a threaded
+WSGI server on the shared socket. A worker drains and exits after
+SERVE_MAX_REQUESTS requests (plus jitter, so they don't all recycle at
+once) and the master forks a replacement. /api/ready answers 503 while a
+worker drains; /api/ stays a plain liveness check. When chat archiving is
+enabled, one more child runs the archiver, so only one process does it.
+
+A catalog change in one worker is written to a pipe the master reads. The
+master refreshes its own copy (so later forks start current), writes the
+snapshot, and forwards the change to every other worker over its pipe.
+
+Metrics are per worker and carry a worker="<slot>" label. /api/metrics on
+the shared port answers for whichever worker accepted the connection; with
+SERVE_METRICS_PORT set, worker N also serves its metrics alone on
+SERVE_METRICS_PORT + N, so a scraper can collect every worker.
+
+    python serve.py
+    SERVE_WORKERS=4 SERVE_PORT=8000 python serve.py
+"""
+import gc
+import json
+import os
+import select
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server, select_address_family
+
+# Rate-limit buckets and the in-flight cap are allocated in shared memory on
+# import, before the fork, so every worker enforces the same budgets
+os.environ.setdefault('ADMISSION_SHARED', '1')
+# Any worker may get a session's next turn: flush chat writes before answering,
+# and share per-session change counters so cached sessions are re-read once stale
+os.environ.setdefault('CHAT_JOURNAL_SYNC', '1')
+os.environ.setdefault('CHAT_SESSION_SHARED', '1')
+import app as api
+from catalog_index import notify_catalog_change, on_catalog_change
+
+
+class RequestCounter:
+    """WSGI middleware counting handled and in-flight requests for recycling and draining"""
+
+    def __init__(self, wsgi_app, max_requests, on_limit):
+        self.wsgi_app = wsgi_app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self._lock = threading.Condition()
+        self.handled = 0
+        self.in_flight = 0
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.in_flight += 1
+        body = None
+        try:
+            # A request stays in flight until its body is sent (SSE streams included)
+            body = self.wsgi_app(environ, start_response)
+            yield from body
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            with self._lock:
+                self.in_flight -= 1
+                self.handled += 1
+                limit_reached = self.max_requests and self.handled == self.max_requests
+                self._lock.notify_all()
+            if limit_reached:
+                self.on_limit()
+
+    def wait_idle(self, timeout):
+        """Wait until no request is in flight; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self.in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+
+def open_listener(host, port, backlog):
+    """Listening socket shared by every worker"""
+    listener = socket.socket(select_address_family(host, port), socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def warm_master():
+    """Work done once before fork so workers share it copy-on-write"""
+    api.init_database()
+    if api.llm_provider.warmup != 'lazy':
+        # Import litellm here rather than once per worker
+        api.llm_provider.get()
+    if api.get_catalog_index() is None:
+        print("❌ Catalog index not built; workers will build it on first search")
+    # Connections must not be shared across processes
+    api.db_pool.close_all()
+    api.db_replicas.close_all()
+    # Keep the warmed objects out of future collections, so their pages stay shared
+    gc.collect()
+    gc.freeze()
+
+
+# Set while a process applies a catalog change relayed from another one
+_relay = threading.local()
+
+
+def encode_change(package_ids, hotel_ids):
+    """One pipe line for a catalog change; ids are dropped (full refresh) if it wouldn't be written atomically"""
+    line = json.dumps({"pid": os.getpid(), "package_ids": package_ids, "hotel_ids": hotel_ids}).encode('utf-8') + b'\n'
+    if len(line) > select.PIPE_BUF:
+        line = json.dumps({"pid": os.getpid(), "package_ids": None, "hotel_ids": None}).encode('utf-8') + b'\n'
+    return line
+
+
+def read_changes(fd):
+    """Yield the catalog changes written to a pipe until its write end is closed"""
+    with os.fdopen(fd, 'rb') as pipe:
+        for line in pipe:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                print(f"❌ Bad catalog change message: {e}")
+
+
+def apply_relayed_changes(fd):
+    """Apply catalog changes forwarded by the master, without sending them back"""
+    _relay.active = True
+    for change in read_changes(fd):
+        notify_catalog_change(package_ids=change["package_ids"], hotel_ids=change["hotel_ids"])
+
+
+def run_worker(listener, host, port, max_requests, graceful_timeout, changes, relayed, slot, metrics_host, metrics_port):
+    """Serve requests on the shared socket until recycled or told to stop
+
+    changes is the write end of the master's change pipe, relayed the
+    read end of this worker's own pipe from the master. slot numbers the
+    worker from 0, and is reused by the worker that replaces it.
+    """
+    api.metrics.labels = {"worker": str(slot)}
+    # State inherited from the master that belongs to threads/connections it owns
+    api.db_pool.reset()
+    api.db_replicas.reset()
+    api.message_journal.reset()
+    api.catalog_snapshot_writer = False
+    api.catalog_packer.reset()
+    api.catalog_packer.background = True
+
+    stopping = threading.Event()
+
+    def stop(*_):
+        if not stopping.is_set():
+            stopping.set()
+            api.draining.set()
+
+    counter = RequestCounter(api.app.wsgi_app, max_requests, stop)
+    api.app.wsgi_app = counter
+    server = make_server(host, port, api.app, threaded=True, fd=listener.fileno())
+    # Non-blocking accept: only one worker wins each connection, the rest go back to select()
+    server.socket.setblocking(False)
+
+    @on_catalog_change
+    def broadcast_catalog_change(package_ids=None, hotel_ids=None):
+        """Send the change to the master, which applies it and forwards it to every other worker"""
+        if not getattr(_relay, 'active', False):
+            os.write(changes, encode_change(package_ids, hotel_ids))
+
+    threading.Thread(target=apply_relayed_changes, args=(relayed,), daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.25}, daemon=True)
+    thread.start()
+    metrics_server = None
+    if metrics_port:
+        metrics_server = make_server(metrics_host, metrics_port + slot, api.metrics.wsgi_app, threaded=True)
+        threading.Thread(target=metrics_server.serve_forever, kwargs={"poll_interval": 0.25}, daemon=True).start()
+    stopping.wait()
+
+    # Stop accepting, then let in-flight requests (and the journal) finish
+    server.shutdown()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+    if not counter.wait_idle(graceful_timeout):
+        print(f"❌ Worker {os.getpid()} exiting with {counter.in_flight} requests still running")
+    api.message_journal.close()
+
+
+def run_archiver():
+    """Archive cold chat sessions until told to stop"""
+    api.db_pool.reset()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    api.catalog_snapshot_writer = False
+    api.chat_archiver.reset()
+    api.chat_archiver.start()
+    stopped.wait()
+    api.chat_archiver.close()
+
+
+def main():
+    host = os.getenv('SERVE_HOST', '0.0.0.0')
+    port = int(os.getenv('SERVE_PORT', '5000'))
+    workers = int(os.getenv('SERVE_WORKERS', '0')) or os.cpu_count() or 1
+    max_requests = int(os.getenv('SERVE_MAX_REQUESTS', '10000'))
+    jitter = int(os.getenv('SERVE_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+    graceful_timeout = float(os.getenv('SERVE_GRACEFUL_TIMEOUT', '30'))
+    backlog = int(os.getenv('SERVE_BACKLOG', '2048'))
+    metrics_host = os.getenv('SERVE_METRICS_HOST', '127.0.0.1')
+    metrics_port = int(os.getenv('SERVE_METRICS_PORT', '0'))
+
+    if workers > api.admission.in_flight.slots:
+        print(f"❌ SERVE_WORKERS={workers} is more than ADMISSION_WORKER_SLOTS={api.admission.in_flight.slots}")
+        return 1
+    # LLM_MAX_CONCURRENCY/LLM_MAX_QUEUE and the MySQL pool sizes are server-wide; each worker gets its share
+    api.llm_scheduler.divide(workers)
+    api.db_pool.divide(workers)
+    api.db_replicas.divide(workers)
+    # The master forks, so it packs (and writes the snapshot) inline rather than leave a thread mid-work
+    api.catalog_packer.background = False
+    warm_master()
+    listener = open_listener(host, port, backlog)
+    children = {}  # pid -> 'worker' or 'archiver'
+    relays = {}  # worker pid -> write end of its catalog change pipe
+    slots = {}  # worker pid -> its slot in the shared in-flight count
+    changes_in, changes_out = os.pipe()
+    # Held while forking and while the master applies a catalog change, so no
+    # child is forked mid-refresh (with its locks held or a half-updated index)
+    fork_lock = threading.Lock()
+    stopping = False
+
+    def spawn(role='worker'):
+        limit = max_requests + random.randint(0, jitter) if max_requests else 0
+        relayed, relay = os.pipe() if role == 'worker' else (None, None)
+        slot = min(set(range(workers)) - set(slots.values())) if role == 'worker' else None
+        with fork_lock:
+            pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for fd in list(relays.values()) + ([relay] if relay is not None else []):
+                    os.close(fd)
+                if role == 'archiver':
+                    run_archiver()
+                else:
+                    api.admission.in_flight.claim(slot)
+                    run_worker(listener, host, port, limit, graceful_timeout, changes_out, relayed, slot, metrics_host, metrics_port)
+                code = 0
+            except Exception as e:
+                print(f"❌ {role.capitalize()} {os.getpid()} failed: {e}")
+            finally:
+                # Skip the master's atexit handlers; the journal was closed above
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = role
+        if relay is not None:
+            os.close(relayed)
+            # A stuck worker must not block the relay; it is recycled with a fresh catalog anyway
+            os.set_blocking(relay, False)
+            relays[pid] = relay
+            slots[pid] = slot
+
+    def forget(pid):
+        relay = relays.pop(pid, None)
+        if relay is not None:
+            os.close(relay)
+        if pid in slots:
+            # Requests a worker was serving when it exited (timeout, crash, OOM kill) no longer count
+            api.admission.in_flight.clear(slots.pop(pid))
+
+    def shutdown(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def relay_catalog_changes():
+        _relay.active = True
+        for change in read_changes(changes_in):
+            with fork_lock:
+                # The master's own copy first, so workers forked from now on start current
+                notify_catalog_change(package_ids=change["package_ids"], hotel_ids=change["hotel_ids"])
+                api.db_pool.close_all()
+                api.db_replicas.close_all()
+                line = encode_change(change["package_ids"], change["hotel_ids"])
+                for pid, relay in list(relays.items()):
+                    if pid == change["pid"]:
+                        continue
+                    try:
+                        os.write(relay, line)
+                    except (BlockingIOError, BrokenPipeError):
+                        print(f"❌ Could not relay a catalog change to worker {pid}")
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    threading.Thread(target=relay_catalog_changes, daemon=True).start()
+
+    for _ in range(workers):
+        spawn()
+    if api.chat_archiver.enabled:
+        spawn('archiver')
+    print(f"✅ Serving on {host}:{port} with {workers} workers (recycled after ~{max_requests} requests, "
+          f"{api.llm_scheduler.max_concurrency} LLM calls and {api.db_pool.size} MySQL connections each)")
+    if metrics_port:
+        print(f"✅ Worker metrics on {metrics_host}:{metrics_port}-{metrics_port + workers - 1}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        role = children.pop(pid, None)
+        forget(pid)
+        if stopping or role is None:
+            continue
+        if os.waitstatus_to_exitcode(status) != 0:
+            print(f"❌ {role.capitalize()} {pid} died (status {status}); starting a new one")
+            # Don't spin if workers crash on startup
+            time.sleep(1)
+        spawn(role)
+    listener.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
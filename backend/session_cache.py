@@ -0,0 +1,262 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+SESSION_COLUMNS = "id, user_id, active_search_params"
+
+
+class SessionState:
+    """One chat_sessions row as the app uses it: owner and parsed search params"""
+
+    __slots__ = ('session_id', 'user_id', 'params', 'touched', 'version', 'archived')
+
+    def __init__(self, session_id, user_id=None, params=None, version=0):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.params = params if params is not None else {}
+        self.touched = time.monotonic()
+        self.version = version  # SessionVersions count this state was read at
+        self.archived = None  # whether chat_archive has messages for it; None until looked up
+
+
+class SessionVersions:
+    """Change counters per session and per user in shared memory, for forked workers
+
+    A worker bumps a session's counter once its writes are in MySQL (and a
+    user's when their latest session changes); another worker whose cached
+    copy was read at an older count reloads it. Keys hash into fixed
+    slots, so a collision only costs an extra reload. Create before fork.
+    """
+
+    def __init__(self, slots=65536):
+        self._counts = multiprocessing.RawArray('L', slots)
+        self._lock = multiprocessing.Lock()
+
+    def _slot(self, key):
+        return zlib.crc32(key.encode('utf-8')) % len(self._counts)
+
+    def current(self, key):
+        return self._counts[self._slot(key)]
+
+    def bump(self, key):
+        """Count a change; returns the new count"""
+        slot = self._slot(key)
+        with self._lock:
+            self._counts[slot] += 1
+            return self._counts[slot]
+
+
+def _parse_params(value):
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        try:
+            value = json.loads(value or '{}')
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+class SessionCache:
+    """LRU of chat session state keyed by session id, plus each user's latest session
+
+    Params are written through to MySQL via the message journal, so once a
+    session is cached a chat turn reads nothing from chat_sessions.
+    "Latest session" follows the same events that bump updated_at in MySQL
+    (creation and param updates). With versions (under serve.py), entries
+    another worker has written since are treated as misses.
+    """
+
+    def __init__(self, max_sessions=10000, idle_ttl=900.0, journal=None, versions=None):
+        self.journal = journal  # MessageJournal that persists param updates
+        self.versions = versions  # SessionVersions shared with the other workers, or None
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session id -> SessionState
+        self._latest = {}  # user id -> (session id, user version it was read at)
+        self._counters = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "expired": 0, "stale": 0}
+
+    def _version(self, key):
+        return self.versions.current(key) if self.versions is not None else 0
+
+    # -- bookkeeping (lock held) -------------------------------------------
+
+    def _forget(self, session_id):
+        state = self._sessions.pop(session_id, None)
+        if state is not None and state.user_id is not None and self._latest.get(state.user_id, (None,))[0] == session_id:
+            del self._latest[state.user_id]
+
+    def _put(self, state, latest=False, user_version=None):
+        self._sessions[state.session_id] = state
+        self._sessions.move_to_end(state.session_id)
+        if latest and state.user_id is not None:
+            if user_version is None:
+                user_version = self._version(f"user:{state.user_id}")
+            self._latest[state.user_id] = (state.session_id, user_version)
+        while len(self._sessions) > self.max_sessions:
+            session_id = next(iter(self._sessions))
+            self._forget(session_id)
+            self._counters["evictions"] += 1
+        return state
+
+    def _lookup(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            return None
+        now = time.monotonic()
+        if now - state.touched > self.idle_ttl:
+            self._forget(session_id)
+            self._counters["expired"] += 1
+            return None
+        if not self.current(state):
+            # Another worker has written to it since it was read
+            self._forget(session_id)
+            self._counters["stale"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        state.touched = now
+        return state
+
+    def _read(self, cursor, query, args):
+        """(row, its unflushed params update) for a chat_sessions query; row is None if nothing matched"""
+        def read():
+            cursor.execute(query, args)
+            return cursor.fetchone()
+
+        if not self.journal:
+            return read(), None
+        return self.journal.consistent_read(read, lambda row: (row, self.journal.pending_params(row['id']) if row else None))
+
+    def _load(self, row, pending=None, latest=False, version=0, user_version=None):
+        """State for a chat_sessions row, merged with an unflushed params update
+
+        version (and user_version) are the counts read before the row was.
+        """
+        params = pending if pending is not None else _parse_params(row['active_search_params'])
+        with self._lock:
+            self._counters["loads"] += 1
+            # Another request may have cached (and updated) it meanwhile
+            state = self._lookup(row['id'])
+            if state is None:
+                state = SessionState(row['id'], row['user_id'], params, version)
+            return self._put(state, latest, user_version)
+
+    # -- reads ------------------------------------------------------------
+
+    def current(self, state):
+        """False if another worker has written to the session since state was read"""
+        return self.versions is None or state.version == self.versions.current(f"session:{state.session_id}")
+
+    def cached(self, session_id):
+        """State for session_id if it is in memory, else None"""
+        with self._lock:
+            state = self._lookup(session_id)
+            self._counters["hits" if state is not None else "misses"] += 1
+            return state
+
+    def get(self, session_id, cursor):
+        """State for session_id, reading chat_sessions on a miss; None if there is no such session"""
+        state = self.cached(session_id)
+        if state is not None:
+            return state
+        version = self._version(f"session:{session_id}")
+        row, pending = self._read(cursor, f"SELECT {SESSION_COLUMNS} FROM chat_sessions WHERE id = %s", (session_id,))
+        return self._load(row, pending, version=version) if row else None
+
+    def latest_for_user(self, user_id, cursor):
+        """The user's most recently created or updated session, or None if they have none"""
+        user_version = self._version(f"user:{user_id}")
+        with self._lock:
+            session_id, seen = self._latest.get(user_id, (None, None))
+            state = self._lookup(session_id) if session_id is not None and seen == user_version else None
+            self._counters["hits" if state is not None else "misses"] += 1
+        if state is not None:
+            return state
+        row, pending = self._read(cursor, f"""
+            SELECT {SESSION_COLUMNS} FROM chat_sessions
+            WHERE user_id = %s
+            ORDER BY updated_at DESC
+            LIMIT 1
+        """, (user_id,))
+        if not row:
+            return None
+        return self._load(row, pending, latest=True, version=self._version(f"session:{row['id']}"), user_version=user_version)
+
+    # -- writes -----------------------------------------------------------
+
+    def create(self, session_id, user_id=None, params=None):
+        """Cache a session that was just inserted; it becomes the user's latest"""
+        user_version = None
+        if self.versions is not None and user_id is not None:
+            # The row is already committed, so other workers can re-read the user's latest now
+            user_version = self.versions.bump(f"user:{user_id}")
+        state = SessionState(session_id, user_id, params, self._version(f"session:{session_id}"))
+        with self._lock:
+            return self._put(state, latest=True, user_version=user_version)
+
+    def set_params(self, state, params):
+        """Replace a session's search params and queue the write to MySQL"""
+        state.params = params
+        with self._lock:
+            self._put(state, latest=True)
+        if self.journal:
+            self.journal.set_params(state.session_id, params)
+
+    def written(self, message_sessions, param_sessions=()):
+        """Journal on_flush hook: tell other workers which sessions (and users' latest) changed
+
+        Our own cached copies are current, so they take the new count unless
+        another worker also wrote in between.
+        """
+        if self.versions is None:
+            return
+        for session_id in set(message_sessions) | set(param_sessions):
+            version = self.versions.bump(f"session:{session_id}")
+            with self._lock:
+                state = self._sessions.get(session_id)
+                if state is not None and state.version == version - 1:
+                    state.version = version
+            if session_id not in param_sessions or state is None or state.user_id is None:
+                continue
+            user_version = self.versions.bump(f"user:{state.user_id}")
+            with self._lock:
+                if self._latest.get(state.user_id) == (session_id, user_version - 1):
+                    self._latest[state.user_id] = (session_id, user_version)
+
+    def archived(self, session_id):
+        """Archiver on_archive hook: forget what is cached about the session here and in other workers"""
+        if self.versions is not None:
+            self.versions.bump(f"session:{session_id}")
+        self.drop(session_id)
+
+    def drop(self, session_id=None):
+        """Forget one session, or every cached session"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._latest.clear()
+            else:
+                self._forget(session_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["sessions"] = len(self._sessions)
+            stats["users"] = len(self._latest)
+            return stats
+
+
+def session_cache_from_env(journal=None, prefix='CHAT_SESSION'):
+    """Build a SessionCache using CHAT_SESSION_* environment settings (CHAT_SESSION_SHARED=1 for forked workers)"""
+    shared = os.getenv(f'{prefix}_SHARED', '0') == '1'
+    return SessionCache(
+        journal=journal,
+        versions=SessionVersions(int(os.getenv(f'{prefix}_VERSION_SLOTS', '65536'))) if shared else None,
+        max_sessions=int(os.getenv(f'{prefix}_CACHE_SIZE', '10000')),
+        idle_ttl=float(os.getenv(f'{prefix}_IDLE_TTL', '900')),
+    )
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+
+def package_row(package_id, destination='Maui', city='Lahaina', price='1000.00', **fields):
+    """One catalog row as CATALOG_QUERY returns it from MySQL"""
+    row = {
+        'id': package_id, 'title': f"Package {package_id}", 'destination': destination, 'duration_days': 5,
+        'price_per_person': Decimal(price) if price is not None else None,
+        'includes_flight': 1, 'includes_hotel': 1, 'includes_car': 0,
+        'image_url': f"https://example.com/{package_id}.jpg", 'description': "Sun and sand",
+        'hotel_id': 100 + package_id, 'available_dates': '["2025-06-01", "2025-07-15"]',
+        'is_treasure_hunt': 0, 'is_whats_hot': 0, 'extras_value': None,
+        'hotel_name': f"Hotel {package_id}", 'hotel_rating': Decimal('4.5'), 'city': city, 'country': 'USA',
+    }
+    row.update(fields)
+    return row
+
+
+class FakeCursor:
+    """Answers CATALOG_QUERY from a list of rows, filtered by the ids of a refresh"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+
+    def execute(self, query, params=None):
+        if params is None:
+            self.result = list(self.rows)
+        else:
+            wanted = set(params)
+            self.result = [row for row in self.rows if row['id'] in wanted or row['hotel_id'] in wanted]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeCatalogConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.rows)
+
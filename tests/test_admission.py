@@ -0,0 +1,143 @@
+from flask import Flask, jsonify
+
+from admission import AdmissionControl, InFlight, TokenBuckets
+
+
+def test_bucket_allows_burst_then_limits(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('admission.time.monotonic', lambda: clock[0])
+    buckets = TokenBuckets(rate=2.0, burst=3, slots=64)
+
+    assert [buckets.take('ip:1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take('ip:1') == 0.5  # one token short at 2 tokens/s
+
+    clock[0] += 0.5
+    assert buckets.take('ip:1') == 0.0
+    assert buckets.take('ip:1') > 0
+
+    # Refills up to the burst, no further
+    clock[0] += 60
+    assert [buckets.take('ip:1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take('ip:1') > 0
+
+
+def test_buckets_are_per_key_and_zero_rate_disables():
+    buckets = TokenBuckets(rate=0.001, burst=1, slots=65536)
+    assert buckets.take('ip:1') == 0.0
+    assert buckets.take('ip:1') > 0
+    assert buckets.take('ip:2') == 0.0
+
+    unlimited = TokenBuckets(rate=0, burst=0)
+    assert all(unlimited.take('ip:1') == 0.0 for _ in range(100))
+
+
+def test_shared_buckets_and_in_flight_slots():
+    buckets = TokenBuckets(rate=0.001, burst=2, slots=16, shared=True)
+    assert buckets.take('ip:1', cost=2) == 0.0
+    assert buckets.take('ip:1') > 0
+
+    in_flight = InFlight(2, shared=True, slots=4)
+    in_flight.claim(3)
+    assert in_flight.enter() and in_flight.enter()
+    assert not in_flight.enter()
+    # The master clears the share of a worker that died mid-request
+    in_flight.clear(3)
+    assert in_flight.current == 0
+    assert in_flight.enter()
+
+
+def make_app(admission):
+    app = Flask(__name__)
+    admission.init_app(app)
+
+    @app.route('/api/search', methods=['POST'])
+    def search():
+        return jsonify({"results": []})
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        return jsonify({"response": "hi"})
+
+    @app.route('/api/ready')
+    def ready():
+        return jsonify({"ready": True})
+
+    @app.route('/api/fails')
+    def fails():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def test_requests_are_charged_to_the_ip_whatever_user_id_they_send():
+    admission = AdmissionControl(
+        chat=TokenBuckets(0, 0), read=TokenBuckets(0.001, 2, slots=1024), in_flight=InFlight(0),
+    )
+    client = make_app(admission).test_client()
+
+    statuses = [client.post('/api/search', json={"user_id": user_id}).status_code for user_id in range(4)]
+
+    assert statuses == [200, 200, 429, 429]
+    assert 'Retry-After' in client.post('/api/search', json={}).headers
+
+
+def test_proxy_hops_take_the_address_the_outermost_proxy_saw():
+    admission = AdmissionControl(
+        chat=TokenBuckets(0, 0), read=TokenBuckets(0.001, 1, slots=1024), in_flight=InFlight(0), proxy_hops=1,
+    )
+    client = make_app(admission).test_client()
+
+    # A client-supplied leftmost entry doesn't get a fresh bucket
+    spoofed = [client.post('/api/search', headers={'X-Forwarded-For': f"10.0.0.{i}, 203.0.113.7"}).status_code for i in range(2)]
+    other = client.post('/api/search', headers={'X-Forwarded-For': '203.0.113.8'}).status_code
+
+    assert spoofed == [200, 429]
+    assert other == 200
+
+
+def test_in_flight_cap_answers_503():
+    in_flight = InFlight(1)
+    admission = AdmissionControl(chat=TokenBuckets(0, 0), read=TokenBuckets(0, 0), in_flight=in_flight)
+    client = make_app(admission).test_client()
+
+    assert in_flight.enter()
+    response = client.post('/api/search', json={})
+    assert response.status_code == 503
+    in_flight.leave()
+    assert client.post('/api/search', json={}).status_code == 200
+    assert in_flight.current == 0
+
+
+def test_chat_and_read_budgets_are_separate_and_health_is_exempt():
+    admission = AdmissionControl(
+        chat=TokenBuckets(0.001, 1, slots=1024), read=TokenBuckets(0.001, 1, slots=1024), in_flight=InFlight(0),
+    )
+    client = make_app(admission).test_client()
+
+    assert [client.post('/api/chat', json={}).status_code for _ in range(2)] == [200, 429]
+    assert client.post('/api/search', json={}).status_code == 200
+    assert all(client.get('/api/ready').status_code == 200 for _ in range(5))
+    stats = admission.stats()
+    assert stats["chat_rate_limited"] == 1 and stats["read_admitted"] == 1
+
+
+def test_authenticated_users_are_limited_across_addresses():
+    admission = AdmissionControl(
+        chat=TokenBuckets(0, 0), read=TokenBuckets(0.001, 1, slots=1024), in_flight=InFlight(0),
+        proxy_hops=1, authenticated_user=lambda: 42,
+    )
+    client = make_app(admission).test_client()
+
+    first = client.post('/api/search', headers={'X-Forwarded-For': '203.0.113.1'})
+    second = client.post('/api/search', headers={'X-Forwarded-For': '203.0.113.2'})
+
+    assert (first.status_code, second.status_code) == (200, 429)
+
+
+def test_in_flight_is_released_when_the_view_raises():
+    in_flight = InFlight(1)
+    admission = AdmissionControl(chat=TokenBuckets(0, 0), read=TokenBuckets(0, 0), in_flight=in_flight)
+    client = make_app(admission).test_client()
+
+    assert client.get('/api/fails').status_code == 500
+    assert in_flight.current == 0
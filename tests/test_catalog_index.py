@@ -0,0 +1,141 @@
+from catalog_index import CatalogIndex, CatalogPacker, price_key
+
+from tests.fakes import FakeCatalogConnection, package_row
+
+
+def build(rows):
+    index = CatalogIndex()
+    index.load(FakeCatalogConnection(rows))
+    return index
+
+
+def test_page_walks_price_order_with_keyset_cursor():
+    rows = [package_row(i, price=f"{1000 + (i * 37) % 500}.00") for i in range(1, 51)]
+    index = build(rows)
+
+    seen, after = [], None
+    while True:
+        page, more = index.page('maui', limit=7, after=after)
+        seen.extend(row['id'] for row in page)
+        if not more:
+            break
+        after = price_key(page[-1])
+
+    expected = [row['id'] for row in sorted(rows, key=price_key)]
+    assert seen == expected
+
+
+def test_page_descending_and_predicate():
+    rows = [package_row(i, price=f"{1000 + i}.00", duration_days=3 if i % 2 else 7) for i in range(1, 11)]
+    index = build(rows)
+
+    page, more = index.page('', limit=3, descending=True, predicate=lambda row: row['duration_days'] == 7)
+
+    assert [row['id'] for row in page] == [10, 8, 6]
+    assert more
+
+
+def test_match_uses_prefixes_and_synonyms():
+    index = build([
+        package_row(1, destination='Hawaii', city='Lahaina'),
+        package_row(2, destination='Japan', city='Tokyo'),
+    ])
+
+    assert [row['id'] for row in index.search('haw')] == [1]
+    assert [row['id'] for row in index.search('maui')] == [1]
+    assert [row['id'] for row in index.search('kyoto')] == [2]
+    assert index.search('paris') == []
+
+
+def test_departing_window():
+    index = build([
+        package_row(1, available_dates='["2025-06-01"]'),
+        package_row(2, available_dates='["2025-08-01", "2025-09-01"]'),
+    ])
+
+    assert index.departing('2025-07-01', '2025-08-31') == {2}
+    assert [row['id'] for row in index.search('', departing=('2025-05-01', '2025-06-30'))] == [1]
+
+
+def test_refresh_updates_removes_and_repacks():
+    rows = [package_row(i, price=f"{1000 + i}.00") for i in range(1, 6)]
+    index = build(rows)
+    assert index.packed
+
+    changed = [package_row(1, price='5000.00', destination='Japan', city='Tokyo')]
+    index.refresh(FakeCatalogConnection(changed), package_ids=[1, 3])
+
+    assert len(index) == 4  # 3 was asked for but is gone
+    assert [row['id'] for row in index.search('tokyo')] == [1]
+    assert [row['id'] for row in index.search('maui')] == [2, 4, 5]
+    assert not index.packed
+
+    assert len(index.compact()) == 4
+    assert index.packed
+    assert index.search('tokyo')[0]['price_per_person'] == changed[0]['price_per_person']
+
+
+def test_compact_gives_way_to_a_refresh_in_between(monkeypatch):
+    import catalog_index
+
+    index = build([package_row(1), package_row(2)])
+    index.refresh(FakeCatalogConnection([package_row(1, price='1.00')]), package_ids=[1])
+    from_rows = catalog_index.CatalogColumns.from_rows
+
+    def from_rows_then_refresh(rows, created_at=None):
+        columns = from_rows(rows, created_at)
+        # Lands while the columns are built outside the lock
+        index.refresh(FakeCatalogConnection([package_row(2, price='2.00')]), package_ids=[2])
+        return columns
+
+    monkeypatch.setattr(catalog_index.CatalogColumns, 'from_rows', from_rows_then_refresh)
+    assert index.compact() is None
+    assert not index.packed
+    monkeypatch.undo()
+
+    assert len(index.compact()) == 2
+    assert [str(row['price_per_person']) for row in index.search('')] == ['1.00', '2.00']
+
+
+def test_packer_packs_inline_and_reports_replaced_rows():
+    index = build([package_row(1), package_row(2)])
+    packed = []
+    packer = CatalogPacker(index, on_pack=packed.append, background=False)
+
+    index.refresh(FakeCatalogConnection([package_row(1, price='1.00')]), package_ids=[1])
+    packer.mark()
+
+    assert index.packed
+    assert [old['id'] for old, _ in packed[0]] == [1, 2]
+    assert packer.stats()['packs'] == 1
+
+
+def test_facets_count_the_destination_and_follow_refreshes():
+    index = build([
+        package_row(1, price='1200.00', includes_car=1),
+        package_row(2, price='1800.00'),
+        package_row(3, destination='Japan', city='Tokyo', country='Japan'),
+    ])
+
+    facets = index.facets('maui')
+    assert facets['total'] == 2
+    assert facets['includes'] == {'flight': 2, 'hotel': 2, 'car': 1}
+    assert facets['country'] == [{'country': 'USA', 'count': 2}]
+
+    index.refresh(FakeCatalogConnection([]), package_ids=[1])
+
+    facets = index.facets('maui')
+    assert facets['total'] == 1
+    assert facets['includes']['car'] == 0
+    assert index.facets('')['total'] == 2
+
+
+def test_destinations_follow_refreshes():
+    rows = [package_row(1, destination='Hawaii', city='Lahaina'), package_row(2, destination='Japan', city=None)]
+    index = build(rows)
+    assert index.destinations() == {'Hawaii', 'Lahaina', 'Japan'}
+
+    rows[1] = package_row(2, destination='Mexico', city='Cancun')
+    index.refresh(FakeCatalogConnection(rows), package_ids=[2])
+
+    assert index.destinations() == {'Hawaii', 'Lahaina', 'Mexico', 'Cancun'}
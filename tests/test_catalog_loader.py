@@ -0,0 +1,154 @@
+import json
+
+import pytest
+from mysql.connector import IntegrityError
+
+from catalog_loader import TableLoad, load_catalog, read_records, validate_hotel, validate_package
+
+
+class RecordingCursor:
+    """Records statements; rejects inserts whose params contain a value in `duplicates`"""
+
+    def __init__(self, duplicates=()):
+        self.statements = []
+        self.duplicates = set(duplicates)
+
+    def execute(self, query, params=()):
+        self.statements.append((' '.join(query.split()), list(params)))
+        if query.startswith("INSERT") and self.duplicates & set(params):
+            raise IntegrityError(msg="Duplicate entry")
+
+    def fetchone(self):
+        return (1,)  # information_schema: the natural keys exist
+
+    def close(self):
+        pass
+
+    def inserts(self):
+        return [(query, params) for query, params in self.statements if query.startswith("INSERT")]
+
+
+class RecordingConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+def hotel(name, **fields):
+    return dict({'name': name, 'city': 'Lahaina', 'rating': '4.5'}, **fields)
+
+
+def package(title, **fields):
+    return dict({'title': title, 'destination': 'Maui', 'price_per_person': '1999.99', 'hotel_id': '1'}, **fields)
+
+
+def test_validate_package_parses_feed_values():
+    row = validate_package(package('Beach', includes_car='yes', available_dates='["2025-06-01"]',
+                                   hotel_id='', hotel_name='Hotel A', hotel_city='Lahaina'))
+
+    assert row[1:3] == ('Beach', 'Maui')
+    assert str(row[4]) == '1999.99'
+    assert row[5:8] == (True, True, True)
+    assert row[10] == ('Hotel A', 'Lahaina')
+    assert json.loads(row[11]) == ['2025-06-01']
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({'title': ''}, "title is required"),
+    ({'price_per_person': 'cheap'}, "price_per_person must be a number"),
+    ({'duration_days': '0'}, "duration_days must be between 1 and 365"),
+    ({'includes_car': 'maybe'}, "includes_car must be true or false"),
+    ({'available_dates': '["June 1st"]'}, "available_dates must only contain YYYY-MM-DD dates"),
+    ({'destination': 'x' * 101}, "destination is longer than 100 characters"),
+])
+def test_validate_package_rejects_bad_values(fields, message):
+    with pytest.raises(ValueError, match=message):
+        validate_package(dict(package('Beach'), **fields))
+
+
+def test_validate_hotel_checks_the_rating_range():
+    with pytest.raises(ValueError, match="rating must be between 0 and 5"):
+        validate_hotel(hotel('Hotel A', rating='7'))
+
+
+def test_read_records_streams_csv_and_jsonl(tmp_path):
+    csv_path = tmp_path / 'hotels.csv'
+    csv_path.write_text("name,city\nHotel A,Lahaina\nHotel B,Kona\n", encoding='utf-8')
+    jsonl_path = tmp_path / 'packages.jsonl'
+    jsonl_path.write_text('{"title": "Beach"}\n\nnot json\n[1, 2]\n{"title": "Ski"}\n', encoding='utf-8')
+
+    assert [record['name'] for record in read_records(str(csv_path))] == ['Hotel A', 'Hotel B']
+    assert list(read_records(str(jsonl_path))) == [{'title': 'Beach'}, None, None, {'title': 'Ski'}]
+
+
+def test_rows_are_written_in_multi_row_chunks():
+    cursor = RecordingCursor()
+    load = TableLoad(cursor, 'hotels', 'hotels_shadow', ('id', 'name', 'city'), upsert=False)
+
+    load.run([{'name': f"Hotel {i}", 'city': 'Kona'} for i in range(5)],
+             lambda record: (None, record['name'], record['city']), chunk_size=2)
+
+    assert [query.count('(%s, %s, %s)') for query, _ in cursor.inserts()] == [2, 2, 1]
+    assert load.stats() == {"read": 5, "written": 5, "rejected": 0}
+
+
+def test_a_rejected_row_does_not_sink_its_batch():
+    cursor = RecordingCursor(duplicates={'Hotel 1'})
+    load = TableLoad(cursor, 'hotels', 'hotels_shadow', ('id', 'name', 'city'), upsert=False)
+
+    load.run([{'name': f"Hotel {i}", 'city': 'Kona'} for i in range(3)] + [None],
+             lambda record: (None, record['name'], record['city']), chunk_size=10)
+
+    assert load.stats() == {"read": 4, "written": 2, "rejected": 2}
+
+
+def test_full_reload_swaps_shadow_tables_in_one_rename():
+    cursor = RecordingCursor()
+    connection = RecordingConnection(cursor)
+
+    stats = load_catalog(connection, hotels=[hotel('Hotel A')], packages=[package('Beach')])
+
+    queries = [query for query, _ in cursor.statements]
+    assert "CREATE TABLE hotels_shadow LIKE hotels" in queries
+    assert any(query.startswith("ALTER TABLE packages_shadow ADD CONSTRAINT") and "REFERENCES hotels_shadow(id)" in query
+               for query in queries)
+    assert "RENAME TABLE hotels TO hotels_old, hotels_shadow TO hotels, packages TO packages_old, packages_shadow TO packages" in queries
+    assert queries.index("DROP TABLE packages_old") < queries.index("DROP TABLE hotels_old")
+    assert stats["mode"] == "replace"
+    assert stats["packages"] == {"read": 1, "written": 1, "rejected": 0}
+
+
+def test_empty_reload_is_not_swapped_in():
+    cursor = RecordingCursor()
+
+    with pytest.raises(ValueError, match="empty packages"):
+        load_catalog(RecordingConnection(cursor), packages=[{'title': ''}])
+
+    queries = [query for query, _ in cursor.statements]
+    assert not any(query.startswith("RENAME") for query in queries)
+    assert queries[-1] == "DROP TABLE IF EXISTS packages_shadow"
+
+
+def test_hotel_only_reload_needs_the_package_feed():
+    with pytest.raises(ValueError, match="also needs the package feed"):
+        load_catalog(RecordingConnection(RecordingCursor()), hotels=[hotel('Hotel A')])
+
+
+def test_upsert_merges_on_the_natural_key():
+    cursor = RecordingCursor()
+
+    load_catalog(RecordingConnection(cursor), upsert=True,
+                 packages=[package('Beach', id='99', hotel_id='', hotel_name='Hotel A', hotel_city='Lahaina')])
+
+    (query, params), = cursor.inserts()
+    assert query.startswith("INSERT INTO packages (title, destination,")
+    assert "(SELECT id FROM hotels WHERE name = %s AND city = %s)" in query
+    assert "ON DUPLICATE KEY UPDATE" in query and "title = VALUES(title)" not in query
+    assert 99 not in params and 'Hotel A' in params
+    assert not any(query.startswith(("CREATE TABLE", "RENAME")) for query, _ in cursor.statements)
@@ -0,0 +1,44 @@
+import pytest
+
+import app as api
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, 'notify_catalog_change', lambda **ids: calls.append(ids))
+    return calls
+
+
+def post(headers=None, remote_addr='127.0.0.1'):
+    client = api.app.test_client()
+    return client.post('/api/catalog/refresh', json={"package_ids": [3]}, headers=headers or {},
+                       environ_base={'REMOTE_ADDR': remote_addr})
+
+
+def test_without_a_token_only_local_requests_may_refresh(refreshes):
+    assert post().status_code == 200
+    assert post(remote_addr='10.0.0.7').status_code == 403
+    # Relayed by a proxy on this machine
+    assert post(headers={'X-Forwarded-For': '203.0.113.9'}).status_code == 403
+    assert refreshes == [{"package_ids": [3], "hotel_ids": None}]
+
+
+def test_with_a_token_it_is_required(refreshes, monkeypatch):
+    monkeypatch.setattr(api, 'CATALOG_ADMIN_TOKEN', 's3cret')
+
+    assert post().status_code == 403
+    assert post(headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert post(headers={'Authorization': 'Bearer s3cret'}, remote_addr='10.0.0.7').status_code == 200
+    assert len(refreshes) == 1
+
+
+def test_incremental_sync_only_touches_changed_packages(monkeypatch):
+    discarded, synced, loaded = [], [], []
+    monkeypatch.setattr(api.package_cards, 'discard', discarded.extend)
+    monkeypatch.setattr(api.package_cards, 'sync', synced.append)
+    monkeypatch.setattr(api.intent_matcher, 'load_destinations', loaded.append)
+
+    api.sync_catalog_views([4, 5], full=False)
+
+    assert discarded == [4, 5] and synced == [] and len(loaded) == 1
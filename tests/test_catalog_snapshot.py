@@ -0,0 +1,71 @@
+import pytest
+
+from catalog_index import CatalogIndex
+from catalog_snapshot import NAMES, CatalogColumns
+
+from tests.fakes import package_row
+
+
+def test_save_and_open_round_trip(tmp_path):
+    rows = [
+        package_row(1),
+        package_row(2, title="Café 東京 ✈", price='1999.99', hotel_rating=None, extras_value='Resort credit'),
+        package_row(3, price=None, description=None, city=None, includes_car=1),
+    ]
+    columns = CatalogColumns.from_rows(rows, created_at=1700000000.5)
+    path = tmp_path / 'catalog.snapshot'
+
+    size = columns.save(str(path))
+    opened = CatalogColumns.open(str(path))
+
+    assert size == path.stat().st_size
+    assert opened.count == 3
+    assert opened.created_at == 1700000000.5
+    for row, view in zip(rows, opened.rows()):
+        assert dict(view) == {name: row[name] for name in NAMES}
+    assert type(opened.rows()[1]['price_per_person']) is type(rows[1]['price_per_person'])
+
+
+def test_open_rejects_other_files(tmp_path):
+    path = tmp_path / 'not-a-snapshot'
+    path.write_bytes(b'hello world, not a catalog')
+
+    with pytest.raises(ValueError):
+        CatalogColumns.open(str(path))
+
+
+def test_index_from_snapshot_matches_index_from_rows(tmp_path):
+    rows = [package_row(i, price=f"{1000 + i * 10}.00", destination='Hawaii' if i % 2 else 'Japan') for i in range(1, 21)]
+    path = str(tmp_path / 'catalog.snapshot')
+    CatalogColumns.from_rows(rows).save(path)
+
+    index = CatalogIndex()
+    assert index.load_snapshot(path) == 20
+    assert index.load_snapshot(path, max_age=1e-9) is None
+
+    assert [row['id'] for row in index.search('japan')] == [i for i in range(1, 21) if i % 2 == 0]
+    assert index.facets('hawaii')['total'] == 10
+
+
+def test_bulk_load_builds_the_same_index_as_adding_rows():
+    rows = [
+        package_row(i, price=f"{400 + i * 170}.00" if i % 5 else None, destination=('Hawaii', 'Japan', None)[i % 3],
+                    city=None if i % 7 == 0 else 'Lahaina', hotel_rating=None if i % 4 == 0 else f"{3 + i % 3}.{i % 10}",
+                    duration_days=i % 16 or None, includes_car=i % 2, country=None if i % 6 == 0 else 'USA',
+                    available_dates=None if i % 8 == 0 else f'["2025-0{1 + i % 9}-01"]')
+        for i in range(1, 61)
+    ]
+    columns = CatalogColumns.from_rows(rows)
+    for name in NAMES:
+        assert list(columns.values(name)) == [columns.readers[name](position) for position in range(len(rows))]
+
+    bulk = CatalogIndex()
+    bulk.load_columns(columns)
+    added = CatalogIndex()
+    for row in columns.rows():
+        added._add(row, ordered=False)
+    added._order.sort()
+    added._departures.sort()
+
+    for name in ('_rows', '_keys', '_price_keys', '_postings', '_order', '_dates', '_departures', '_groups', '_group_postings'):
+        assert getattr(bulk, name) == getattr(added, name), name
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from chat_archive import ChatArchiver, archived_messages, _decode
+
+NOW = datetime(2025, 6, 1, 12, 0)
+OLD = NOW - timedelta(days=60)
+
+
+class FakeChatDatabase:
+    """chat_messages and chat_archive, answering the archiver's queries"""
+
+    def __init__(self):
+        self.messages = []  # dicts with id, session_id, sender, message_text, timestamp
+        self.archive = {}  # session id -> blob
+        self.queries = []
+
+    def add(self, session_id, timestamp, text='hi'):
+        message_id = (self.messages[-1]['id'] if self.messages else 0) + 1
+        self.messages.append({'id': message_id, 'session_id': session_id, 'sender': 'user',
+                              'message_text': text, 'timestamp': timestamp})
+        return message_id
+
+    def sessions(self):
+        return {message['session_id'] for message in self.messages}
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db, dictionary)
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db, dictionary):
+        self.db = db
+        self.dictionary = dictionary
+        self.result = []
+
+    def execute(self, query, params=()):
+        db = self.db
+        query = ' '.join(query.split())
+        db.queries.append(query)
+        if query.startswith("SELECT id FROM chat_messages WHERE timestamp <"):
+            older = [m for m in db.messages if m['timestamp'] < params[0]]
+            self.result = [(max(older, key=lambda m: (m['timestamp'], m['id']))['id'],)] if older else []
+        elif query.startswith("SELECT id, session_id FROM chat_messages WHERE id >"):
+            start, end, limit = params
+            self.result = [(m['id'], m['session_id']) for m in db.messages if start < m['id'] <= end][:limit]
+        elif "HAVING MAX(timestamp) <" in query:
+            *session_ids, cutoff = params
+            newest = {}
+            for m in db.messages:
+                if m['session_id'] in session_ids:
+                    newest[m['session_id']] = max(newest.get(m['session_id'], m['timestamp']), m['timestamp'])
+            self.result = [(session_id,) for session_id, at in newest.items() if at < cutoff]
+        elif query.startswith("SELECT id, sender, message_text, timestamp FROM chat_messages"):
+            self.result = [dict(m) for m in db.messages if m['session_id'] == params[0]]
+        elif query.startswith("SELECT messages FROM chat_archive"):
+            blob = db.archive.get(params[0])
+            self.result = [{'messages': blob}] if blob is not None else []
+        elif query.startswith("INSERT INTO chat_archive"):
+            db.archive[params[0]] = params[-1]
+        elif query.startswith("DELETE FROM chat_messages"):
+            session_id, last_id = params
+            db.messages = [m for m in db.messages if not (m['session_id'] == session_id and m['id'] <= last_id)]
+        elif "information_schema.partitions" in query:
+            self.result = []
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def make_archiver(db, **options):
+    options.setdefault('after_days', 30)
+    return ChatArchiver(db.connection, **options)
+
+
+def test_archives_cold_sessions_and_keeps_live_ones():
+    db = FakeChatDatabase()
+    db.add(1, OLD)
+    db.add(2, OLD)
+    db.add(1, OLD + timedelta(hours=1))
+    db.add(2, NOW - timedelta(days=1))  # session 2 is still live
+    archived = []
+    archiver = make_archiver(db, on_archive=archived.append)
+
+    result = archiver.run_once(now=NOW)
+
+    assert result["sessions"] == 1 and result["messages"] == 2 and not result["more"]
+    assert archived == [1]
+    assert db.sessions() == {2}
+    assert [m['id'] for m in _decode(db.archive[1])] == [1, 3]
+    assert [m['id'] for m in archived_messages(FakeCursor(db, True), 1)] == [3, 1]
+
+
+def test_scan_never_groups_the_whole_table():
+    db = FakeChatDatabase()
+    for session_id in range(1, 6):
+        db.add(session_id, OLD)
+    archiver = make_archiver(db)
+
+    archiver.run_once(now=NOW)
+
+    grouped = [query for query in db.queries if "GROUP BY" in query]
+    assert grouped and all("WHERE session_id IN" in query for query in grouped)
+
+
+def test_cursor_skips_rows_already_checked():
+    db = FakeChatDatabase()
+    db.add(1, OLD)
+    db.add(2, OLD)
+    db.add(2, NOW)
+    archiver = make_archiver(db)
+
+    archiver.run_once(now=NOW)
+    assert archiver.stats()["cursor"] == 2
+    assert archiver.stats()["scanned"] == 2
+
+    # Nothing new went cold: no rows are scanned again
+    archiver.run_once(now=NOW)
+    assert archiver.stats()["scanned"] == 2
+
+
+def test_session_going_cold_later_is_found_above_the_cursor():
+    db = FakeChatDatabase()
+    db.add(1, OLD)
+    db.add(1, NOW - timedelta(days=1))
+    archiver = make_archiver(db)
+
+    assert archiver.run_once(now=NOW)["sessions"] == 0
+    assert archiver.stats()["cursor"] == 1
+
+    # Its newest message is above the cursor, so a later run still sees the whole session
+    result = archiver.run_once(now=NOW + timedelta(days=40))
+    assert result["sessions"] == 1 and result["messages"] == 2
+    assert db.messages == []
+
+
+def test_full_batch_resumes_at_the_first_session_left_over():
+    db = FakeChatDatabase()
+    for session_id in (1, 2, 3):
+        db.add(session_id, OLD)
+    archiver = make_archiver(db, batch_sessions=2)
+
+    first = archiver.run_once(now=NOW)
+    assert first["sessions"] == 2 and first["more"]
+    assert db.sessions() == {3}
+
+    second = archiver.run_once(now=NOW)
+    assert second["sessions"] == 1 and not second["more"]
+    assert db.messages == []
+
+
+def test_scan_rows_bounds_each_run():
+    db = FakeChatDatabase()
+    for session_id in range(1, 8):
+        db.add(session_id, OLD)
+    archiver = make_archiver(db, scan_rows=3)
+
+    runs = 0
+    while True:
+        runs += 1
+        result = archiver.run_once(now=NOW)
+        assert result["sessions"] <= 3
+        if not result["more"]:
+            break
+    assert runs == 3
+    assert db.messages == []
+
+
+def test_failed_archive_leaves_the_cursor_for_a_retry(monkeypatch):
+    import chat_archive
+
+    db = FakeChatDatabase()
+    db.add(1, OLD)
+    archiver = make_archiver(db)
+
+    def fail(connection, session_id):
+        raise RuntimeError("lock wait timeout")
+
+    monkeypatch.setattr(chat_archive, 'archive_session', fail)
+    with pytest.raises(RuntimeError):
+        archiver.run_once(now=NOW)
+    assert archiver.stats()["cursor"] == 0
+
+    monkeypatch.undo()
+    assert archiver.run_once(now=NOW)["sessions"] == 1
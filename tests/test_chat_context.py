@@ -0,0 +1,142 @@
+import time
+
+from chat_context import ChatContextStore, SessionContext
+from message_journal import MessageJournal
+from session_cache import SessionCache, SessionState, SessionVersions
+
+
+class FakeChatCursor:
+    """chat_sessions and chat_messages rows for the queries context loads run"""
+
+    def __init__(self, sessions, messages):
+        self.sessions = sessions  # session id -> user id
+        self.messages = messages  # (session_id, sender, text) in id order
+        self.queries = []
+        self.result = []
+
+    def execute(self, query, params=()):
+        self.queries.append(' '.join(query.split()))
+        if 'FROM chat_sessions' in query:
+            session_id = params[0]
+            self.result = ([{'id': session_id, 'user_id': self.sessions[session_id], 'active_search_params': '{}'}]
+                           if session_id in self.sessions else [])
+        else:
+            session_id, limit = params
+            rows = [{'sender': sender, 'message_text': text}
+                    for sid, sender, text in self.messages if sid == session_id]
+            self.result = rows[::-1][:limit]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+def conversation(session_id, turns):
+    return [(session_id, 'user' if i % 2 == 0 else 'ai', f"message {i}") for i in range(turns)]
+
+
+def test_window_folds_old_user_turns_into_the_summary():
+    context = SessionContext(SessionState(1), window=2, summary_chars=600)
+    for sender, text in [('user', 'beach in Maui'), ('ai', 'here are some'), ('user', 'under $2000'), ('ai', 'sure')]:
+        context.append(sender, text)
+
+    assert list(context.turns) == [('user', 'under $2000'), ('ai', 'sure')]
+    assert context.history_text() == (
+        "(Summary of 2 earlier messages; the user said: beach in Maui)\n"
+        "User: under $2000\n"
+        "Ai: sure\n"
+    )
+
+
+def test_summary_keeps_the_newest_snippets_within_its_budget():
+    context = SessionContext(SessionState(1), window=1, summary_chars=30)
+    for i in range(6):
+        context.append('user', f"turn number {i}")
+
+    assert context.summarized == 5
+    assert list(context.summary) == ['turn number 3', 'turn number 4']
+
+
+def test_long_snippets_are_shortened():
+    context = SessionContext(SessionState(1), window=1, summary_chars=600)
+    context.append('user', 'x' * 200)
+    context.append('user', 'next')
+
+    assert context.summary[0] == 'x' * 77 + '...'
+
+
+def test_load_reads_only_the_window_plus_summary_turns():
+    cursor = FakeChatCursor({1: 7}, conversation(1, 50))
+    store = ChatContextStore(SessionCache(), window=4, summary_turns=6)
+
+    context = store.get(1, cursor)
+
+    assert [text for _, text in context.turns] == ['message 46', 'message 47', 'message 48', 'message 49']
+    assert context.summarized == 6
+    assert len(cursor.result) == 10  # rows fetched for the window and summary
+
+
+def test_cached_context_reads_nothing():
+    cursor = FakeChatCursor({1: 7}, conversation(1, 3))
+    store = ChatContextStore(SessionCache())
+    context = store.get(1, cursor)
+    cursor.queries.clear()
+
+    assert store.get(1, cursor) is context
+    assert cursor.queries == []
+
+
+def test_unknown_session_has_no_context():
+    cursor = FakeChatCursor({}, [])
+    store = ChatContextStore(SessionCache())
+
+    assert store.get(5, cursor) is None
+    assert store.cached(5) is None
+
+
+def test_load_merges_unflushed_journal_messages():
+    journal = MessageJournal(lambda: None, flush_interval=3600)
+    journal.append(1, 'user', 'not flushed yet')
+    cursor = FakeChatCursor({1: 7}, conversation(1, 2))
+    store = ChatContextStore(SessionCache(journal=journal), journal=journal)
+
+    context = store.get(1, cursor)
+
+    assert [text for _, text in context.turns] == ['message 0', 'message 1', 'not flushed yet']
+
+
+def test_lru_evicts_the_least_recently_used_context():
+    cursor = FakeChatCursor({1: 7, 2: 7, 3: 7}, [])
+    store = ChatContextStore(SessionCache(), max_sessions=2)
+    store.get(1, cursor)
+    store.get(2, cursor)
+    store.cached(1)
+    store.get(3, cursor)
+
+    assert store.cached(2) is None
+    assert store.cached(1) is not None and store.cached(3) is not None
+
+
+def test_idle_contexts_expire():
+    cursor = FakeChatCursor({1: 7}, [])
+    store = ChatContextStore(SessionCache(), idle_ttl=60)
+    context = store.get(1, cursor)
+    context.touched = time.monotonic() - 120
+
+    assert store.cached(1) is None
+
+
+def test_context_written_by_another_worker_is_reloaded():
+    versions = SessionVersions(slots=64)
+    sessions = SessionCache(versions=versions)
+    cursor = FakeChatCursor({1: 7}, conversation(1, 2))
+    store = ChatContextStore(sessions)
+    store.get(1, cursor)
+
+    versions.bump("session:1")
+    cursor.messages.append((1, 'user', 'from another worker'))
+
+    assert store.cached(1) is None
+    assert store.get(1, cursor).turns[-1] == ('user', 'from another worker')
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import mysql.connector
+import pytest
+from mysql.connector import InterfaceError
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeMySQLConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+        self.pings = 0
+        self.unread_result = False
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise InterfaceError("MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Connections the pool opened, in order"""
+    connections = []
+
+    def connect(**config):
+        connections.append(FakeMySQLConnection(len(connections) + 1))
+        return connections[-1]
+
+    monkeypatch.setattr(mysql.connector, 'connect', connect)
+    return connections
+
+
+def make_pool(**options):
+    options.setdefault('wait_timeout', 0.05)
+    return ConnectionPool({'host': 'db'}, **options)
+
+
+def test_reuses_the_most_recently_returned_connection(opened):
+    pool = make_pool(size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert pool.acquire() is second
+    assert len(opened) == 2
+
+
+def test_pings_idle_connections_and_replaces_dead_ones(opened):
+    pool = make_pool(size=1, ping_interval=0)
+    connection = pool.acquire()
+    pool.release(connection)
+
+    assert pool.acquire() is connection
+    assert connection.pings == 1
+    pool.release(connection)
+
+    connection.alive = False
+    replacement = pool.acquire()
+    assert replacement is not connection
+    assert connection.closed
+    assert pool.stats()["failed_health_checks"] == 1
+
+
+def test_skips_the_ping_for_recently_used_connections(opened):
+    pool = make_pool(size=1, ping_interval=60)
+    connection = pool.acquire()
+    pool.release(connection)
+
+    assert pool.acquire() is connection
+    assert connection.pings == 0
+
+
+def test_recycles_connections_past_their_lifetime(opened):
+    pool = make_pool(size=1, max_lifetime=0.01)
+    connection = pool.acquire()
+    pool.release(connection)
+    time.sleep(0.02)
+
+    assert pool.acquire() is not connection
+    assert connection.closed
+    assert pool.stats()["recycled"] == 1
+
+
+def test_discards_connections_after_a_database_error(opened):
+    pool = make_pool(size=1)
+    with pytest.raises(InterfaceError):
+        with pool.connection() as connection:
+            raise InterfaceError("Lost connection")
+
+    assert connection.closed
+    assert pool.stats()["idle"] == 0
+    assert pool.acquire() is not connection
+
+
+def test_discards_connections_with_unread_results(opened):
+    pool = make_pool(size=1)
+    connection = pool.acquire()
+    connection.unread_result = True
+    pool.release(connection)
+
+    assert connection.closed
+    assert pool.stats()["idle"] == 0
+
+
+def test_acquire_times_out_when_the_pool_is_exhausted(opened):
+    pool = make_pool(size=1, wait_timeout=0.05)
+    pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_a_connection_released_meanwhile(opened):
+    pool = make_pool(size=1, wait_timeout=2)
+    connection = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, (connection,))
+    timer.start()
+
+    assert pool.acquire() is connection
+    timer.join()
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["wait_time_max_ms"] >= 40
+
+
+def test_failed_connect_frees_its_slot(opened, monkeypatch):
+    pool = make_pool(size=1)
+
+    def refuse(**config):
+        raise InterfaceError("Can't connect to MySQL server")
+
+    monkeypatch.setattr(mysql.connector, 'connect', refuse)
+    with pytest.raises(InterfaceError):
+        pool.acquire()
+    assert pool.stats()["in_use"] == 0
+
+
+def test_stats_count_usage(opened):
+    pool = make_pool(size=3)
+    with pool.connection():
+        with pool.connection():
+            assert pool.stats()["in_use"] == 2
+    with pool.connection():
+        pass
+
+    stats = pool.stats()
+    assert stats == dict(stats, size=3, in_use=0, idle=2, acquired=3, created=2, timeouts=0, waits=0)
+
+
+def test_divide_and_env(monkeypatch, opened):
+    monkeypatch.setenv('MYSQL_POOL_SIZE', '9')
+    monkeypatch.setenv('MYSQL_POOL_WAIT_TIMEOUT', '1.5')
+    pool = db_pool.pool_from_env({'host': 'db'})
+    assert (pool.size, pool.wait_timeout) == (9, 1.5)
+
+    pool.divide(4)
+    assert pool.size == 2
+    pool.divide(8)
+    assert pool.size == 1
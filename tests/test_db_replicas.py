@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+
+from mysql.connector import InterfaceError, ProgrammingError
+
+from db_replicas import Replica, ReplicaSet, replicas_from_env
+
+
+class FakeReplicaPool:
+    """Pool whose connections report `status` from SHOW REPLICA STATUS"""
+
+    def __init__(self, lag=0, running='Yes', status=True, down=False, legacy=False):
+        self.lag = lag
+        self.running = running
+        self.status = status  # False: the server isn't replicating
+        self.down = down
+        self.legacy = legacy  # MySQL before 8.0.22, SHOW SLAVE STATUS only
+        self.checks = 0
+        self.borrowed = 0
+
+    def _row(self):
+        if not self.status:
+            return None
+        if self.legacy:
+            return {'Slave_SQL_Running': self.running, 'Seconds_Behind_Master': self.lag}
+        return {'Replica_SQL_Running': self.running, 'Seconds_Behind_Source': self.lag}
+
+    @contextmanager
+    def connection(self):
+        if self.down:
+            raise InterfaceError("Can't connect to MySQL server")
+        self.checks += 1
+        yield FakeStatusConnection(self)
+
+    def acquire(self):
+        if self.down:
+            raise InterfaceError("Can't connect to MySQL server")
+        self.borrowed += 1
+        return object()
+
+    def release(self, connection, discard=False):
+        self.borrowed -= 1
+
+
+class FakeStatusConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, dictionary=False):
+        return FakeStatusCursor(self.pool)
+
+
+class FakeStatusCursor:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def execute(self, query):
+        if query == "SHOW REPLICA STATUS" and self.pool.legacy:
+            raise ProgrammingError("You have an error in your SQL syntax")
+
+    def fetchone(self):
+        return self.pool._row()
+
+    def close(self):
+        pass
+
+
+def replica_set(*pools, **options):
+    return ReplicaSet([Replica(f"replica{i}", pool) for i, pool in enumerate(pools)], **options)
+
+
+def test_reads_rotate_across_healthy_replicas():
+    replicas = replica_set(FakeReplicaPool(), FakeReplicaPool())
+
+    names = []
+    for _ in range(4):
+        replica, connection = replicas.acquire()
+        names.append(replica.name)
+        replicas.release(replica, connection)
+
+    assert names == ['replica0', 'replica1', 'replica0', 'replica1']
+
+
+def test_lagging_or_stopped_replicas_are_skipped():
+    replicas = replica_set(FakeReplicaPool(lag=30), FakeReplicaPool(running='No'), FakeReplicaPool(lag=1), max_lag=5)
+
+    for _ in range(3):
+        replica, connection = replicas.acquire()
+        assert replica.name == 'replica2'
+        replicas.release(replica, connection)
+    stats = replicas.stats()
+    assert stats["healthy"] == 1
+    assert stats["replica0_lag_seconds"] == 30 and stats["replica1_lag_seconds"] == -1
+
+
+def test_no_usable_replica_falls_back_to_the_primary():
+    replicas = replica_set(FakeReplicaPool(down=True), FakeReplicaPool(lag=60))
+
+    assert replicas.acquire() is None
+    stats = replicas.stats()
+    assert stats["primary_fallbacks"] == 1
+    assert stats["replica0_failed_checks"] == 1
+
+
+def test_stricter_max_lag_per_read():
+    replicas = replica_set(FakeReplicaPool(lag=3), max_lag=5)
+
+    assert replicas.acquire(max_lag=1) is None
+    assert replicas.acquire() is not None
+
+
+def test_lag_is_checked_at_most_every_check_interval():
+    pool = FakeReplicaPool(lag=1)
+    replicas = replica_set(pool, check_interval=60)
+    for _ in range(3):
+        replicas.release(*replicas.acquire())
+    assert pool.checks == 1
+
+    pool.lag = 30
+    # A fresh read re-checks, and the replica is now too far behind
+    assert replicas.acquire(fresh=True) is None
+    assert pool.checks == 2
+
+
+def test_a_plain_server_stands_in_only_without_require_replication():
+    assert replica_set(FakeReplicaPool(status=False)).acquire() is None
+    assert replica_set(FakeReplicaPool(status=False), require_replication=False).acquire() is not None
+
+
+def test_older_servers_use_show_slave_status():
+    replicas = replica_set(FakeReplicaPool(lag=2, legacy=True))
+
+    replica, connection = replicas.acquire()
+    assert replica.lag == 2
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('MYSQL_REPLICA_HOSTS', 'replica-a, replica-b:3307')
+    monkeypatch.setenv('MYSQL_REPLICA_USER', 'reader')
+    monkeypatch.setenv('MYSQL_REPLICA_POOL_SIZE', '4')
+    monkeypatch.setenv('MYSQL_REPLICA_REQUIRE_REPLICATION', '0')
+
+    replicas = replicas_from_env({'host': 'primary', 'user': 'root', 'password': 'pw', 'database': 'travel'})
+
+    assert [replica.name for replica in replicas.replicas] == ['replica-a', 'replica-b:3307']
+    config = replicas.replicas[1].pool.config
+    assert (config['host'], config['port'], config['user'], config['password']) == ('replica-b', 3307, 'reader', 'pw')
+    assert replicas.replicas[0].pool.size == 4
+    assert not replicas.require_replication
+
+    replicas.divide(2)
+    assert replicas.replicas[0].pool.size == 2
+
+
+def test_no_hosts_means_no_replicas(monkeypatch):
+    monkeypatch.delenv('MYSQL_REPLICA_HOSTS', raising=False)
+
+    assert not replicas_from_env({'host': 'primary'})
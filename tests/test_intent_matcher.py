@@ -0,0 +1,50 @@
+import pytest
+
+from intent_matcher import DEFAULT_REPLY, IntentMatcher
+
+
+@pytest.fixture
+def matcher():
+    matcher = IntentMatcher()
+    matcher.load_destinations(['Maui', 'New York City', 'Cancun'])
+    return matcher
+
+
+def test_intent_and_destination_match_whole_words(matcher):
+    result = matcher.analyze("Thinking about a cruise out of New York City")
+    assert result["intent"] == 'cruise'
+    assert result["destination"] == 'New York City'
+
+    assert matcher.analyze("I need shipping info")["intent"] is None
+    assert matcher.analyze("hello")["reply"] == DEFAULT_REPLY
+
+
+def test_extract_params(matcher):
+    params = matcher.extract_params("2 adults, 10 days in Maui in June 2026, budget $5k")
+    assert params == {"travelers": 2, "duration_days": 10, "departure_month": 'June', "departure_year": 2026, "budget": 5000}
+    assert matcher.extract_params("one week for our honeymoon") == {"travelers": 2, "duration_days": 7}
+    assert matcher.extract_params("You may want to call me") == {}
+
+
+@pytest.mark.parametrize("message, year", [
+    ("Going in 2026", 2026),
+    ("summer of 2027 sounds good", 2027),
+    ("June 5th, 2026", 2026),
+    ("My budget is 2000 dollars for Maui", None),
+    ("$2030 total", None),
+    ("a budget of 2000 per person", None),
+    ("room 2025 please", None),
+    ("In 2026, with 3000 dollars", 2026),
+])
+def test_years_are_only_taken_from_dates(matcher, message, year):
+    assert matcher.extract_params(message).get("departure_year") == year
+
+
+def test_unchanged_destinations_keep_the_table(matcher):
+    table = matcher._table
+    matcher.load_destinations(['Cancun', 'Maui', 'New York City', 'Maui'])
+    assert matcher._table is table
+
+    matcher.load_destinations(['Maui', 'Rome'])
+    assert matcher.analyze("rome in spring")["destination"] == 'Rome'
+    assert matcher.analyze("new york city")["destination"] is None
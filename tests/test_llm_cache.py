@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+
+import pytest
+
+from llm_cache import LLMResponseCache, has_personal_details
+
+
+@pytest.mark.parametrize("text", [
+    "call me at 555-123-4567", "(555) 123-4567", "+44 20 7946 0958", "card 4111 1111 1111 1111", "mail me: a.b@example.com",
+])
+def test_personal_details_bypass(text):
+    assert has_personal_details(text)
+    assert LLMResponseCache().key_for('', {}, text) is None
+
+
+@pytest.mark.parametrize("text", ["Maui from 2025-06-01 to 2025-07-15", "budget 5000-6000", "4 people, 10 days in June 2026"])
+def test_dates_and_amounts_are_not_personal(text):
+    assert not has_personal_details(text)
+
+
+def test_key_ignores_case_and_punctuation():
+    cache = LLMResponseCache()
+    assert cache.key_for("User: Hi!", {"b": 1, "a": 2}, "Maui, please") == cache.key_for("user: hi", {"a": 2, "b": 1}, "maui please")
+
+
+def test_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('llm_cache.time.time', lambda: now[0])
+    cache = LLMResponseCache(max_entries=2, ttl=10)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    cache.get('a')
+    cache.put('c', 'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_backing_survives_restarts_and_prunes_expired_rows(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('llm_cache.time.time', lambda: now[0])
+    path = str(tmp_path / 'llm.sqlite')
+    cache = LLMResponseCache(ttl=10, path=path, prune_interval=5)
+    cache.put('old', 'Old')
+    now[0] += 11
+    cache.put('new', 'New')
+
+    restarted = LLMResponseCache(ttl=10, path=path)
+    assert restarted.get('new') == 'New'
+    assert restarted.get('old') is None
+    assert restarted.stats()["disk_hits"] == 1
+
+    with sqlite3.connect(path) as db:
+        assert [row[0] for row in db.execute("SELECT key FROM llm_cache")] == ['new']
+        assert db.execute("SELECT name FROM sqlite_master WHERE name = 'idx_llm_cache_created_at'").fetchone()
+    # Expired rows are deleted at most once per prune_interval
+    now[0] += 1
+    cache.put('newer', 'Newer')
+    assert cache.stats()["prunes"] == 2
+
+
+def test_memory_hits_do_not_wait_for_disk(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / 'llm.sqlite'))
+    cache.put('a', 'A')
+    results = []
+
+    with cache._disk_lock:
+        reader = threading.Thread(target=lambda: results.append(cache.get('a')))
+        reader.start()
+        reader.join(timeout=2)
+
+    assert results == ['A']
@@ -0,0 +1,160 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_scheduler import LLMScheduler, LLMShedError, is_retryable
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """litellm stand-in: raises the queued errors first, then answers"""
+
+    def __init__(self, text='hello', errors=(), chunks=None, fail_after_chunks=None):
+        self.text = text
+        self.errors = list(errors)
+        self.chunks = chunks
+        self.fail_after_chunks = fail_after_chunks
+        self.calls = []
+
+    def completion(self, stream=False, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))])
+        return self._stream()
+
+    def _stream(self):
+        for chunk in self.chunks:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+        if self.fail_after_chunks:
+            raise self.fail_after_chunks
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_retryable_errors():
+    assert is_retryable(ProviderError(429))
+    assert is_retryable(ProviderError(503))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ProviderError(400))
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+def test_complete_passes_the_remaining_budget_as_timeout():
+    scheduler = LLMScheduler(latency_budget=5, timeout=60)
+    client = FakeClient()
+
+    assert scheduler.complete(client, 'user:1', model='m') == 'hello'
+    assert client.calls[0]['model'] == 'm'
+    assert 4 < client.calls[0]['timeout'] <= 5
+    assert scheduler.stats()["completed"] == 1 and scheduler.stats()["in_flight"] == 0
+
+
+def test_transient_errors_are_retried_with_backoff():
+    scheduler = LLMScheduler(max_retries=2, backoff_base=0.001)
+    client = FakeClient(errors=[ProviderError(429), ProviderError(503)])
+
+    assert scheduler.complete(client, 'user:1') == 'hello'
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_other_errors_are_not_retried():
+    scheduler = LLMScheduler(backoff_base=0.001)
+    client = FakeClient(errors=[ValueError("bad prompt")])
+
+    with pytest.raises(ValueError):
+        scheduler.complete(client, 'user:1')
+    assert len(client.calls) == 1
+    stats = scheduler.stats()
+    assert stats["failed"] == 1 and stats["in_flight"] == 0
+
+
+def test_stream_is_not_retried_once_text_was_sent():
+    scheduler = LLMScheduler(backoff_base=0.001)
+    client = FakeClient(chunks=['Hel', 'lo'], fail_after_chunks=ProviderError(503))
+
+    received = []
+    with pytest.raises(ProviderError):
+        for chunk in scheduler.stream(client, 'user:1'):
+            received.append(chunk)
+    assert received == ['Hel', 'lo']
+    assert len(client.calls) == 1
+
+
+def test_free_slots_go_round_robin_across_users():
+    scheduler = LLMScheduler(max_concurrency=1, latency_budget=5)
+    scheduler._acquire('holder', scheduler.deadline())
+    order = []
+
+    def call(key):
+        scheduler._acquire(key, scheduler.deadline())
+        order.append(key)
+        scheduler._release()
+
+    threads = []
+    for key in ('busy', 'busy', 'busy', 'quiet'):
+        thread = threading.Thread(target=call, args=(key,))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()["queued"] == len(threads))
+    scheduler._release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ['busy', 'quiet', 'busy', 'busy']
+
+
+def test_full_queue_sheds():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1, latency_budget=5)
+    scheduler._acquire('a', scheduler.deadline())
+    waiter = threading.Thread(target=lambda: scheduler.complete(FakeClient(), 'b'))
+    waiter.start()
+    wait_until(lambda: scheduler.stats()["queued"] == 1)
+
+    with pytest.raises(LLMShedError):
+        scheduler.complete(FakeClient(), 'c')
+    assert scheduler.stats()["shed_queue_full"] == 1
+    scheduler._release()
+    waiter.join()
+
+
+def test_expected_wait_past_the_deadline_sheds_up_front():
+    scheduler = LLMScheduler(max_concurrency=1, latency_budget=1)
+    scheduler._service_time = 10.0  # calls have been taking ten seconds
+    scheduler._acquire('a', scheduler.deadline())
+
+    with pytest.raises(LLMShedError):
+        scheduler.complete(FakeClient(), 'b')
+    assert scheduler.stats()["shed_deadline"] == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_waiter_is_shed_at_its_deadline():
+    scheduler = LLMScheduler(max_concurrency=1)
+    scheduler._acquire('a', scheduler.deadline())
+
+    with pytest.raises(LLMShedError):
+        scheduler.complete(FakeClient(), 'b', deadline=time.monotonic() + 0.05)
+    stats = scheduler.stats()
+    assert stats["shed_deadline"] == 1
+    assert stats["queued"] == 0 and stats["queued_keys"] == 0
+
+
+def test_divide_splits_the_limits():
+    scheduler = LLMScheduler(max_concurrency=8, max_queue=64)
+    scheduler.divide(3)
+
+    assert (scheduler.max_concurrency, scheduler.max_queue) == (2, 21)
@@ -0,0 +1,250 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import DataError, Error, IntegrityError
+
+from message_journal import MAX_MESSAGE_BYTES, MessageJournal, clip_message
+
+
+class FakeDatabase:
+    """Keeps what a batch writes until commit, like an InnoDB transaction"""
+
+    def __init__(self):
+        self.messages = []  # committed (session_id, sender, text, timestamp)
+        self.params = {}  # committed session id -> JSON
+        self.staged = None
+        self.fail_updates = 0  # how many params UPDATEs fail next
+        self.unknown_sessions = set()  # session ids that violate the foreign key
+        self.bad_texts = set()  # message texts strict mode rejects
+        self.bad_params = set()  # session ids whose params UPDATE is rejected
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def start_transaction(self):
+        self.db.staged = {"messages": [], "params": {}}
+
+    def commit(self):
+        self.db.messages.extend(self.db.staged["messages"])
+        self.db.params.update(self.db.staged["params"])
+        self.db.staged = None
+
+    def rollback(self):
+        self.db.staged = None
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def _check(self, row):
+        if row[0] in self.db.unknown_sessions:
+            raise IntegrityError("foreign key")
+        if row[2] in self.db.bad_texts:
+            raise DataError("data too long")
+
+    def executemany(self, query, rows):
+        for row in rows:
+            self._check(row)
+        self.db.staged["messages"].extend(rows)
+
+    def execute(self, query, params):
+        if query.lstrip().startswith('INSERT'):
+            self._check(params)
+            self.db.staged["messages"].append(params)
+            return
+        if self.db.fail_updates:
+            self.db.fail_updates -= 1
+            raise Error("lost connection")
+        if 'CASE' in query:
+            count = len(params) // 3
+            values = params[:2 * count]
+            updates = list(zip(values[::2], values[1::2]))
+        else:
+            updates = [(params[1], params[0])]
+        if any(session_id in self.db.bad_params for session_id, _ in updates):
+            raise DataError("invalid JSON")
+        for session_id, value in updates:
+            self.db.staged["params"][session_id] = value
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def journal(db):
+    journal = MessageJournal(db.connection, flush_size=1000, flush_interval=60)
+    yield journal
+    journal.close()
+
+
+def test_flush_writes_messages_with_their_timestamps_and_params(db, journal):
+    journal.append(1, 'user', 'hi')
+    journal.append(1, 'ai', 'hello')
+    journal.set_params(1, {"destination": "Maui"})
+    journal.set_params(1, {"destination": "Rome"})
+    queued_at = [m["timestamp"] for m in journal.pending(1)]
+
+    assert journal.flush() == 3
+
+    assert [(m[0], m[1], m[2]) for m in db.messages] == [(1, 'user', 'hi'), (1, 'ai', 'hello')]
+    assert [m[3] for m in db.messages] == queued_at
+    assert db.params == {1: '{"destination": "Rome"}'}
+    assert journal.pending(1) == [] and journal.pending_params(1) is None
+    assert journal.flush() == 0
+
+
+def test_pending_is_readable_until_flushed(journal):
+    journal.append(7, 'user', 'hi')
+    journal.set_params(7, {"budget": 2000})
+
+    assert [m["message_text"] for m in journal.pending(7)] == ['hi']
+    assert journal.pending(8) == []
+    assert journal.pending_params(7) == {"budget": 2000}
+
+
+def test_failed_batch_is_retried_without_duplicating_messages(db, journal):
+    journal.append(1, 'user', 'hi')
+    journal.set_params(1, {"destination": "Maui"})
+    db.fail_updates = 1
+
+    with pytest.raises(Error):
+        journal.flush()
+
+    # The INSERT was rolled back with the failed UPDATE; everything is still queued
+    assert db.messages == []
+    assert [m["message_text"] for m in journal.pending(1)] == ['hi']
+    assert journal.pending_params(1) == {"destination": "Maui"}
+    assert journal.stats()["flush_errors"] == 1
+
+    journal.append(1, 'ai', 'hello')
+    journal.set_params(1, {"destination": "Rome"})
+    journal.flush()
+
+    assert [m[2] for m in db.messages] == ['hi', 'hello']
+    assert db.params == {1: '{"destination": "Rome"}'}
+
+
+def test_bad_rows_are_dropped_alone(db, journal):
+    db.unknown_sessions.add(2)
+    journal.append(1, 'user', 'kept')
+    journal.append(2, 'user', 'orphan')
+    journal.append(1, 'ai', 'also kept')
+
+    journal.flush()
+
+    assert [m[2] for m in db.messages] == ['kept', 'also kept']
+    assert journal.stats()["dropped"] == 1
+
+
+def test_any_rejected_row_is_dropped_not_retried_forever(db, journal):
+    db.bad_texts.add('too long')
+    db.bad_params.add(2)
+    journal.append(1, 'user', 'too long')
+    journal.append(1, 'user', 'fine')
+    journal.set_params(1, {"destination": "Maui"})
+    journal.set_params(2, {"destination": "Rome"})
+
+    assert journal.flush() == 2
+
+    assert [m[2] for m in db.messages] == ['fine']
+    assert db.params == {1: '{"destination": "Maui"}'}
+    assert journal.stats()["dropped"] == 2
+    assert journal.pending(1) == [] and journal.pending_params(2) is None
+
+
+def test_messages_are_clipped_to_the_column_size():
+    assert clip_message('hi') == 'hi'
+    clipped = clip_message('é' * MAX_MESSAGE_BYTES)
+    assert len(clipped.encode('utf-8')) <= MAX_MESSAGE_BYTES
+    assert clipped == 'é' * (MAX_MESSAGE_BYTES // 2)
+
+
+def test_full_buffer_sheds_appends(db):
+    journal = MessageJournal(db.connection, flush_size=1000, flush_interval=60, max_pending=2, full_timeout=0.05)
+    db.fail_updates = 1000  # MySQL is down: nothing drains
+    journal.set_params(1, {})
+    try:
+        assert journal.append(1, 'user', 'a')
+        assert journal.append(1, 'user', 'b')
+        assert not journal.append(1, 'user', 'c')
+        assert journal.stats()["shed"] == 1
+        assert [m["message_text"] for m in journal.pending(1)] == ['a', 'b']
+    finally:
+        db.fail_updates = 0
+        journal.close()
+    assert [m[2] for m in db.messages] == ['a', 'b']
+
+
+def test_consistent_read_does_not_block_flushes(db, journal):
+    journal.append(1, 'user', 'hi')
+    reads = []
+
+    def read():
+        if not reads:
+            # A batch lands while the query runs: its rows would be missed in both places
+            journal.flush()
+        reads.append(1)
+        return [m[2] for m in db.messages]
+
+    rows = journal.consistent_read(read, lambda rows: rows + [m["message_text"] for m in journal.pending(1)])
+
+    assert rows == ['hi']
+    assert len(reads) == 2
+    assert journal.stats()["read_retries"] == 1
+
+
+def test_wait_flushed_and_on_flush(db):
+    flushed = []
+    journal = MessageJournal(db.connection, flush_size=1000, flush_interval=60, sync=True,
+                             on_flush=lambda messages, params: flushed.append((messages, params)))
+    try:
+        journal.append(1, 'user', 'hi')
+        journal.set_params(2, {})
+
+        # Doesn't wait the 60 s flush interval: the waiter asks for the batch
+        assert journal.wait_flushed(timeout=5)
+        assert [m[2] for m in db.messages] == ['hi']
+        assert flushed == [({1}, {2})]
+        assert journal.wait_flushed(timeout=0)
+    finally:
+        journal.close()
+
+
+def test_concurrent_waiters_share_a_batch(db):
+    journal = MessageJournal(db.connection, flush_size=1000, flush_interval=60, sync=True)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def turn(session_id):
+        journal.append(session_id, 'user', 'hi')
+        barrier.wait()
+        results.append(journal.wait_flushed(timeout=5))
+
+    threads = [threading.Thread(target=turn, args=(i,)) for i in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        journal.close()
+
+    assert results == [True] * 8
+    assert len(db.messages) == 8
+    assert journal.stats()["flushes"] < 8
@@ -0,0 +1,109 @@
+import pytest
+from flask import Flask
+
+from metrics import BUCKETS, Histogram, Metrics
+
+
+@pytest.fixture
+def app_metrics():
+    app = Flask(__name__)
+    metrics = Metrics(slow_request_ms=0)
+
+    @app.route('/api/items/<int:item_id>')
+    def item(item_id):
+        with metrics.phase('db'):
+            pass
+        return {"id": item_id}
+
+    @app.route('/api/broken')
+    def broken():
+        return {"error": "nope"}, 503
+
+    @app.route('/api/raises')
+    def raises():
+        raise RuntimeError("boom")
+
+    metrics.init_app(app)
+    return app, metrics
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram()
+    histogram.observe(0.0005)
+    histogram.observe(0.003)
+    histogram.observe(120)
+
+    assert histogram.counts[0] == 1
+    assert histogram.counts[BUCKETS.index(0.005)] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.count == 3
+
+
+def test_requests_are_timed_per_route_template(app_metrics):
+    app, metrics = app_metrics
+    client = app.test_client()
+    client.get('/api/items/1')
+    client.get('/api/items/2')
+
+    text = metrics.render()
+
+    assert 'costco_request_duration_seconds_count{route="/api/items/<int:item_id>"} 2' in text
+    assert 'costco_request_duration_seconds_bucket{route="/api/items/<int:item_id>",le="+Inf"} 2' in text
+    assert 'costco_phase_duration_seconds_count{route="/api/items/<int:item_id>",phase="db"} 2' in text
+    assert 'costco_responses_total{route="/api/items/<int:item_id>",status="200"} 2' in text
+
+
+def test_server_errors_are_counted(app_metrics):
+    app, metrics = app_metrics
+    client = app.test_client()
+    client.get('/api/broken')
+    client.get('/api/raises')
+    client.get('/nowhere')
+
+    text = metrics.render()
+
+    assert 'costco_errors_total{route="/api/broken"} 1' in text
+    assert 'costco_errors_total{route="/api/raises"} 1' in text
+    assert 'costco_responses_total{route="unmatched",status="404"} 1' in text
+
+
+def test_phase_outside_a_request_is_background():
+    metrics = Metrics()
+    with metrics.phase('flush'):
+        pass
+
+    assert 'costco_phase_duration_seconds_count{route="background",phase="flush"} 1' in metrics.render()
+
+
+def test_collectors_export_numeric_gauges_and_survive_failures():
+    metrics = Metrics()
+    metrics.add_collector('pool', lambda: {"in_use": 3, "enabled": True, "mode": "lazy", "wait_ms": 1.5})
+
+    def failing():
+        raise RuntimeError("gone")
+
+    metrics.add_collector('broken', failing)
+
+    text = metrics.render()
+
+    assert 'costco_pool_in_use 3' in text
+    assert 'costco_pool_wait_ms 1.5' in text
+    assert 'costco_pool_enabled' not in text and 'costco_pool_mode' not in text
+    assert 'costco_broken' not in text
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics(labels={"worker": 'a"b\\c'})
+    metrics.add_collector('pool', lambda: {"size": 1})
+
+    assert 'costco_pool_size{worker="a\\"b\\\\c"} 1' in metrics.render()
+
+
+def test_slow_requests_are_logged_with_their_phases(app_metrics, capsys):
+    app, metrics = app_metrics
+    metrics.slow_request_ms = 0.000001
+    app.test_client().get('/api/items/1')
+
+    out = capsys.readouterr().out
+    assert 'Slow request GET /api/items/<int:item_id> 200' in out
+    assert 'db=' in out
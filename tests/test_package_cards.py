@@ -0,0 +1,67 @@
+import json
+
+from package_cards import PackageCards, chat_card, render_array
+
+from tests.fakes import package_row
+
+
+def test_fragments_are_rendered_once_and_decoded_for_card():
+    cards = PackageCards()
+    row = package_row(1)
+
+    assert cards.card(row, 'chat') == json.loads(json.dumps(chat_card(row)))
+    assert cards.json_array([row], 'search') == render_array([row], 'search')
+    cards.fragment(row, 'chat')
+
+    assert cards.stats() == {"renders": 2, "hits": 1, "evictions": 0, "packages": 1}
+
+
+def test_replaced_rows_are_rerendered():
+    cards = PackageCards()
+    old = package_row(1)
+    cards.fragment(old, 'chat')
+    new = package_row(1, destination='Rome')
+
+    assert json.loads(cards.fragment(new, 'chat'))["destination"] == 'Rome'
+
+    # A compaction hands over the same values in a new row object
+    packed = dict(new)
+    cards.rebind([(new, packed)])
+    cards.fragment(packed, 'chat')
+    assert cards.stats()["renders"] == 2
+
+
+def test_sync_forgets_changed_and_removed_rows():
+    cards = PackageCards()
+    rows = [package_row(i) for i in range(3)]
+    for row in rows:
+        cards.fragment(row, 'search')
+
+    cards.sync([rows[0], package_row(1)])
+
+    assert cards.stats()["packages"] == 1
+
+
+def test_least_recently_used_packages_are_evicted():
+    cards = PackageCards(max_packages=2)
+    rows = [package_row(i) for i in range(3)]
+    cards.fragment(rows[0], 'search')
+    cards.fragment(rows[1], 'search')
+    cards.fragment(rows[0], 'chat')
+    cards.fragment(rows[2], 'search')
+
+    stats = cards.stats()
+    assert stats["packages"] == 2 and stats["evictions"] == 1
+    cards.fragment(rows[0], 'search')
+    assert cards.stats()["renders"] == 4
+
+
+def test_discard_forgets_only_the_given_packages():
+    cards = PackageCards()
+    rows = [package_row(i) for i in range(3)]
+    for row in rows:
+        cards.fragment(row, 'chat')
+
+    cards.discard([0, 2, 99])
+
+    assert cards.stats()["packages"] == 1
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from flask import Flask, Response, jsonify
+
+from response_cache import ResponseCache
+
+
+def make_app(cache, calls):
+    app = Flask(__name__)
+
+    @app.route('/deals')
+    @cache.cached('deals')
+    def deals():
+        calls.append(1)
+        return jsonify({"deals": [1, 2, 3]})
+
+    return app
+
+
+def test_etag_and_304():
+    cache = ResponseCache(ttl=60)
+    calls = []
+    client = make_app(cache, calls).test_client()
+
+    first = client.get('/deals')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    again = client.get('/deals', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+    stale = client.get('/deals', headers={'If-None-Match': '"something-else"'})
+    assert stale.status_code == 200
+    assert stale.get_json() == {"deals": [1, 2, 3]}
+
+    assert len(calls) == 1
+    assert cache.stats()['not_modified'] == 1
+
+
+def test_if_modified_since():
+    cache = ResponseCache(ttl=60)
+    client = make_app(cache, []).test_client()
+
+    last_modified = client.get('/deals').headers['Last-Modified']
+
+    assert client.get('/deals', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_invalidate_recomputes_and_keeps_unchanged_etag():
+    cache = ResponseCache(ttl=60)
+    calls = []
+    client = make_app(cache, calls).test_client()
+
+    etag = client.get('/deals').headers['ETag']
+    cache.invalidate()
+    response = client.get('/deals', headers={'If-None-Match': etag})
+
+    assert len(calls) == 2
+    # Same content, same validator: the client's copy is still good
+    assert response.status_code == 304
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(ttl=60)
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/broken')
+    @cache.cached('broken')
+    def broken():
+        calls.append(1)
+        return jsonify({"error": "down"}), 500
+
+    client = app.test_client()
+    assert client.get('/broken').status_code == 500
+    assert client.get('/broken').status_code == 500
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return Response(b'{"deals": []}', mimetype='application/json')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fill('deals', compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while cache.stats()["waits"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len({entry.etag for entry, _ in results}) == 1
+
+
+def test_fill_racing_an_invalidation_is_not_stored():
+    cache = ResponseCache(ttl=60)
+
+    def compute():
+        # The catalog changes while the old data is being serialized
+        cache.invalidate('deals')
+        return Response(b'old', mimetype='application/json')
+
+    entry, _ = cache.get_or_fill('deals', compute)
+
+    assert entry.body == b'old'
+    assert cache.get('deals') is None
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(ttl=0.01)
+    cache.get_or_fill('deals', lambda: Response(b'[]', mimetype='application/json'))
+    time.sleep(0.02)
+
+    assert cache.get('deals') is None
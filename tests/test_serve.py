@@ -0,0 +1,65 @@
+import os
+import select
+
+import serve
+from db_pool import ConnectionPool
+from metrics import Metrics
+
+
+def test_catalog_changes_round_trip_through_a_pipe():
+    read, write = os.pipe()
+    os.write(write, serve.encode_change([1, 2], None))
+    os.write(write, b'not json\n')
+    os.write(write, serve.encode_change(None, [7]))
+    os.close(write)
+
+    changes = list(serve.read_changes(read))
+
+    assert changes == [
+        {"pid": os.getpid(), "package_ids": [1, 2], "hotel_ids": None},
+        {"pid": os.getpid(), "package_ids": None, "hotel_ids": [7]},
+    ]
+
+
+def test_changes_too_big_for_one_pipe_write_become_full_refreshes():
+    line = serve.encode_change(list(range(select.PIPE_BUF)), None)
+    assert len(line) <= select.PIPE_BUF
+    assert b'"package_ids": null' in line
+
+
+def test_request_counter_calls_on_limit_once_drained():
+    limits = []
+
+    def app(environ, start_response):
+        start_response('200 OK', [])
+        return [b'ok']
+
+    counter = serve.RequestCounter(app, 2, lambda: limits.append(counter.handled))
+    for _ in range(3):
+        assert list(counter(None, lambda *args: None)) == [b'ok']
+
+    assert limits == [2]
+    assert counter.in_flight == 0 and counter.wait_idle(0)
+
+
+def test_pool_size_is_divided_between_workers():
+    pool = ConnectionPool({}, size=10)
+    pool.divide(4)
+    assert pool.size == 2
+    pool.divide(8)
+    assert pool.size == 1
+
+
+def test_worker_label_on_every_sample():
+    metrics = Metrics(labels={"worker": "3"})
+    metrics.add_collector('pool', lambda: {"size": 5})
+    metrics._observe(metrics._requests, '/api/search', 0.01)
+
+    body = metrics.render()
+    samples = [line for line in body.splitlines() if line and not line.startswith('#')]
+    assert samples and all('worker="3"' in line for line in samples)
+    assert 'costco_pool_size{worker="3"} 5' in samples
+
+    responses = []
+    assert metrics.wsgi_app({}, lambda status, headers: responses.append(status)) == [body.encode('utf-8')]
+    assert responses == ['200 OK']
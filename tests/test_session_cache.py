@@ -0,0 +1,147 @@
+import json
+import time
+
+from message_journal import MessageJournal
+from session_cache import SessionCache, SessionVersions, session_cache_from_env
+
+
+class FakeSessionCursor:
+    """chat_sessions rows keyed by id; the latest per user is the highest updated_at"""
+
+    def __init__(self, rows):
+        self.rows = rows  # session id -> {'user_id', 'active_search_params', 'updated_at'}
+        self.reads = 0
+        self.result = None
+
+    def execute(self, query, params=()):
+        self.reads += 1
+        if 'WHERE id = %s' in query:
+            row = self.rows.get(params[0])
+            self.result = dict(row, id=params[0]) if row else None
+        else:
+            mine = [(row['updated_at'], session_id) for session_id, row in self.rows.items() if row['user_id'] == params[0]]
+            self.result = dict(self.rows[max(mine)[1]], id=max(mine)[1]) if mine else None
+
+    def fetchone(self):
+        return self.result
+
+
+def session_row(user_id, params=None, updated_at=0):
+    return {'user_id': user_id, 'active_search_params': json.dumps(params or {}), 'updated_at': updated_at}
+
+
+def test_a_cached_session_reads_nothing():
+    cursor = FakeSessionCursor({1: session_row(7, {'destination': 'Maui'})})
+    cache = SessionCache()
+
+    state = cache.get(1, cursor)
+    assert (state.user_id, state.params) == (7, {'destination': 'Maui'})
+    assert cache.get(1, cursor) is state
+    assert cursor.reads == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_unknown_session_is_not_cached():
+    cursor = FakeSessionCursor({})
+    cache = SessionCache()
+
+    assert cache.get(1, cursor) is None
+    assert cache.stats()["sessions"] == 0
+
+
+def test_bad_params_json_reads_as_empty():
+    cursor = FakeSessionCursor({1: dict(session_row(7), active_search_params='{not json')})
+
+    assert SessionCache().get(1, cursor).params == {}
+
+
+def test_set_params_queues_the_write_and_reads_it_back_before_a_flush():
+    journal = MessageJournal(lambda: None, flush_interval=3600)
+    cursor = FakeSessionCursor({1: session_row(7)})
+    cache = SessionCache(journal=journal)
+    cache.set_params(cache.get(1, cursor), {'budget': 2000})
+    assert journal.pending_params(1) == {'budget': 2000}
+
+    # A fresh cache (e.g. after eviction) still sees the unflushed update
+    assert SessionCache(journal=journal).get(1, cursor).params == {'budget': 2000}
+
+
+def test_latest_session_follows_creation_and_param_updates():
+    cursor = FakeSessionCursor({1: session_row(7, updated_at=1), 2: session_row(7, updated_at=2)})
+    cache = SessionCache()
+
+    assert cache.latest_for_user(7, cursor).session_id == 2
+    reads = cursor.reads
+    assert cache.latest_for_user(7, cursor).session_id == 2
+    assert cursor.reads == reads
+
+    cache.create(3, 7)
+    assert cache.latest_for_user(7, cursor).session_id == 3
+    cache.set_params(cache.get(1, cursor), {'destination': 'Kona'})
+    assert cache.latest_for_user(7, cursor).session_id == 1
+
+
+def test_lru_eviction_and_idle_expiry():
+    cursor = FakeSessionCursor({i: session_row(7) for i in (1, 2, 3)})
+    cache = SessionCache(max_sessions=2, idle_ttl=60)
+    cache.get(1, cursor)
+    cache.get(2, cursor)
+    cache.get(3, cursor)
+
+    assert cache.cached(1) is None
+    assert cache.stats()["evictions"] == 1
+    cache.cached(2).touched = time.monotonic() - 120
+    assert cache.cached(2) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_another_workers_write_makes_the_copy_stale():
+    versions = SessionVersions(slots=64)
+    cursor = FakeSessionCursor({1: session_row(7, {'destination': 'Maui'})})
+    mine, theirs = SessionCache(versions=versions), SessionCache(versions=versions)
+    mine.get(1, cursor)
+    theirs.get(1, cursor)
+
+    cursor.rows[1] = session_row(7, {'destination': 'Kona'})
+    theirs.written([], [1])
+
+    assert theirs.cached(1) is not None  # the writer's own copy stays current
+    assert mine.cached(1) is None
+    assert mine.get(1, cursor).params == {'destination': 'Kona'}
+    assert mine.stats()["stale"] == 1
+
+
+def test_another_workers_new_session_becomes_the_latest():
+    versions = SessionVersions(slots=64)
+    cursor = FakeSessionCursor({1: session_row(7, updated_at=1)})
+    mine, theirs = SessionCache(versions=versions), SessionCache(versions=versions)
+    assert mine.latest_for_user(7, cursor).session_id == 1
+
+    cursor.rows[2] = session_row(7, updated_at=2)
+    theirs.create(2, 7)
+
+    assert mine.latest_for_user(7, cursor).session_id == 2
+
+
+def test_archived_sessions_are_forgotten_everywhere():
+    versions = SessionVersions(slots=64)
+    cursor = FakeSessionCursor({1: session_row(7)})
+    mine, theirs = SessionCache(versions=versions), SessionCache(versions=versions)
+    mine.get(1, cursor)
+    theirs.get(1, cursor)
+
+    theirs.archived(1)
+
+    assert theirs.cached(1) is None
+    assert mine.cached(1) is None
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('CHAT_SESSION_SHARED', '1')
+    monkeypatch.setenv('CHAT_SESSION_VERSION_SLOTS', '128')
+    monkeypatch.setenv('CHAT_SESSION_CACHE_SIZE', '5')
+
+    cache = session_cache_from_env()
+
+    assert cache.max_sessions == 5
+    assert cache.versions is not None